@@ -1,67 +1,1027 @@
+import json
+import logging
+import math
 from tkinter import Canvas, Event
-from typing import List, Any, Tuple, Union
+from typing import List, Any, Tuple, Union, Optional, Dict, Iterable, Iterator
+
+import numpy as np
+
+from frames import FrameScheduler
+from geometry import (IDENTITY_MATRIX, DetailLevels, Matrix, PointArray, SegmentGrid, coords_bounds, detail_level,
+                      erase_polyline, invert, is_translation, matrix_scale, multiply, multiply_many, rotation,
+                      saved_matrix, scaling, simplify_points, transform_coords, transform_point, translation)
+from history import (CreateCommand, EraseCommand, History, MoveCommand, ScaleCommand, SimplifyCommand,
+                     TransformCommand)
+from instrument import instrumented
+from registry import Registry, remap_z
+from spatial import Bounds, SpatialIndex
+from viewport import SCREEN_TAG, ViewCanvas
+
+logger = logging.getLogger(__name__)
+
+HANDLE_RADIUS: int = 5
+# The tag of every shape's canvas item, the events of all the shapes are bound to it once per canvas
+SHAPE_TAG: str = "clickable"
+# The tag of the canvas items of the selected shapes, plus one tag per item option for the items that take it
+SELECTED_TAG: str = "selected"
+STYLE_TAGS: Dict[str, str] = {"fill": "selected_fill", "outline": "selected_outline", "width": "selected_width"}
+# The bit of Event.state set while Shift is held
+SHIFT_MASK: int = 0x0001
+# The number of points an ellipse is drawn with, as a smoothed polygon so that it can be rotated
+ELLIPSE_POINTS: int = 64
+
+
+def encode_record(record: dict) -> dict:
+    """
+        Turn the record of a shape into the dictionary of Shape.to_dict, by turning its point arrays into lists.
+
+        Args:
+            record (dict): The record, as returned by Shape.to_record.
+
+        Returns:
+            dict: The saved shape.
+    """
+    return {key: value.tolist() if isinstance(value, PointArray) else value for key, value in record.items()}
+
+
+def screen_distance(canvas: Canvas, pixels: float) -> float:
+    """
+        Convert a distance on the screen to the coordinates shapes are drawn in.
+
+        Args:
+            canvas (Canvas): The canvas, a ViewCanvas maps the coordinates with its zoom.
+            pixels (float): The distance in screen pixels.
+
+        Returns:
+            float: The distance in drawing coordinates.
+    """
+    if isinstance(canvas, ViewCanvas):
+        return pixels / canvas.zoom
+    return pixels
+
+
+def shift_pressed(event: Any) -> bool:
+    """
+        Check whether Shift was held during a mouse event.
+
+        Args:
+            event (Any): The mouse event.
+
+        Returns:
+            bool: True if Shift was held.
+    """
+    state = getattr(event, "state", 0)
+    return isinstance(state, int) and bool(state & SHIFT_MASK)
+
+
+def view_detail_level(canvas: Canvas, scale: float = 1.0) -> int:
+    """
+        Get the level of detail strokes and polygons are drawn with on a canvas.
+
+        Args:
+            canvas (Canvas): The canvas, a ViewCanvas picks the level from its zoom.
+            scale (float): The factor the shape's matrix scales its points by, see geometry.matrix_scale.
+
+        Returns:
+            int: The level of detail, 0 draws every point.
+    """
+    if isinstance(canvas, ViewCanvas):
+        return detail_level(canvas.zoom * scale)
+    return 0
+
+
+class SelectionOverlay:
+    """
+        The red bounding box and scale handle drawn around the selected shapes.
+
+        One overlay exists per document drawn on a canvas. Its items and bindings are created once, after that the
+        overlay is only moved with coordinate updates and hidden when nothing is selected. Dragging the handle scales
+        the selection once per display frame.
+
+        Attributes:
+            document (Document): The document whose selection the overlay shows.
+            canvas (Canvas): The canvas the overlay is drawn on.
+            bbox (Any): The id of the bounding box rectangle.
+            circle (Any): The id of the scale handle.
+            visible (bool): Whether the overlay is currently shown.
+        """
+
+    def __init__(self, document: 'Document') -> None:
+        """
+            Create the overlay items on the canvas of a document and bind the scale handle.
+
+            Args:
+                document (Document): The document, drawn on a canvas.
+
+            Returns:
+                None
+        """
+        self.document: Document = document
+        self.canvas: Canvas = document.canvas
+        self.bbox: Any = self.canvas.create_rectangle(0, 0, 0, 0, outline="red", width=1, state="hidden",
+                                                      tags=("selection_overlay", SCREEN_TAG))
+        self.circle: Any = self.canvas.create_oval(-5, -5, 5, 5, outline="red", fill="red", width=6, state="hidden",
+                                                   tags=("selection_overlay", "clickable_bbox", SCREEN_TAG))
+        self.visible: bool = False
+        frames = document.frames
+        self.canvas.tag_bind("clickable_bbox", '<Button-1>', self.on_handle_press)
+        self.canvas.tag_bind("clickable_bbox", '<B1-Motion>', frames.coalesce(self.on_handle_drag))
+        self.canvas.tag_bind("clickable_bbox", '<ButtonRelease-1>', frames.flushed(self.on_handle_release))
+
+    def show(self, bbox: Any) -> None:
+        """
+            Move the overlay around a bounding box and show it.
+
+            Args:
+                bbox (Any): The bounding box (x1, y1, x2, y2) to surround, None hides the overlay.
+
+            Returns:
+                None
+        """
+        if bbox is None:
+            self.hide()
+            return
+        radius = screen_distance(self.canvas, HANDLE_RADIUS)
+        self.canvas.coords(self.bbox, bbox)
+        self.canvas.coords(self.circle, bbox[2] - radius, bbox[3] - radius, bbox[2] + radius, bbox[3] + radius)
+        if not self.visible:
+            self.canvas.itemconfig("selection_overlay", state="normal")
+            self.canvas.tag_raise("selection_overlay")
+            self.visible = True
+
+    def hide(self) -> None:
+        """
+            Hide the overlay.
+
+            Returns:
+                None
+        """
+        if self.visible:
+            self.canvas.itemconfig("selection_overlay", state="hidden")
+            self.visible = False
+
+    @instrumented
+    def on_handle_press(self, event: Any) -> None:
+        """
+            Start scaling the selected shapes when the handle is pressed.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.document.selection.start_scale(event)
+
+    @instrumented
+    def on_handle_drag(self, event: Any) -> None:
+        """
+            Scale the selected shapes while the handle is dragged.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.document.selection.scale_drag(event)
+
+    @instrumented
+    def on_handle_release(self, event: Any) -> None:
+        """
+            Finish scaling the selected shapes when the handle is released.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.document.selection.release()
+
+
+class ShapeEvents:
+    """
+        The mouse bindings shared by all the shapes of a document drawn on a canvas.
+
+        The bindings are made once on SHAPE_TAG. A press is dispatched to the shape owning the item under the pointer,
+        found through the document's registry, and the drag and release that follow go to the same shape. A drag
+        that starts on the empty canvas draws a rubber band and selects the shapes inside it. Drags are handled once
+        per display frame, with the latest pointer position, see FrameScheduler.
+
+        Attributes:
+            document (Document): The document whose shapes receive the events.
+            canvas (Canvas): The canvas.
+            pressed (Any): The shape the mouse button was pressed on, None when the button is up.
+            band_start (Optional[Tuple[float, float]]): The corner the rubber band is dragged from, None when no
+                rubber band is drawn.
+            band (Any): The id of the rubber band rectangle, None before the first motion of the drag.
+        """
+
+    def __init__(self, document: 'Document') -> None:
+        """
+            Bind the shape events on the canvas of a document.
+
+            Args:
+                document (Document): The document, drawn on a canvas.
+
+            Returns:
+                None
+        """
+        self.document: Document = document
+        self.canvas: Canvas = document.canvas
+        self.pressed: Any = None
+        self.band_start: Optional[Tuple[float, float]] = None
+        self.band: Any = None
+        frames = document.frames
+        self.canvas.tag_bind(SHAPE_TAG, "<Button-1>", self.on_press)
+        self.canvas.tag_bind(SHAPE_TAG, "<B1-Motion>", frames.coalesce(self.on_drag))
+        self.canvas.tag_bind(SHAPE_TAG, "<ButtonRelease-1>", frames.flushed(self.on_release))
+        self.bind_canvas()
+
+    def bind_canvas(self) -> None:
+        """
+            Bind the rubber band to the canvas, again after a drawing tool used the mouse button.
+
+            Returns:
+                None
+        """
+        frames = self.document.frames
+        self.canvas.bind("<Button-1>", self.on_band_press)
+        self.canvas.bind("<B1-Motion>", frames.coalesce(self.on_band_drag))
+        self.canvas.bind("<ButtonRelease-1>", frames.flushed(self.on_band_release))
+
+    def current_shape(self) -> Any:
+        """
+            Get the shape owning the canvas item under the pointer.
+
+            Returns:
+                Any: The shape, None if the item belongs to no shape.
+        """
+        items = self.canvas.find_withtag("current")
+        return self.document.shapes.from_item(items[0]) if items else None
+
+    def on_press(self, event: Any) -> None:
+        """
+            Dispatch a press to the shape under the pointer.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.pressed = self.current_shape()
+        if self.pressed is not None:
+            self.pressed.on_select(event)
+
+    def on_drag(self, event: Any) -> None:
+        """
+            Dispatch a drag to the shape the button was pressed on.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.pressed is not None:
+            self.pressed.on_drag(event)
+
+    def on_release(self, event: Any) -> None:
+        """
+            Dispatch a release to the shape the button was pressed on.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.pressed is not None:
+            shape, self.pressed = self.pressed, None
+            shape.on_release(event)
+
+    def on_band_press(self, event: Any) -> None:
+        """
+            Start a rubber band when the empty canvas is pressed.
+
+            Without Shift the selection is cleared, with Shift the shapes in the band are added to it.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.band_start = None
+        if self.document.line_mode or self.canvas.find_withtag("current"):
+            return
+        self.band_start = (event.x, event.y)
+        if not shift_pressed(event):
+            self.document.selection.clear()
+
+    @instrumented
+    def on_band_drag(self, event: Any) -> None:
+        """
+            Stretch the rubber band to the pointer.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.band_start is None:
+            return
+        x, y = self.band_start
+        if self.band is None:
+            self.band = self.canvas.create_rectangle(x, y, event.x, event.y, outline="blue", dash=(4, 2),
+                                                     tags=SCREEN_TAG)
+        else:
+            self.canvas.coords(self.band, x, y, event.x, event.y)
+
+    def on_band_release(self, event: Any) -> None:
+        """
+            Select the shapes lying inside the rubber band.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.band_start is None:
+            return
+        x, y = self.band_start
+        self.band_start = None
+        if self.band is None:
+            return
+        self.canvas.delete(self.band)
+        self.band = None
+        shapes = self.document.index.query_enclosed((x, y, event.x, event.y))
+        shapes.sort(key=lambda shape: shape.z)
+        self.document.selection.add(shapes)
+
+
+class Selection:
+    """
+        The selected shapes of a document, moved, scaled and restyled as one unit.
+
+        The canvas items of the selected shapes carry SELECTED_TAG, and the STYLE_TAGS of the options their shape
+        takes, so a drag moves every item with one canvas call per motion event and a restyle sets an option on every
+        item with one call. The shapes themselves follow when the drag ends, or before the view is refreshed: their
+        new matrices are computed together with NumPy and their index entries updated once.
+
+        Attributes:
+            document (Document): The document.
+            shapes (Dict[Any, None]): The selected shapes, in the order they were selected.
+            box (Optional[Bounds]): The box the overlay is shown around, None while the overlay is hidden.
+            pending (Matrix): The transform already applied to the selected items but not yet to the shapes.
+            gesture (Optional[str]): "move" while the selection is dragged, "scale" while its handle is dragged.
+            total (Tuple[float, float]): The distance moved or the factors scaled by the current gesture.
+            last (Tuple[float, float]): The pointer position of the previous event of the gesture.
+            anchor (Tuple[float, float]): The top-left corner of the box, which stays in place while scaling.
+        """
+
+    def __init__(self, document: 'Document') -> None:
+        """
+            Initialize an empty selection.
+
+            Args:
+                document (Document): The document the shapes are selected in.
+
+            Returns:
+                None
+        """
+        self.document: Document = document
+        self.shapes: Dict[Any, None] = {}
+        self.box: Optional[Bounds] = None
+        self.pending: Matrix = IDENTITY_MATRIX
+        self.gesture: Optional[str] = None
+        self.total: Tuple[float, float] = (0.0, 0.0)
+        self.last: Tuple[float, float] = (0.0, 0.0)
+        self.anchor: Tuple[float, float] = (0.0, 0.0)
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.shapes)
+
+    def __contains__(self, shape: Any) -> bool:
+        return shape in self.shapes
+
+    # ______________________________#Selecting#________________________________________________________________________
+
+    def tag(self, shape: Any) -> None:
+        """
+            Give the canvas item of a selected shape the selection tags, e.g. when it is created.
+
+            Args:
+                shape (Any): The shape, with a canvas item.
+
+            Returns:
+                None
+        """
+        tags = (SHAPE_TAG, SELECTED_TAG) + tuple(STYLE_TAGS[option] for option in shape.style_options)
+        self.document.canvas.itemconfig(shape.shape, tags=tags)
+
+    def add(self, shapes: Iterable[Any]) -> None:
+        """
+            Add shapes to the selection.
+
+            Args:
+                shapes (Iterable[Any]): The shapes, those already selected are skipped.
+
+            Returns:
+                None
+        """
+        self.commit()
+        for shape in shapes:
+            if shape not in self.shapes:
+                self.shapes[shape] = None
+                if shape.shape is not None:
+                    self.tag(shape)
+        self.update_overlay()
+
+    def remove(self, shape: Any) -> None:
+        """
+            Remove a shape from the selection.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        if shape not in self.shapes:
+            return
+        self.commit()
+        del self.shapes[shape]
+        if shape.shape is not None:
+            self.document.canvas.itemconfig(shape.shape, tags=SHAPE_TAG)
+        self.update_overlay()
+
+    def toggle(self, shape: Any) -> None:
+        """
+            Select a shape if it is not selected, unselect it otherwise, for Shift+click.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        if shape in self.shapes:
+            self.remove(shape)
+        else:
+            self.add([shape])
+
+    def select(self, shapes: Iterable[Any]) -> None:
+        """
+            Replace the selection.
+
+            Args:
+                shapes (Iterable[Any]): The shapes to select.
+
+            Returns:
+                None
+        """
+        self.clear()
+        self.add(shapes)
+
+    def discard(self, shape: Any) -> None:
+        """
+            Forget a shape deleted from the document, whose canvas item is already gone.
+
+            The overlay is only hidden once the selection is empty, so deleting the selection costs no canvas calls
+            per shape.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        if shape in self.shapes:
+            del self.shapes[shape]
+            if not self.shapes:
+                self.update_overlay()
+
+    def clear(self) -> None:
+        """
+            Unselect every shape, with one canvas call per selection tag.
+
+            Returns:
+                None
+        """
+        self.commit()
+        if self.shapes and self.document.canvas is not None:
+            for tag in (SELECTED_TAG,) + tuple(STYLE_TAGS.values()):
+                self.document.canvas.dtag(tag, tag)
+        self.shapes.clear()
+        self.update_overlay()
+
+    def update_overlay(self) -> None:
+        """
+            Move the overlay around the selected items, or hide it when nothing but strokes is selected.
+
+            Returns:
+                None
+        """
+        overlay = self.document.overlay
+        if overlay is None:
+            return
+        if any(not isinstance(shape, Lines) for shape in self.shapes):
+            self.box = self.document.canvas.bbox(SELECTED_TAG)
+        else:
+            self.box = None
+        overlay.show(self.box)
+
+    # ______________________________#Restyling#________________________________________________________________________
+
+    def styled(self, option: str) -> List[Any]:
+        """
+            Get the selected shapes that take an item option.
+
+            Args:
+                option (str): "fill", "outline" or "width".
+
+            Returns:
+                List[Any]: The shapes whose style_options include the option.
+        """
+        return [shape for shape in self.shapes if option in shape.style_options]
+
+    def restyle(self, **options: Any) -> None:
+        """
+            Set item options of every selected shape that takes them, with one canvas call per option.
+
+            Args:
+                **options (Any): The new "fill", "outline" color or "width".
+
+            Returns:
+                None
+        """
+        canvas = self.document.canvas
+        for option, value in options.items():
+            if canvas is not None and self.shapes:
+                canvas.itemconfig(STYLE_TAGS[option], **{option: value})
+            for shape in self.styled(option):
+                shape.set_style(option, value)
+        if "width" in options:
+            self.update_overlay()
+
+    # ______________________________#Moving and scaling#_______________________________________________________________
+
+    def move(self, dx: float, dy: float) -> None:
+        """
+            Move the selected shapes, their items at once and the shapes on commit().
+
+            Args:
+                dx (float): The distance along the x-axis.
+                dy (float): The distance along the y-axis.
+
+            Returns:
+                None
+        """
+        if self.document.canvas is not None:
+            self.document.canvas.move(SELECTED_TAG, dx, dy)
+        self.apply(translation(dx, dy))
+
+    def scale(self, scale_x: float, scale_y: float, origin_x: float, origin_y: float) -> None:
+        """
+            Scale the selected shapes around a common origin, their items at once and the shapes on commit().
+
+            Args:
+                scale_x (float): The scale factor along the x-axis.
+                scale_y (float): The scale factor along the y-axis.
+                origin_x (float): The x-coordinate of the point that stays in place.
+                origin_y (float): The y-coordinate of the point that stays in place.
+
+            Returns:
+                None
+        """
+        if self.document.canvas is not None:
+            self.document.canvas.scale(SELECTED_TAG, origin_x, origin_y, scale_x, scale_y)
+        self.apply(scaling(scale_x, scale_y, origin_x, origin_y))
+
+    def apply(self, matrix: Matrix) -> None:
+        """
+            Add a transform done to the selected items to the pending one, and move the overlay with it.
+
+            Args:
+                matrix (Matrix): The transform.
+
+            Returns:
+                None
+        """
+        self.pending = multiply(matrix, self.pending)
+        if self.box is not None:
+            x1, y1, x2, y2 = self.box
+            self.box = coords_bounds(transform_coords(matrix, (x1, y1, x2, y1, x2, y2, x1, y2)))
+            self.document.overlay.show(self.box)
+        if self.document.canvas is None:
+            self.commit()
+
+    @instrumented
+    def commit(self) -> None:
+        """
+            Apply the pending transform to the selected shapes and their index entries.
+
+            Unless the transform only moved them, the items then take their coordinates from the new matrices, which
+            also switches strokes and polygons to the level of detail of their new size.
+
+            Returns:
+                None
+        """
+        if self.pending == IDENTITY_MATRIX:
+            return
+        matrix, self.pending = self.pending, IDENTITY_MATRIX
+        shapes = list(self.shapes)
+        matrices = np.array([shape.matrix for shape in shapes], dtype=np.float64).reshape(-1, 6)
+        for shape, combined in zip(shapes, multiply_many(matrix, matrices).tolist()):
+            shape.transform_model(matrix, tuple(combined))
+        if not is_translation(matrix):
+            for shape in shapes:
+                if shape.shape is not None:
+                    shape.update_item()
+        if isinstance(self.document.canvas, ViewCanvas):
+            self.document.canvas.request_refresh()
+
+    def start_move(self, event: Any) -> None:
+        """
+            Start dragging the selection.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        self.commit()
+        self.gesture = "move"
+        self.total = (0.0, 0.0)
+        self.last = (event.x, event.y)
+
+    @instrumented
+    def drag(self, event: Any) -> None:
+        """
+            Move the selection with the pointer.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.gesture != "move":
+            return
+        dx, dy = event.x - self.last[0], event.y - self.last[1]
+        if not dx and not dy:
+            return
+        self.last = (event.x, event.y)
+        self.total = (self.total[0] + dx, self.total[1] + dy)
+        self.move(dx, dy)
+
+    def start_scale(self, event: Any) -> None:
+        """
+            Start scaling the selection around the top-left corner of its box.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.box is None:
+            return
+        self.commit()
+        self.gesture = "scale"
+        self.total = (1.0, 1.0)
+        self.anchor = (min(self.box[0], self.box[2]), min(self.box[1], self.box[3]))
+        self.last = (event.x, event.y)
+
+    @instrumented
+    def scale_drag(self, event: Any) -> None:
+        """
+            Scale the selection so that the corner of its box follows the pointer.
+
+            An axis is left alone while the pointer is within a pixel of the anchor on it.
+
+            Args:
+                event (Any): The mouse event.
+
+            Returns:
+                None
+        """
+        if self.gesture != "scale":
+            return
+        factors = []
+        last = list(self.last)
+        for axis, position in enumerate((event.x, event.y)):
+            size, last_size = position - self.anchor[axis], self.last[axis] - self.anchor[axis]
+            if size > 1 and last_size > 1:
+                factors.append(size / last_size)
+                last[axis] = position
+            else:
+                factors.append(1.0)
+        if factors == [1.0, 1.0]:
+            return
+        self.last = (last[0], last[1])
+        self.total = (self.total[0] * factors[0], self.total[1] * factors[1])
+        self.scale(factors[0], factors[1], self.anchor[0], self.anchor[1])
+
+    def release(self) -> None:
+        """
+            Finish a drag of the selection or of its handle and record it in the history as one step.
+
+            Returns:
+                None
+        """
+        gesture, self.gesture = self.gesture, None
+        self.commit()
+        if gesture == "move" and (self.total[0] or self.total[1]):
+            self.document.history.record(MoveCommand(list(self.shapes), self.total[0], self.total[1]))
+        elif gesture == "scale" and self.total != (1.0, 1.0):
+            self.document.history.record(ScaleCommand(list(self.shapes), self.total[0], self.total[1],
+                                                      self.anchor[0], self.anchor[1]))
+        if gesture is not None:
+            self.update_overlay()
+
+    def center(self) -> Optional[Tuple[float, float]]:
+        """
+            Get the center of the box around the selected shapes, as kept in the spatial index.
+
+            Returns:
+                Optional[Tuple[float, float]]: The center, None if no selected shape is indexed.
+        """
+        boxes = [bounds for bounds in map(self.document.index.bounds, self.shapes) if bounds is not None]
+        if not boxes:
+            return None
+        x1, y1 = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        x2, y2 = max(box[2] for box in boxes), max(box[3] for box in boxes)
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
+    def transform(self, matrix: Matrix) -> None:
+        """
+            Transform the selected shapes and record it in the history as one step.
+
+            The canvas cannot rotate items, so every selected item takes its coordinates from its shape's new matrix.
+
+            Args:
+                matrix (Matrix): The transform.
+
+            Returns:
+                None
+        """
+        if not self.shapes:
+            return
+        self.commit()
+        shapes = list(self.shapes)
+        self.apply(matrix)
+        self.commit()
+        self.document.history.record(TransformCommand(shapes, matrix))
+        self.update_overlay()
+
+    def rotate(self, degrees: float) -> None:
+        """
+            Rotate the selected shapes around the center of their box.
+
+            Args:
+                degrees (float): The angle, clockwise on the screen.
+
+            Returns:
+                None
+        """
+        center = self.center()
+        if center is not None:
+            self.transform(rotation(degrees, *center))
+
+    def flip(self, horizontal: bool = True) -> None:
+        """
+            Mirror the selected shapes across an axis through the center of their box.
+
+            Args:
+                horizontal (bool): True swaps left and right, False swaps top and bottom.
+
+            Returns:
+                None
+        """
+        center = self.center()
+        if center is not None:
+            self.transform(scaling(-1.0, 1.0, *center) if horizontal else scaling(1.0, -1.0, *center))
+
+
+class Document:
+    """
+        The state of one drawing: its shapes, undo history, selection and the settings new shapes are drawn with.
+
+        Every shape belongs to one document and reaches this state through it, so several documents can be open at
+        once, in several canvases or in worker threads. A headless document has no canvas, its shapes keep their
+        geometry, index entries and history but never create canvas items.
+
+        Attributes:
+            canvas (Optional[Canvas]): The canvas the document is drawn on, None for a headless document.
+            shapes (Registry): The shapes by id and by canvas item, in stacking order.
+            index (SpatialIndex): The bounding boxes of the shapes, for area queries.
+            history (History): The undo and redo steps.
+            counter (int): The id of the newest shape.
+            z_counter (float): The stacking position given to the newest shape.
+            selection (Selection): The selected shapes.
+            current_color (str): The fill color of new shapes.
+            current_outline_color (str): The outline color of new shapes.
+            current_width (int): The outline width of new shapes and the width of new strokes.
+            line_mode (bool): Whether a brush or eraser stroke is being drawn, the shapes ignore the mouse meanwhile.
+            overlay (Optional[SelectionOverlay]): The selection overlay, None without a canvas.
+            events (Optional[ShapeEvents]): The mouse bindings of the shapes, None without a canvas.
+            frames (FrameScheduler): Runs the motion handlers once per display frame, shared with a ViewCanvas.
+                Without a canvas it calls them at once.
+        """
+
+    def __init__(self, canvas: Optional[Canvas] = None, history: Optional[History] = None) -> None:
+        """
+            Initialize an empty document.
+
+            Args:
+                canvas (Optional[Canvas]): The canvas to draw the document on, None for a headless document. A
+                    ViewCanvas needs the document's index, so it is usually attached afterwards.
+                history (Optional[History]): The undo history, defaults to one with the default memory budget.
+
+            Returns:
+                None
+        """
+        self.canvas: Optional[Canvas] = None
+        self.shapes: Registry = Registry()
+        self.index: SpatialIndex = SpatialIndex()
+        self.history: History = history if history is not None else History()
+        self.counter: int = 0
+        self.z_counter: float = 0
+        self.selection: Selection = Selection(self)
+        self.current_color: str = "white"
+        self.current_outline_color: str = "black"
+        self.current_width: int = 1
+        self.line_mode: bool = False
+        self.overlay: Optional[SelectionOverlay] = None
+        self.events: Optional[ShapeEvents] = None
+        self.frames: FrameScheduler = FrameScheduler(None)
+        self.shapes.spread_listeners.append(self.on_spread)
+        if canvas is not None:
+            self.attach(canvas)
+
+    def attach(self, canvas: Canvas) -> None:
+        """
+            Draw the document on a canvas, creating its selection overlay and shape bindings there.
+
+            Args:
+                canvas (Canvas): The canvas, a ViewCanvas must have been created with the document's index.
+
+            Returns:
+                None
+        """
+        self.canvas = canvas
+        self.frames = canvas.frames if isinstance(canvas, ViewCanvas) else FrameScheduler(canvas)
+        self.overlay = SelectionOverlay(self)
+        self.events = ShapeEvents(self)
+        if isinstance(canvas, ViewCanvas):
+            canvas.refresh_listeners.append(self.selection.commit)
+
+    def next_id(self) -> int:
+        """
+            Get the id of a new shape.
+
+            Returns:
+                int: An id no other shape of the document has had.
+        """
+        self.counter += 1
+        return self.counter
+
+    def next_z(self) -> float:
+        """
+            Get a stacking position above every shape.
+
+            Returns:
+                float: The new stacking position.
+        """
+        self.z_counter += 1
+        return self.z_counter
+
+    def on_spread(self, shapes: List[Any], old: List[float]) -> None:
+        """
+            Renumber the stacking positions kept outside the registry after its shapes were spread.
+
+            Args:
+                shapes (List[Any]): The registered shapes in stacking order, with their new z.
+                old (List[float]): Their z before the spread.
+
+            Returns:
+                None
+        """
+        new = [shape.z for shape in shapes]
+
+        def remap(z: float) -> float:
+            return remap_z(old, new, z)
+
+        self.z_counter = remap(self.z_counter)
+        self.history.remap_z(remap, self.shapes)
+
+    def clear(self) -> None:
+        """
+            Remove every shape from the registry and the index, the caller deletes their canvas items.
+
+            Returns:
+                None
+        """
+        self.shapes.clear()
+        self.index.clear()
 
 
 class Shape:
     """
         This class represents a generic shape on a canvas.
 
+        The state shared by the shapes of a drawing lives in their Document. Shapes declare their attributes in
+        __slots__, a document holds up to millions of them.
+
+        A shape keeps its base geometry, which never changes when the shape is moved, scaled, rotated or flipped, and
+        an affine matrix placing it on the drawing. The coordinates of its canvas item are computed from both.
+
         Attributes:
             points (list): A list of tuples representing the points of the shape.
-            counter (int): A counter to keep track of the number of shapes.
-            last_selected (Any): Reference to the last selected shape.
-            current_color (str): The current fill color of the shape.
-            current_outline_color (str): The current outline color of the shape.
-            current_width (int): The current width of the shape's outline.
-            last_deleted (Any): Reference to the last deleted shape.
-            shape_list (List['Shape']): A list containing all the shapes drawn on the canvas.
-            select_bbox (Any): Reference to the bounding box used for selection.
-            select_circle (Any): Reference to the circle used for selection.
-            center_x (int): The x-coordinate of the center of the shape.
-            center_y (int): The y-coordinate of the center of the shape.
-            line_mode (bool): A flag indicating if the shape is in line drawing mode.
         """
+    __slots__ = ("document", "canvas", "matrix", "color", "outline_color", "outline_width", "_item", "id", "z")
     points: list[tuple[float, float]] = []
-    counter: int = 0
-    last_selected: Any = None
-    current_color: str = "white"
-    current_outline_color: str = "black"
-    current_width: int = 1
-    last_deleted: Any = None
-    shape_list: List['Shape'] = []
-    select_bbox: Any = None
-    select_circle: Any = None
-    center_x: int = -1000
-    center_y: int = -1000
-    line_mode: bool = False
+    # The item options a selection restyles on the shape's canvas item, see Selection.restyle
+    style_options: Tuple[str, ...] = ("fill", "outline", "width")
 
-    def __init__(self, canvas: Canvas, color: str) -> None:
+    def __init__(self, document: Document, color: str) -> None:
         """
-            Initialize a Shape object.
+            Initialize a Shape object and add it to its document.
 
             Args:
-                canvas (Canvas): The canvas to draw the shape on.
+                document (Document): The document of the shape, the shape is drawn on its canvas.
                 color (str): The fill color of the shape.
 
             Returns:
             None
         """
-        print("Creating shape")
-        self.x: int = 0
-        self.y: int = 0
-        self.canvas: Canvas = canvas
+        logger.debug("Creating shape")
+        self.matrix: Matrix = IDENTITY_MATRIX
+        self.document: Document = document
+        self.canvas: Optional[Canvas] = document.canvas
         self.color: str = color
-        self.outline_color: str = Shape.current_outline_color
-        self.outline_width: int = Shape.current_width
-        self.shape: Any = None
-        self.last_x: int = 0
-        self.last_y: int = 0
-        Shape.counter += 1
-        self.canvas.tag_bind("clickable" + str(Shape.counter), "<Button-1>", self.on_select)
-        self.canvas.tag_bind("clickable" + str(Shape.counter), "<ButtonRelease-1>", self.on_release)
-        self.canvas.tag_bind("clickable" + str(Shape.counter), '<B1-Motion>', self.on_drag)
-        print("Shape created")
-        Shape.shape_list.append(self)
+        self.outline_color: str = document.current_outline_color
+        self.outline_width: int = document.current_width
+        self._item: Any = None
+        self.id: int = document.next_id()
+        self.z: float = document.next_z()
+        logger.debug("Shape created")
+        document.shapes.add(self)
+
+    @property
+    def x(self) -> float:
+        """
+            The x-coordinate the origin of the base geometry is placed at, the translation of the matrix.
+
+            Setting it changes the matrix only, not the canvas item or the index entry.
+            """
+        return self.matrix[4]
+
+    @x.setter
+    def x(self, x: float) -> None:
+        self.matrix = self.matrix[:4] + (x, self.matrix[5])
+
+    @property
+    def y(self) -> float:
+        """
+            The y-coordinate the origin of the base geometry is placed at, the translation of the matrix.
+
+            Setting it changes the matrix only, not the canvas item or the index entry.
+            """
+        return self.matrix[5]
+
+    @y.setter
+    def y(self, y: float) -> None:
+        self.matrix = self.matrix[:5] + (y,)
+
+    @property
+    def shape(self) -> Any:
+        """
+            The id of the shape's canvas item, None while the shape has none.
+
+            Setting it keeps the registry's item lookup up to date, and tags the item of a selected shape.
+            """
+        return self._item
+
+    @shape.setter
+    def shape(self, item: Any) -> None:
+        if self._item is not None:
+            self.document.shapes.unlink_item(self._item)
+        self._item = item
+        if item is not None:
+            self.document.shapes.link_item(item, self)
+            if self in self.document.selection:
+                self.document.selection.tag(self)
 
     def set_outline(self, outline_color: str, outline_width: int) -> None:
         """
@@ -76,7 +1036,9 @@ class Shape:
         """
         self.outline_width = outline_width
         self.outline_color = outline_color
-        self.canvas.itemconfig(self.shape, outline=self.outline_color, width=self.outline_width)
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, outline=self.outline_color, width=self.outline_width)
+        self.update_index()
 
     def move(self, x: float, y: float) -> None:
         """
@@ -89,63 +1051,100 @@ class Shape:
             Returns:
                 None
             """
+        self.transform(translation(x, y))
+
+    def transform(self, matrix: Matrix) -> None:
+        """
+            Transform the whole shape, composing a matrix with its own.
+
+            The canvas item, if any, gets its new coordinates with a single canvas call.
+
+            Args:
+                matrix (Matrix): The transform, applied after the shape's matrix.
+
+            Returns:
+                None
+            """
+        self.transform_model(matrix)
         if self.shape is not None:
-            self.canvas.move(self.shape, x, y)
-            self.x += x
-            self.y += y
+            self.update_item()
+        elif isinstance(self.canvas, ViewCanvas):
+            self.canvas.request_refresh()
 
-    def on_select(self, event: Any) -> None:
+    def transform_model(self, matrix: Matrix, combined: Optional[Matrix] = None) -> None:
         """
-            Handle the selection of the shape.
+            Transform the shape in its matrix and index entry but not on the canvas, whose item the caller updates.
 
             Args:
-                event (Any): The event object associated with the selection.
+                matrix (Matrix): The transform, applied after the shape's matrix.
+                combined (Optional[Matrix]): The product of the two if the caller already computed it.
 
             Returns:
                 None
             """
-        print("on_select")
-        if Shape.line_mode:
-            return
-        self.draw_select_rect()
-        Shape.last_selected = self
-        print("Select", event.x, event.y)
-        self.start_drag(event)
+        self.matrix = multiply(matrix, self.matrix) if combined is None else combined
+        if is_translation(matrix):
+            self.document.index.move(self, matrix[4], matrix[5])
+        else:
+            self.update_index()
 
-    def on_unselect(self) -> None:
+    def update_item(self) -> None:
         """
-            Handle the unselection of the shape.
+            Replace the coordinates of the shape's canvas item with ones computed from its geometry and matrix.
 
             Returns:
                 None
             """
-        print("on_unselect")
-        if Shape.select_bbox is not None:
-            self.canvas.delete(Shape.select_bbox)
-            Shape.select_bbox = None
-        if Shape.select_circle is not None:
-            self.canvas.delete(Shape.select_circle)
-            Shape.select_circle = None
-        Shape.last_selected = None
+        self.canvas.coords(self.shape, self.world_coords())
+
+    def base_coords(self) -> Any:
+        """
+            Get the outline of the shape in its own coordinates, before its matrix.
+
+            Returns:
+                Any: The flat coordinates x0, y0, x1, y1, ..., empty for shapes without an outline.
+            """
+        return ()
+
+    def world_coords(self) -> List[float]:
+        """
+            Get the outline of the shape in drawing coordinates, after its matrix.
+
+            Returns:
+                List[float]: The flat coordinates x0, y0, x1, y1, ...
+            """
+        return transform_coords(self.matrix, self.base_coords())
 
-    def start_drag(self, event: Any) -> None:
+    @instrumented
+    def on_select(self, event: Any) -> None:
         """
-            Start dragging the shape.
+            Handle the selection of the shape.
+
+            A press selects the shape alone, unless it is already selected, and starts dragging the selection.
+            Shift+click adds the shape to the selection or removes it.
 
             Args:
-                event (Any): The event object associated with the drag action.
+                event (Any): The event object associated with the selection.
 
             Returns:
                 None
             """
-        if Shape.line_mode:
+        logger.debug("on_select")
+        if self.document.line_mode:
+            return
+        selection = self.document.selection
+        if shift_pressed(event):
+            selection.toggle(self)
             return
-        self.last_x = event.x
-        self.last_y = event.y
+        if self not in selection:
+            selection.select([self])
+        logger.debug("Select %s %s", event.x, event.y)
+        selection.start_move(event)
 
+    @instrumented
     def on_drag(self, event: Any) -> None:
         """
-           Handle dragging of the shape.
+           Handle dragging of the shape, which drags the whole selection.
 
            Args:
                event (Any): The event object associated with the drag action.
@@ -153,14 +1152,9 @@ class Shape:
            Returns:
                None
            """
-        if Shape.line_mode:
+        if self.document.line_mode:
             return
-        dx = event.x - self.last_x
-        dy = event.y - self.last_y
-        self.move(dx, dy)
-        self.last_x = event.x
-        self.last_y = event.y
-        self.draw_select_rect()
+        self.document.selection.drag(event)
 
     def delete(self, is_to_remove_from_list: bool = True) -> None:
         """
@@ -172,25 +1166,22 @@ class Shape:
             Returns:
                 None
             """
-        print("Deleting shape")
-        if self.shape is None:
-            return
-        self.canvas.delete(self.shape)
-        self.shape = None
+        logger.debug("Deleting shape")
+        if self.shape is not None:
+            self.canvas.delete(self.shape)
+            self.shape = None
+        self.document.index.remove(self)
         if is_to_remove_from_list:
-            Shape.shape_list.remove(self)
-        if Shape.select_bbox is not None:
-            self.canvas.delete(Shape.select_bbox)
-            Shape.select_bbox = None
-        if Shape.select_circle is not None:
-            self.canvas.delete(Shape.select_circle)
-            Shape.select_circle = None
+            self.document.shapes.remove(self)
+        self.document.selection.discard(self)
 
+    @instrumented
     def on_release(self, event: Any) -> None:
         """
             Handle the release event.
 
-            This method is called when the mouse button is released after selecting or dragging a shape.
+            This method is called when the mouse button is released after selecting or dragging a shape. A drag
+            that moved the selection is recorded in the history.
 
             Args:
                 event (Any): The event object associated with the release action.
@@ -198,7 +1189,8 @@ class Shape:
             Returns:
                 None
             """
-        print("on_release")
+        logger.debug("on_release")
+        self.document.selection.release()
 
     def set_color(self, color: str) -> None:
         """
@@ -211,7 +1203,8 @@ class Shape:
                 None
             """
         self.color = color
-        self.canvas.itemconfig(self.shape, fill=color)
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, fill=color)
 
     def set_outline_color(self, shape: Any, color: str) -> None:
         """
@@ -224,93 +1217,143 @@ class Shape:
             Returns:
                 None
             """
-        print("set_outline_color")
+        logger.debug("set_outline_color")
         self.outline_color = color
-        self.canvas.itemconfig(self.shape, outline=color)
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, outline=color)
 
-    def draw_select_rect(self) -> None:
+    def set_style(self, option: str, value: Any) -> None:
         """
-            Draw the selection rectangle around the shape.
+            Set one of the style_options in the shape's attributes but not on the canvas, see Selection.restyle.
 
-            This method draws a rectangle around the selected shape for highlighting and manipulation.
+            Args:
+                option (str): "fill", "outline" or "width".
+                value (Any): The color or width.
 
             Returns:
                 None
             """
-        if Shape.select_circle is not None:
-            self.canvas.delete(Shape.select_circle)
-
-        if Shape.select_bbox is not None:
-            self.canvas.delete(Shape.select_bbox)
-        if Shape.select_circle is not None:
-            self.canvas.delete(Shape.select_circle)
-        bbox = self.canvas.bbox(self.shape)
-        Shape.select_bbox = self.canvas.create_rectangle(bbox, outline="red", width=1)
-        Shape.select_circle = self.canvas.create_oval(-5, -5, 5, 5, outline="red", fill="red", width=6,
-                                                      tags="clickable_bbox")
-        self.canvas.moveto(Shape.select_circle, bbox[2] - 5, bbox[3] - 5)
-        self.canvas.tag_bind("clickable_bbox", '<Button-1>', self.start_scale_drag)
-        self.canvas.tag_bind("clickable_bbox", '<B1-Motion>', self.on_scale_object)
+        if option == "fill":
+            self.color = value
+        elif option == "outline":
+            self.outline_color = value
+        elif option == "width":
+            self.outline_width = value
+            self.update_index()
 
-    def update_select_rect(self) -> None:
+    def scale(self, scale_x: float, scale_y: float) -> None:
         """
-            Update the selection rectangle around the shape.
+            Scale the shape around its position.
 
-            This method updates the position and size of the selection rectangle based on the shape's bounding box.
+            Args:
+                scale_x (float): The scale factor along the x-axis.
+                scale_y (float): The scale factor along the y-axis.
 
             Returns:
                 None
             """
-        if Shape.select_bbox is None:
+        self.transform(scaling(scale_x, scale_y, self.x, self.y))
+
+    def create_item(self) -> None:
+        """
+           Add the shape to the spatial index and create its canvas item.
+
+           On a ViewCanvas the item is only created if the shape is near the view, otherwise the canvas creates it
+           when the shape comes into view. A shape of a headless document is only indexed.
+
+           Returns:
+               None
+           """
+        bounds = self.get_bounds()
+        if self.canvas is None:
+            self.update_index()
             return
-        bbox = self.canvas.bbox(self.shape)
-        self.canvas.coords(Shape.select_bbox, bbox)
-        self.canvas.moveto(Shape.select_circle, bbox[2] - 5, bbox[3] - 5)
+        if not isinstance(self.canvas, ViewCanvas) or bounds is None or self.canvas.admit(self, bounds):
+            self.realize()
+        self.update_index()
 
-    def start_scale_drag(self, event: Any) -> None:
+    def insert(self) -> None:
         """
-            Begin dragging to scale the shape.
+           Put a deleted shape back into the document at its stacking position and draw it.
 
-            This method is called when the user starts dragging to scale the shape.
+           The caller restacks the new canvas item, see history.restack.
 
-            Args:
-                event (Any): The event object associated with the start of the drag action.
+           Returns:
+               None
+           """
+        self.document.shapes.add(self)
+        self.create_item()
 
-            Returns:
-                None
-            """
-        print("on_start_drag")
-        self.last_x = event.x
-        self.last_y = event.y
-        coords = self.canvas.coords(Shape.select_bbox)
-        Shape.center_x = (coords[0] + coords[2]) / 2
-        Shape.center_y = (coords[1] + coords[3]) / 2
-
-    def on_scale_object(self, event: Any) -> None:
-        """
-            Scale the shape based on the drag action.
-            This method is called when the user drags to scale the shape.
-            Args: event (Any): The event object associated with the scale action.
-            Returns: None
-            """
-        print("on_scale_object")
-        size_x = event.x - Shape.center_x
-        if size_x > 1:
-            scale_x = 1 + (event.x - self.last_x) / size_x
-        else:
-            scale_x = 1
-        size_y = event.y - Shape.center_y
-        print(str(size_x) + " -- " + str(scale_x))
-        if size_y > 1:
-            scale_y = 1 + (event.y - self.last_y) / size_y
+    def set_z(self, z: float) -> None:
+        """
+           Change the stacking position of the shape in the document.
+
+           The caller restacks the canvas item, see history.restack.
+
+           Args:
+               z (float): The new stacking position.
+
+           Returns:
+               None
+           """
+        self.document.shapes.set_z(self, z)
+
+    def realize(self) -> None:
+        """
+           Create the shape's canvas item from its current attributes.
+
+           Returns:
+               None
+           """
+        self.shape = self.get_shape()
+
+    def unrealize(self) -> None:
+        """
+           Delete the shape's canvas item but keep the shape in the document.
+
+           Returns:
+               None
+           """
+        if self.shape is not None:
+            self.canvas.delete(self.shape)
+            self.shape = None
+
+    def restyle(self) -> None:
+        """
+           Set the line width of the shape's canvas item again, after the canvas zoom changed.
+
+           Returns:
+               None
+           """
+        self.canvas.itemconfig(self.shape, width=self.outline_width)
+
+    def get_bounds(self) -> Optional[Bounds]:
+        """
+           Get the bounding box of the shape, including its outline.
+
+           This default bounds the outline of world_coords.
+
+           Returns:
+               Optional[Bounds]: The box (x1, y1, x2, y2), None if the shape has no outline.
+           """
+        bounds = coords_bounds(self.world_coords())
+        if bounds is None:
+            return None
+        pad = self.outline_width / 2
+        return bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad
+
+    def update_index(self) -> None:
+        """
+           Store the current bounding box of the shape in the spatial index.
+
+           Returns:
+               None
+           """
+        bounds = self.get_bounds()
+        if bounds is None:
+            self.document.index.remove(self)
         else:
-            scale_y = 1
-        print(str(size_y) + " -- " + str(scale_y))
-        self.canvas.scale(self.shape, self.x, self.y, scale_x, scale_y)
-        # self.canvas.moveto(self.shape, self.x, self.y)
-        self.last_x = event.x
-        self.last_y = event.y
-        self.update_select_rect()
+            self.document.index.insert(self, bounds)
 
     def get_shape(self) -> Any:
         """
@@ -323,6 +1366,79 @@ class Shape:
            """
         pass
 
+    def get_size(self) -> Tuple[float, float]:
+        """
+           Get the current width and height of the shape.
+
+           This default measures the box of world_coords, without the outline.
+
+           Returns:
+               Tuple[float, float]: The current width and height of the shape.
+           """
+        bounds = coords_bounds(self.world_coords())
+        if bounds is None:
+            return 0, 0
+        return bounds[2] - bounds[0], bounds[3] - bounds[1]
+
+    def restore(self, data: dict, width: float, height: float) -> None:
+        """
+           Restore the outline and matrix of a shape before its canvas item is created.
+
+           Only the shape's attributes change, get_shape then creates the item in its final state with a single
+           canvas call.
+
+           Args:
+               data (dict): The saved attributes of the shape.
+               width (float): The width the shape was created with, for drawings saved without a matrix.
+               height (float): The height the shape was created with, for drawings saved without a matrix.
+
+           Returns:
+               None
+           """
+        self.outline_color = data["outline_color"]
+        self.outline_width = data["outline_width"]
+        self.matrix = saved_matrix(data, (width, height))
+
+    def to_dict(self) -> dict:
+        """
+           Return the attributes of the shape as a JSON-serializable dictionary.
+
+           The matrix restores the shape exactly, x, y and the current size are kept for older readers.
+
+           Returns:
+               dict: The attributes of the shape.
+           """
+        width, height = self.get_size()
+        return {"name": self.__class__.__name__, "x": self.x, "y": self.y, "color": self.color,
+                "outline_color": self.outline_color, "outline_width": self.outline_width,
+                "current_width": width, "current_height": height, "matrix": list(self.matrix)}
+
+    def to_record(self) -> dict:
+        """
+           Return the attributes of the shape like to_dict, but with its points as a copied PointArray.
+
+           Copying the packed points is cheap, turning them into lists is not, so the Tk thread takes records and
+           another thread turns them into dictionaries with encode_record.
+
+           Returns:
+               dict: The attributes of the shape.
+           """
+        return self.to_dict()
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Shape':
+        """
+           Create a shape in a document from the dictionary returned by to_dict.
+
+           Args:
+               document (Document): The document to add the shape to.
+               data (dict): The saved attributes of the shape.
+
+           Returns:
+               Shape: The new shape.
+           """
+        raise NotImplementedError(cls.__name__ + " cannot be loaded")
+
     def __str__(self) -> str:
         """
            Return a string representation of the shape.
@@ -332,121 +1448,207 @@ class Shape:
            Returns:
                str: A string representation of the shape.
            """
-        bbox = self.canvas.bbox(self.shape)
-        width = abs(bbox[0] - bbox[2])
-        height = abs(bbox[1] - bbox[3])
-        return '{"name":"' + self.__class__.__name__ + '", "x":' + str(self.x) + ',"y":' + str(
-            self.y) + ', "color": "' + self.color + '", "outline_color": "' + self.outline_color + (
-            '", "outline_width''": ') + str(
-            self.outline_width) + ', "current_width": ' + str(width) + ', "current_height": ' + str(height)
+        return json.dumps(self.to_dict())
 
 
 # ______________________________________________________
 
 class Rectangle(Shape):
-    def __init__(self, canvas: Canvas, w: int, h: int, color: str) -> None:
+    __slots__ = ("half_w", "half_h")
+
+    def __init__(self, document: Document, w: int, h: int, color: str, create: bool = True) -> None:
         """
             Initialize a Rectangle object.
 
             Args:
-                canvas (Canvas): The tkinter canvas on which the rectangle will be drawn.
+                document (Document): The document of the rectangle, drawn on its canvas.
                 w (int): The width of the rectangle.
                 h (int): The height of the rectangle.
                 color (str): The fill color of the rectangle.
+                create (bool): Whether to create the canvas item now, False leaves it to the caller.
 
             Returns:
                 None
         """
-        super().__init__(canvas, color)
+        super().__init__(document, color)
         self.half_w = w / 2
         self.half_h = h / 2
-        self.shape = self.get_shape()
+        if create:
+            self.create_item()
 
     def get_shape(self) -> Any:
         """
-            Create the rectangle shape on the canvas.
+            Create the rectangle shape on the canvas, as a polygon so that it can be rotated.
 
             Returns:
                 Any: The shape object representing the rectangle.
         """
-        print("Creating rectangle")
-        return self.canvas.create_rectangle(-self.half_w, -self.half_h, self.half_w, self.half_h,
-                                            fill=self.color,
-                                            tags=("clickable" + str(Shape.counter)))
+        logger.debug("Creating rectangle")
+        return self.canvas.create_polygon(self.world_coords(), fill=self.color, outline=self.outline_color,
+                                          width=self.outline_width, joinstyle="miter", tags=SHAPE_TAG)
 
-    def __str__(self) -> str:
+    def base_coords(self) -> Any:
+        """
+            Get the corners of the rectangle around its center.
+
+            Returns:
+                Any: The flat coordinates of the four corners.
         """
-            Return a string representation of the rectangle.
+        half_w, half_h = self.half_w, self.half_h
+        return -half_w, -half_h, half_w, -half_h, half_w, half_h, -half_w, half_h
+
+    def to_dict(self) -> dict:
+        """
+            Return the attributes of the rectangle as a dictionary.
+
+            Returns:
+                dict: The attributes of the rectangle.
+        """
+        data = super().to_dict()
+        data["width"] = self.half_w * 2
+        data["height"] = self.half_h * 2
+        return data
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Rectangle':
+        """
+            Create a rectangle from the dictionary returned by to_dict.
+
+            Args:
+                document (Document): The document to add the rectangle to.
+                data (dict): The saved attributes of the rectangle.
 
             Returns:
-                str: A string representation of the rectangle object.
+                Rectangle: The new rectangle.
         """
-        return super().__str__() + ', "width": ' + str(self.half_w * 2) + ', "height": ' + str(self.half_h * 2) + '}'
+        rect = cls(document, data["width"], data["height"], data["color"], create=False)
+        rect.restore(data, data["width"], data["height"])
+        rect.create_item()
+        return rect
 
 
 # ______________________________________________________
 
 class Elips(Shape):
-    def __init__(self, canvas: Canvas, radius_1: int, radius_2: int, color: str) -> None:
+    __slots__ = ("half_r1", "half_r2")
+
+    def __init__(self, document: Document, radius_1: int, radius_2: int, color: str, create: bool = True) -> None:
         """
             Initialize an Ellipse object.
 
             Args:
-                canvas (Canvas): The tkinter canvas on which the ellipse will be drawn.
+                document (Document): The document of the ellipse, drawn on its canvas.
                 radius_1 (int): The radius of the ellipse along its major axis.
                 radius_2 (int): The radius of the ellipse along its minor axis.
                 color (str): The fill color of the ellipse.
+                create (bool): Whether to create the canvas item now, False leaves it to the caller.
 
             Returns:
                 None
         """
-        super().__init__(canvas, color)
+        super().__init__(document, color)
         self.half_r1: float = radius_1 / 2
         self.half_r2: float = radius_2 / 2
-        self.shape: Any = self.get_shape()
+        if create:
+            self.create_item()
 
     def get_shape(self) -> Any:
         """
-            Create the ellipse shape on the canvas.
+            Create the ellipse shape on the canvas, as a smoothed polygon so that it can be rotated.
 
             Returns:
                 Any: The shape object representing the ellipse.
         """
-        print("Creating oval")
-        points = ((-self.half_r1, -self.half_r2), (self.half_r1, self.half_r2))
-        return self.canvas.create_oval(*points, fill=self.color, tags=("clickable" + str(Shape.counter)))
+        logger.debug("Creating oval")
+        return self.canvas.create_polygon(self.world_coords(), fill=self.color, outline=self.outline_color,
+                                          width=self.outline_width, smooth=True, tags=SHAPE_TAG)
 
-    def __str__(self) -> str:
+    def base_coords(self) -> Any:
+        """
+            Get ELLIPSE_POINTS points on the ellipse around its center.
+
+            Returns:
+                Any: The flat coordinates of the points.
+        """
+        angles = np.linspace(0, 2 * np.pi, ELLIPSE_POINTS, endpoint=False)
+        return np.column_stack((np.cos(angles) * self.half_r1, np.sin(angles) * self.half_r2)).ravel()
+
+    def get_size(self) -> Tuple[float, float]:
         """
-            Return a string representation of the ellipse.
+            Get the current width and height of the box around the ellipse.
 
             Returns:
-                str: A string representation of the ellipse object.
+                Tuple[float, float]: The current width and height of the ellipse.
         """
-        return super().__str__() + ', "radius_1": ' + str(self.half_r1 * 2) + ', "radius_2": ' + str(
-            self.half_r2 * 2) + '}'
+        a, b, c, d = self.matrix[:4]
+        return 2 * math.hypot(a * self.half_r1, c * self.half_r2), 2 * math.hypot(b * self.half_r1, d * self.half_r2)
+
+    def get_bounds(self) -> Optional[Bounds]:
+        """
+            Get the bounding box of the ellipse, including its outline.
+
+            Returns:
+                Optional[Bounds]: The box (x1, y1, x2, y2).
+        """
+        width, height = self.get_size()
+        half_w = width / 2 + self.outline_width / 2
+        half_h = height / 2 + self.outline_width / 2
+        return self.x - half_w, self.y - half_h, self.x + half_w, self.y + half_h
+
+    def to_dict(self) -> dict:
+        """
+            Return the attributes of the ellipse as a dictionary.
+
+            Returns:
+                dict: The attributes of the ellipse.
+        """
+        data = super().to_dict()
+        data["radius_1"] = self.half_r1 * 2
+        data["radius_2"] = self.half_r2 * 2
+        return data
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Elips':
+        """
+            Create an ellipse from the dictionary returned by to_dict.
+
+            Args:
+                document (Document): The document to add the ellipse to.
+                data (dict): The saved attributes of the ellipse.
+
+            Returns:
+                Elips: The new ellipse.
+        """
+        elips = cls(document, data["radius_1"], data["radius_2"], data["color"], create=False)
+        elips.restore(data, data["radius_1"], data["radius_2"])
+        elips.create_item()
+        return elips
 
 
 # ______________________________________________________
 
 class Triangle(Shape):
-    def __init__(self, canvas: Canvas, base: int, height: int, color: str) -> None:
+    __slots__ = ("base", "height")
+
+    def __init__(self, document: Document, base: int, height: int, color: str, create: bool = True) -> None:
         """
                Initialize a Triangle object.
 
                Args:
-                   canvas (Canvas): The tkinter canvas on which the triangle will be drawn.
+                   document (Document): The document of the triangle, drawn on its canvas.
                    base (int): The length of the base of the triangle.
                    height (int): The height of the triangle.
                    color (str): The fill color of the triangle.
+                   create (bool): Whether to create the canvas item now, False leaves it to the caller.
 
                Returns:
                    None
                """
-        super().__init__(canvas, color)
+        super().__init__(document, color)
         self.base = base
         self.height = height
-        self.shape = self.get_shape()
+        if create:
+            self.create_item()
 
     def get_shape(self) -> Any:
         """
@@ -455,47 +1657,77 @@ class Triangle(Shape):
                 Returns:
                     Any: The shape object representing the triangle.
                 """
-        print("creating triangle")
-        x0: float = -self.base / 2
-        y0: float = self.height / 2
-        x1: float = self.base / 2
-        y1: float = self.height / 2
-        x2: float = 0
-        y2: float = -self.height / 2
-        return self.canvas.create_polygon(x0, y0, x1, y1, x2, y2, tags=("clickable" + str(Shape.counter)),
-                                          fill=self.color)
+        logger.debug("creating triangle")
+        return self.canvas.create_polygon(self.world_coords(), tags=SHAPE_TAG,
+                                          fill=self.color, outline=self.outline_color, width=self.outline_width)
 
-    def __str__(self) -> str:
+    def base_coords(self) -> Any:
+        """
+            Get the corners of the triangle around its center, the apex at the top.
+
+            Returns:
+                Any: The flat coordinates of the three corners.
+        """
+        half_base: float = self.base / 2
+        half_height: float = self.height / 2
+        return -half_base, half_height, half_base, half_height, 0.0, -half_height
+
+    def to_dict(self) -> dict:
+        """
+            Return the attributes of the triangle as a dictionary.
+
+            Returns:
+                dict: The attributes of the triangle.
         """
-            Return a string representation of the triangle.
+        data = super().to_dict()
+        data["base"] = self.base
+        data["height"] = self.height
+        return data
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Triangle':
+        """
+            Create a triangle from the dictionary returned by to_dict.
+
+            Args:
+                document (Document): The document to add the triangle to.
+                data (dict): The saved attributes of the triangle.
 
             Returns:
-                str: A string representation of the triangle object.
+                Triangle: The new triangle.
         """
-        return super().__str__() + ', "base": ' + str(self.base) + ', "height": ' + str(self.height) + '}'
+        triangle = cls(document, data["base"], data["height"], data["color"], create=False)
+        triangle.restore(data, data["base"], data["height"])
+        triangle.create_item()
+        return triangle
 
 
 # ______________________________________________________
 
 
 class PolygonShape(Shape):
-    def __init__(self, canvas: Canvas, color: str) -> None:
+    __slots__ = ("lines", "points", "is_drawing", "cursor", "preview", "detail", "detail_level")
+
+    def __init__(self, document: Document, color: str) -> None:
         """
                 Initialize a PolygonShape object.
 
                 Args:
-                    canvas (Canvas): The tkinter canvas on which the polygon will be drawn.
+                    document (Document): The document of the polygon, drawn on its canvas.
                     color (str): The fill color of the polygon.
 
                 Returns:
                     None
                 """
-        super().__init__(canvas, color)
+        super().__init__(document, color)
         self.lines: List[Any] = []
-        self.points: Union[List[List[float]], List[Tuple[float, float]]] = []
-        self.shape: Any = None
+        self.points: PointArray = PointArray()
+        self.shape = None
         self.is_drawing: bool = False
         self.cursor: Any = None
+        self.preview: Any = None
+        self.detail: DetailLevels = DetailLevels()
+        self.detail_level: int = 0
 
     def start_draw(self) -> None:
         """
@@ -504,23 +1736,27 @@ class PolygonShape(Shape):
             Returns:
                 None
         """
-        print("Start drawing polygon")
+        logger.debug("Start drawing polygon")
         if self.is_drawing:
             return
         self.is_drawing = True
         self.bind_motion()
-        self.cursor = self.canvas.create_oval(-5, -5, 5, 5, outline="black", width=2, tags="clickable_bbox")
+        radius = screen_distance(self.canvas, HANDLE_RADIUS)
+        self.cursor = self.canvas.create_oval(-radius, -radius, radius, radius, outline="black", width=2,
+                                              tags=SCREEN_TAG)
 
     def bind_motion(self) -> None:
         """
-            Bind motion events for drawing the polygon.
+            Bind motion events for drawing the polygon, the cursor follows the pointer once per display frame.
 
             Returns:
                 None
         """
-        self.canvas.bind("<Button-1>", self.add_point)
-        self.canvas.bind("<Motion>", self.mouse_move)
+        frames = self.document.frames
+        self.canvas.bind("<Button-1>", frames.flushed(self.add_point))
+        self.canvas.bind("<Motion>", frames.coalesce(self.mouse_move))
 
+    @instrumented
     def mouse_move(self, event: Event) -> None:
         """
             Handle mouse movement during polygon drawing.
@@ -532,41 +1768,68 @@ class PolygonShape(Shape):
                 None
         """
         if self.is_drawing:
-            self.canvas.moveto(self.cursor, event.x - 5, event.y - 5)
-            if len(self.points) >= 1:
-                self.points[len(self.points) - 1][0] = event.x
-                self.points[len(self.points) - 1][1] = event.y
-                self.update_polygon()
-
+            radius = screen_distance(self.canvas, HANDLE_RADIUS)
+            self.canvas.moveto(self.cursor, event.x - radius, event.y - radius)
+            if self.preview is not None:
+                first_x, first_y = self.points[0]
+                last_x, last_y = self.points[-1]
+                self.canvas.coords(self.preview, last_x, last_y, event.x, event.y, first_x, first_y)
+
+    @instrumented
     def add_point(self, event: Event) -> None:
         """
                Add a point to the polygon.
 
+               The point is appended to the coordinates of the existing polygon item, so placing a vertex costs
+               the same however many vertices the polygon already has.
+
                Args:
                    event (Event): The mouse event.
 
                Returns:
                    None
                """
-        print("Adding point")
-        self.points.append([event.x, event.y])
-        if len(self.points) == 1:
-            self.points.append([event.x, event.y])
-        self.update_polygon()
+        logger.debug("Adding point")
+        if self.points and self.points[-1][0] == event.x and self.points[-1][1] == event.y:
+            return
+        self.points.append(event.x, event.y)
+        if len(self.points) <= 2:
+            self.update_polygon()
+        else:
+            self.canvas.insert(self.shape, "end", (event.x, event.y))
+            self.update_index()
+        if self.preview is None:
+            self.preview = self.canvas.create_line(event.x, event.y, event.x, event.y, event.x, event.y,
+                                                   fill=self.outline_color, dash=(4, 2), tags=SCREEN_TAG)
+            if self.cursor is not None:
+                self.canvas.tag_raise(self.cursor)
 
     def update_polygon(self) -> None:
         """
                 Update the polygon shape on the canvas.
 
+                The polygon item is created the first time and its coordinates are replaced in place afterwards.
+                Once the polygon is drawn, the item holds the level of detail of the current zoom.
+
                 Returns:
                     None
                 """
-        if self.shape:
-            self.canvas.delete(self.shape)
-        self.shape = self.canvas.create_polygon(self.points, fill=self.color, outline=self.outline_color,
-                                                width=self.outline_width, tags=("clickable" + str(Shape.counter)))
-        if self.cursor is not None:
-            self.canvas.tag_raise(self.cursor)
+        if not self.points:
+            return
+        coords = self.detail_coords()
+        if len(self.points) == 1:
+            coords = coords * 2
+        if self.shape is None:
+            self.shape = self.canvas.create_polygon(coords, fill=self.color, outline=self.outline_color,
+                                                    width=self.outline_width,
+                                                    tags=SHAPE_TAG)
+            if self.preview is not None:
+                self.canvas.tag_raise(self.preview)
+            if self.cursor is not None:
+                self.canvas.tag_raise(self.cursor)
+        else:
+            self.canvas.coords(self.shape, coords)
+        self.update_index()
 
     def stop_draw(self) -> None:
         """
@@ -575,13 +1838,59 @@ class PolygonShape(Shape):
                 Returns:
                     None
                 """
-        print("Stop drawing polygon")
+        logger.debug("Stop drawing polygon")
         self.is_drawing = False
         self.canvas.unbind("<Motion>")
-        self.canvas.unbind("<Button-1>")
+        self.document.events.bind_canvas()
         self.canvas.delete(self.cursor)
         self.cursor = None
+        if self.preview is not None:
+            self.canvas.delete(self.preview)
+            self.preview = None
+        if self.shape is not None and self.view_detail_level() != self.detail_level:
+            self.update_polygon()
+
+    def view_detail_level(self) -> int:
+        """
+                Get the level of detail of the polygon at the current zoom and size.
+
+                Returns:
+                    int: The level, 0 while the polygon is being drawn.
+                """
+        if self.is_drawing:
+            return 0
+        return view_detail_level(self.canvas, matrix_scale(self.matrix))
+
+    def detail_coords(self) -> List[float]:
+        """
+                Get the canvas coordinates of the polygon at the level of detail of the current zoom.
+
+                Returns:
+                    List[float]: The flat coordinates, with the polygon's matrix applied.
+                """
+        self.detail_level = self.view_detail_level()
+        return self.detail.get(self.points, self.detail_level).mapped(self.matrix)
+
+    def update_item(self) -> None:
+        """
+                Replace the coordinates of the polygon's canvas item after its matrix or the zoom changed.
+
+                Returns:
+                    None
+                """
+        if self.points:
+            self.canvas.coords(self.shape, self.detail_coords() * (2 if len(self.points) == 1 else 1))
+
+    def base_coords(self) -> Any:
+        """
+                Get the points of the polygon, before its matrix.
+
+                Returns:
+                    Any: The flat coordinates of the points.
+                """
+        return self.points.coords
 
+    @instrumented
     def on_select(self, event: Any) -> None:
         """
                 Handle selection of the polygon.
@@ -595,107 +1904,153 @@ class PolygonShape(Shape):
         if not self.is_drawing:
             super().on_select(event)
 
-    def on_scale_object(self, event: Any) -> None:
+    def realize(self) -> None:
         """
-                Handle scaling of the polygon.
+                Create the polygon's canvas item from its points.
 
-                Args:
-                    event (Any): The event triggering the scaling.
+                Returns:
+                    None
+                """
+        self.update_polygon()
+
+    def restyle(self) -> None:
+        """
+                Set the outline width of the polygon's canvas item again, and switch to the level of detail of the
+                new zoom.
 
                 Returns:
                     None
                 """
-        bbox = self.canvas.bbox(self.shape)
-        self.x, self.y = bbox[0], bbox[1]
-        super().on_scale_object(event)
+        super().restyle()
+        if self.view_detail_level() != self.detail_level:
+            self.update_item()
 
-    def __str__(self) -> str:
+    def to_dict(self) -> dict:
+        """
+                Return the attributes of the polygon as a dictionary.
+
+                Returns:
+                    dict: The attributes of the polygon.
+                """
+        return encode_record(self.to_record())
+
+    def to_record(self) -> dict:
+        """
+                Return the attributes of the polygon with a copy of its points.
+
+                Returns:
+                    dict: The attributes of the polygon.
+                """
+        data = super().to_dict()
+        data["points"] = self.points.copy()
+        return data
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'PolygonShape':
         """
-                Return a string representation of the polygon.
+                Create a polygon from the dictionary returned by to_dict.
+
+                Args:
+                    document (Document): The document to add the polygon to.
+                    data (dict): The saved attributes of the polygon.
 
                 Returns:
-                    str: A string representation of the polygon object.
+                    PolygonShape: The new polygon.
                 """
-        coords = self.canvas.coords(self.shape)
-        self.points: List[List[float]] = []
-        print(str(len(coords)))
-        i = 0
-        while i < (len(coords) - 1):
-            print(str(i) + " " + str(coords[i]))
-            self.points.append([coords[i], coords[i + 1]])
-            i = i + 2
-        return super().__str__() + ', "points": ' + str(self.points) + '}'
+        polygon = cls(document, data["color"])
+        # The points of drawings saved without a matrix were already in drawing coordinates
+        polygon.matrix = saved_matrix(data) if "matrix" in data else IDENTITY_MATRIX
+        polygon.points = PointArray(data["points"])
+        polygon.outline_color = data["outline_color"]
+        polygon.outline_width = data["outline_width"]
+        polygon.create_item()
+        return polygon
 
 
 # ______________________________________________________
 
 class Lines(Shape):
-    def __init__(self, canvas: Canvas, color: str) -> None:
+    __slots__ = ("drawn_points", "prev_x", "prev_y", "width", "detail", "detail_level", "pushed")
+    style_options: Tuple[str, ...] = ("fill", "width")
+    # Maximum distance (in pixels) a simplified stroke may stray from the drawn one, None disables simplification
+    simplify_tolerance: Optional[float] = 1.0
+
+    def __init__(self, document: Document, color: str, drawing: bool = True) -> None:
         """
                Initialize a Lines object.
 
+               A Lines object is a single freehand stroke. The whole stroke is kept in one canvas line item
+               whose coordinates grow while the user draws. Every input point is kept, the item only receives the
+               new ones once per display frame. A stroke drawn with the mouse joins its document on the first motion
+               event, so choosing the pen or eraser without drawing leaves no empty stroke behind.
+
                Args:
-                   canvas (Canvas): The tkinter canvas on which the lines will be drawn.
+                   document (Document): The document of the lines, drawn on its canvas.
                    color (str): The color of the lines.
+                   drawing (bool): Whether the stroke is drawn with the mouse. When False the canvas is left
+                       unbound and the points are expected to be set by the caller.
 
                Returns:
                    None
                """
         if color == "white":
             color = "black"
-        super().__init__(canvas, color)
-        self.lines: set = set()
-        self.drawn_points: List[List[int]] = []
-        self.canvas.bind("<Button-1>", self.on_start_draw)
-        self.canvas.bind("<B1-Motion>", self.on_draw)
-        self.canvas.bind("<ButtonRelease-1>", self.on_stop_draw)
+        super().__init__(document, color)
+        self.drawn_points: PointArray = PointArray()
         self.prev_x: int = 0
         self.prev_y: int = 0
-        self.width: int = Shape.current_width
-        Shape.line_mode = True
+        self.width: int = self.document.current_width
+        self.detail: DetailLevels = DetailLevels()
+        self.detail_level: int = 0
+        self.pushed: int = 0
+        if drawing:
+            document.shapes.remove(self)
+            self.canvas.bind("<Button-1>", self.on_start_draw)
+            self.canvas.bind("<B1-Motion>", self.on_draw)
+            self.canvas.bind("<ButtonRelease-1>", self.document.frames.flushed(self.on_stop_draw))
+            self.document.line_mode = True
 
-    def delete(self, **kwargs: Any) -> None:
+    def get_fill(self) -> str:
         """
-                Delete the lines from the canvas.
+                Get the color used to paint the stroke on the canvas.
 
                 Returns:
-                    None
+                    str: The fill color of the stroke.
                 """
-        for line_id in self.lines:
-            self.canvas.delete(line_id)
+        return self.color
 
-    def on_drag(self, event: Event) -> None:
+    def set_outline(self, outline_color: str, outline_width: int) -> None:
         """
-                Handle dragging of the lines.
+                Set the outline color and width of the lines.
 
                 Args:
-                    event (Event): The mouse event.
+                    outline_color (str): The color of the outline.
+                    outline_width (int): The width of the outline.
 
                 Returns:
                     None
                 """
-        dx = event.x - self.last_x
-        dy = event.y - self.last_y
-        for line_id in self.lines:
-            self.canvas.move(line_id, dx, dy)
-        self.last_x = event.x
-        self.last_y = event.y
+        self.outline_width = outline_width
+        self.outline_color = outline_color
+        self.width = outline_width
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, width=outline_width)
+        self.update_index()
 
-    def set_outline(self, outline_color: str, outline_width: int) -> None:
+    def set_style(self, option: str, value: Any) -> None:
         """
-                Set the outline color and width of the lines.
+                Set one of the style_options of the lines, the width is the width of the stroke.
 
                 Args:
-                    outline_color (str): The color of the outline.
-                    outline_width (int): The width of the outline.
+                    option (str): "fill" or "width".
+                    value (Any): The color or width.
 
                 Returns:
                     None
                 """
-        self.outline_width = outline_width
-        self.outline_color = outline_color
-        for line_id in self.lines:
-            self.canvas.itemconfig(line_id, width=outline_width)
+        if option == "width":
+            self.width = value
+        super().set_style(option, value)
 
     def set_color(self, color: str) -> None:
         """
@@ -708,8 +2063,8 @@ class Lines(Shape):
                     None
                 """
         self.color = color
-        for line_id in self.lines:
-            self.canvas.itemconfig(line_id, fill=color)
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, fill=color)
 
     def set_outline_color(self, shape: Any, color: str) -> None:
         """
@@ -722,8 +2077,9 @@ class Lines(Shape):
                Returns:
                    None
                """
-        print("set_outline_color")
+        logger.debug("set_outline_color")
 
+    @instrumented
     def on_start_draw(self, event: Event) -> None:
         """
                Handle the start of drawing lines.
@@ -735,51 +2091,129 @@ class Lines(Shape):
                    None
                """
         self.prev_x, self.prev_y = event.x, event.y
+        self.drawn_points = PointArray()
+        self.drawn_points.append(event.x, event.y)
+        self.pushed = 0
+        self.detail.clear()
+        self.detail_level = 0
 
+    @instrumented
     def on_draw(self, event: Event) -> None:
         """
                 Handle drawing lines.
 
+                Every motion event adds its point to the stroke, the canvas item is updated by push_points at the
+                next display frame.
+
                 Args:
                     event (Event): The mouse event.
 
                 Returns:
                     None
                 """
+        if self not in self.document.shapes:
+            self.z = self.document.next_z()
+            self.document.shapes.add(self)
         x, y = event.x, event.y
-        self.drawn_points.append([x, y])
-        self.shape = self.canvas.create_line(self.prev_x, self.prev_y, x, y, fill=self.color, width=self.width,
-                                             tags=("clickable" + str(Shape.counter)))
-        self.lines.add(self.shape)
+        self.drawn_points.append(x, y)
         self.prev_x, self.prev_y = x, y
+        self.document.frames.schedule(self.push_points, event)
+
+    @instrumented
+    def push_points(self, event: Event) -> None:
+        """
+                Append the points drawn since the last frame to the stroke's line item, with a single canvas call.
+
+                The item is created once the stroke has two points.
+
+                Args:
+                    event (Event): The latest motion event, unused as on_draw kept every point.
 
-    def draw_select_rect(self) -> None:
+                Returns:
+                    None
+                """
+        count = len(self.drawn_points)
+        if self.shape is None:
+            if count < 2:
+                return
+            self.shape = self.canvas.create_line(self.drawn_points.flat(), fill=self.get_fill(), width=self.width,
+                                                 tags=SHAPE_TAG)
+        elif count > self.pushed:
+            self.canvas.insert(self.shape, "end", self.drawn_points.coords[2 * self.pushed:].tolist())
+        self.pushed = count
+
+    def connect_points(self) -> None:
         """
-               Draw the selection rectangle.
+               Connect the drawn points with a single line item.
 
                Returns:
                    None
                """
-        if Shape.select_bbox is not None:
-            self.canvas.delete(Shape.select_bbox)
-        if Shape.select_circle is not None:
-            self.canvas.delete(Shape.select_circle)
-        Shape.select_bbox = None
-        Shape.select_circle = None
+        if len(self.drawn_points) < 2:
+            return
+        self.shape = self.canvas.create_line(self.detail_coords(), fill=self.get_fill(), width=self.width,
+                                             tags=SHAPE_TAG)
 
-    def connect_points(self) -> None:
+    def view_detail_level(self) -> int:
+        """
+               Get the level of detail of the stroke at the current zoom and size.
+
+               Returns:
+                   int: The level, 0 draws every point.
+               """
+        return view_detail_level(self.canvas, matrix_scale(self.matrix))
+
+    def detail_coords(self) -> List[float]:
+        """
+               Get the canvas coordinates of the stroke at the level of detail of the current zoom.
+
+               Returns:
+                   List[float]: The flat coordinates, with the stroke's matrix applied.
+               """
+        self.detail_level = self.view_detail_level()
+        return self.detail.get(self.drawn_points, self.detail_level).mapped(self.matrix)
+
+    def base_coords(self) -> Any:
+        """
+               Get the drawn points of the stroke, before its matrix.
+
+               Returns:
+                   Any: The flat coordinates of the points.
+               """
+        return self.drawn_points.coords
+
+    def update_item(self) -> None:
+        """
+               Replace the coordinates of the stroke's canvas item after its points, its matrix or the zoom changed.
+
+               Returns:
+                   None
+               """
+        if self.shape is not None and len(self.drawn_points) >= 2:
+            self.canvas.coords(self.shape, self.detail_coords())
+
+    def realize(self) -> None:
+        """
+               Create the stroke's canvas item from its points.
+
+               Returns:
+                   None
+               """
+        self.connect_points()
+
+    def restyle(self) -> None:
         """
-               Connect the drawn points with lines.
+               Set the width of the stroke's canvas item again after the canvas zoom changed, and switch to the
+               level of detail of the new zoom.
 
                Returns:
                    None
                """
-        for i in range(len(self.drawn_points) - 1):
-            x1, y1 = self.drawn_points[i]
-            x2, y2 = self.drawn_points[i + 1]
-            line_id = self.canvas.create_line(x1, y1, x2, y2, fill=self.color, width=self.width)
-            self.lines.add(line_id)
+        self.canvas.itemconfig(self.shape, width=self.width)
+        if self.view_detail_level() != self.detail_level:
+            self.update_item()
 
+    @instrumented
     def on_stop_draw(self, event: Event) -> None:
         """
                Handle the end of drawing lines.
@@ -790,66 +2224,272 @@ class Lines(Shape):
                Returns:
                    None
                """
-        Shape.line_mode = False
-        self.canvas.unbind("<Button-1>")
-        self.canvas.unbind("<B1-Motion>")
-        self.canvas.unbind("<ButtonRelease-1>")
+        self.document.line_mode = False
+        self.document.events.bind_canvas()
+        if self not in self.document.shapes:
+            # The button was released without moving, there is no stroke
+            return
+        self.simplify(Lines.simplify_tolerance)
+        if self.view_detail_level() != self.detail_level:
+            self.update_item()
+        self.update_index()
+        self.record_creation()
 
-    def __str__(self) -> str:
+    def record_creation(self) -> None:
+        """
+               Record the stroke that was just drawn in the history.
+
+               Returns:
+                   None
+               """
+        if self.shape is not None:
+            self.document.history.record(CreateCommand([self]))
+
+    def set_points(self, points: PointArray) -> None:
+        """
+               Replace the points of the stroke, e.g. when an erasure is undone.
+
+               Args:
+                   points (PointArray): The new points, before the stroke's matrix.
+
+               Returns:
+                   None
+               """
+        self.drawn_points = points
+        self.detail.clear()
+        if self not in self.document.index:
+            return
+        if self.shape is not None:
+            self.update_item()
+        elif isinstance(self.canvas, ViewCanvas):
+            self.canvas.request_refresh()
+        self.update_index()
+
+    def simplify(self, tolerance: Optional[float]) -> None:
+        """
+               Simplify the stroke with the Ramer-Douglas-Peucker algorithm.
+
+               Both the stored points and the canvas item are replaced by the simplified stroke.
+
+               Args:
+                   tolerance (Optional[float]): The maximum distance between the drawn and the simplified stroke.
+                       None leaves the stroke untouched.
+
+               Returns:
+                   None
+               """
+        if tolerance is None or len(self.drawn_points) < 3:
+            return
+        simplified = simplify_points(self.drawn_points, tolerance)
+        if len(simplified) == len(self.drawn_points):
+            return
+        self.drawn_points = PointArray(simplified)
+        self.detail.clear()
+        if self.shape is not None and len(simplified) >= 2:
+            self.update_item()
+            self.update_index()
+
+    @staticmethod
+    def simplify_document(document: Document, tolerance: Optional[float] = None) -> None:
+        """
+               Re-simplify every Lines and Eraser stroke of a document, as one command of its history.
+
+               Args:
+                   document (Document): The document.
+                   tolerance (Optional[float]): The tolerance to use, defaults to Lines.simplify_tolerance.
+
+               Returns:
+                   None
+               """
+        if tolerance is None:
+            tolerance = Lines.simplify_tolerance
+        command = SimplifyCommand()
+        for shape in document.shapes:
+            if isinstance(shape, Lines):
+                before = shape.drawn_points
+                shape.simplify(tolerance)
+                if shape.drawn_points is not before:
+                    command.add(shape, before, shape.drawn_points)
+        if command.changes:
+            document.history.record(command)
+
+    def cut(self, grid: SegmentGrid, eraser_radius: float) -> Optional[List['Lines']]:
+        """
+               Cut the parts of the stroke covered by an eraser path.
+
+               The stroke is shortened, split into several strokes or deleted, depending on what is left of it.
+               A stroke that was scaled, rotated or flipped is cut in drawing coordinates and what is left of it is
+               mapped back to its own.
+
+               Args:
+                   grid (SegmentGrid): The segments of the eraser path.
+                   eraser_radius (float): Half the width of the eraser.
+
+               Returns:
+                   Optional[List[Lines]]: The strokes split off this one, None if the eraser missed the stroke.
+               """
+        radius = eraser_radius + float(self.width) / 2
+        if is_translation(self.matrix):
+            runs = erase_polyline(list(self.drawn_points), grid, radius, self.x, self.y)
+        else:
+            world = PointArray.from_coords(self.drawn_points.mapped(self.matrix))
+            runs = erase_polyline(list(world), grid, radius)
+            if runs:
+                inverse = invert(self.matrix)
+                runs = [[transform_point(inverse, x, y) for x, y in run] for run in runs]
+        if runs is None:
+            return None
+        if not runs:
+            self.delete()
+            return []
+        self.drawn_points = PointArray(runs[0])
+        self.detail.clear()
+        self.update_item()
+        self.update_index()
+        pieces = []
+        above = self
+        for run in runs[1:]:
+            piece = Lines(self.document, self.color, drawing=False)
+            # A stroke can be white, e.g. a piece of one, which the constructor would turn black
+            piece.color = self.color
+            piece.width = self.width
+            piece.outline_color = self.outline_color
+            piece.outline_width = self.outline_width
+            piece.matrix = self.matrix
+            piece.drawn_points = PointArray(run)
+            # Stack the piece between the stroke it was cut from and the next shape
+            self.document.shapes.place_above(piece, above)
+            piece.create_item()
+            if piece.shape is not None and above.shape is not None:
+                self.canvas.tag_raise(piece.shape, above.shape)
+            above = piece
+            pieces.append(piece)
+        return pieces
+
+    def get_bounds(self) -> Optional[Bounds]:
+        """
+               Get the bounding box of the stroke, including its width.
+
+               Returns:
+                   Optional[Bounds]: The box (x1, y1, x2, y2), None if the stroke has no points.
+               """
+        if is_translation(self.matrix):
+            bounds = self.drawn_points.bounds()
+            if bounds is not None:
+                bounds = bounds[0] + self.x, bounds[1] + self.y, bounds[2] + self.x, bounds[3] + self.y
+        else:
+            bounds = coords_bounds(self.world_coords())
+        if bounds is None:
+            return None
+        pad = float(self.width) / 2
+        return bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad
+
+    def to_dict(self) -> dict:
+        """
+               Return the attributes of the stroke as a dictionary.
+
+               The points are before the stroke's matrix, which holds how it was dragged, scaled and rotated.
+
+               Returns:
+                   dict: The attributes of the stroke.
+               """
+        return encode_record(self.to_record())
+
+    def to_record(self) -> dict:
+        """
+               Return the attributes of the stroke with a copy of its points.
+
+               Returns:
+                   dict: The attributes of the stroke.
+               """
+        data = super().to_dict()
+        data["width"] = self.width
+        data["lines"] = self.drawn_points.copy()
+        return data
+
+    def load_points(self, data: dict) -> None:
+        """
+               Restore the attributes and points of a stroke from the dictionary returned by to_dict.
+
+               Args:
+                   data (dict): The saved attributes of the stroke.
+
+               Returns:
+                   None
+               """
+        self.outline_color = data["outline_color"]
+        self.outline_width = data["outline_width"]
+        self.width = data["width"]
+        self.matrix = saved_matrix(data)
+        self.drawn_points = PointArray(data["lines"])
+        self.detail.clear()
+        self.create_item()
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Lines':
         """
-               Return a string representation of the Lines object.
+               Create a stroke from the dictionary returned by to_dict.
+
+               Args:
+                   document (Document): The document to add the stroke to.
+                   data (dict): The saved attributes of the stroke.
 
                Returns:
-                   str: A string representation of the Lines object.
+                   Lines: The new stroke.
                """
-        return super().__str__() + ', "width": ' + str(self.width) + ', "lines": ' + str(self.drawn_points) + '}'
+        lines = cls(document, data["color"], drawing=False)
+        lines.color = data["color"]
+        lines.load_points(data)
+        return lines
 
 
 # ______________________________________________________
 class Eraser(Lines):
-    def __init__(self, canvas: Canvas) -> None:
+    __slots__ = ()
+    # An eraser stroke is always painted white
+    style_options: Tuple[str, ...] = ("width",)
+    # True cuts the eraser path out of the strokes it crosses, False paints it white like a brush stroke
+    geometric: bool = True
+
+    def __init__(self, document: Document, drawing: bool = True) -> None:
         """
                 Initialize an Eraser object.
 
                 Args:
-                    canvas (Canvas): The tkinter canvas on which the eraser will be used.
+                    document (Document): The document of the eraser, drawn on its canvas.
+                    drawing (bool): Whether the eraser is used with the mouse, False for loaded eraser strokes.
 
                 Returns:
                     None
                 """
-        super().__init__(canvas, "white")
-        self.drawn_points: List[List[int]] = []
+        super().__init__(document, "white", drawing)
 
-    def on_draw(self, event: Event) -> None:
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'Eraser':
         """
-                Handle drawing with the eraser.
+                Create an eraser stroke from the dictionary returned by to_dict.
 
                 Args:
-                    event (Event): The mouse event.
+                    document (Document): The document to add the eraser stroke to.
+                    data (dict): The saved attributes of the eraser stroke.
 
                 Returns:
-                    None
+                    Eraser: The new eraser stroke.
                 """
-        x, y = event.x, event.y
-        self.drawn_points.append([x, y])
-        self.shape = self.canvas.create_line(self.prev_x, self.prev_y, x, y, fill="white", width=self.width,
-                                             tags=("clickable" + str(Shape.counter)))
-        self.lines.add(self.shape)
-        self.prev_x, self.prev_y = x, y
+        eraser = cls(document, drawing=False)
+        eraser.load_points(data)
+        return eraser
 
-    def connect_points(self) -> None:
+    def get_fill(self) -> str:
         """
-                Connect the drawn points with lines for the eraser.
+                Get the color used to paint the eraser stroke on the canvas.
 
                 Returns:
-                    None
+                    str: Always white, the color of the canvas background.
                 """
-        for i in range(len(self.drawn_points) - 1):
-            x1, y1 = self.drawn_points[i]
-            x2, y2 = self.drawn_points[i + 1]
-            line_id = self.canvas.create_line(x1, y1, x2, y2, fill="white", width=Shape.current_width)
-            self.lines.add(line_id)
+        return "white"
 
+    @instrumented
     def on_stop_draw(self, event: Event) -> None:
         """
                 Handle the end of using the eraser.
@@ -862,17 +2502,67 @@ class Eraser(Lines):
                 """
         super().on_stop_draw(event)
         self.canvas.config(cursor="arrow")
+        if Eraser.geometric:
+            self.erase()
+
+    def record_creation(self) -> None:
+        """
+                Record the eraser stroke in the history when it is painted, erase() records what a geometric
+                eraser cut instead.
+
+                Returns:
+                    None
+                """
+        if not Eraser.geometric:
+            super().record_creation()
+
+    @instrumented
+    def erase(self) -> None:
+        """
+                Remove the ink under the eraser path from the brush strokes it crosses.
+
+                The eraser stroke itself is deleted afterwards, so erasing never adds items to the canvas. The cuts
+                are recorded in the history as one step.
+
+                Returns:
+                    None
+                """
+        bounds = self.get_bounds()
+        points = self.drawn_points
+        self.delete()
+        if bounds is None:
+            return
+        # The bounds of the strokes in the index include their width, so the eraser path's own bounds find them all
+        strokes = [shape for shape in self.document.index.query_rect(bounds)
+                   if isinstance(shape, Lines) and not isinstance(shape, Eraser)]
+        if not strokes:
+            return
+        radius = float(self.width) / 2
+        reach = radius + max(float(stroke.width) / 2 for stroke in strokes)
+        grid = SegmentGrid(2 * reach)
+        grid.add_polyline(PointArray.from_coords(points.mapped(self.matrix)))
+        command = EraseCommand()
+        for stroke in strokes:
+            before = stroke.drawn_points
+            pieces = stroke.cut(grid, radius)
+            if pieces is not None:
+                command.add(stroke, before, stroke.drawn_points if stroke in self.document.index else None, pieces)
+        if command.changes:
+            self.document.history.record(command)
 
 
 # ______________________________________________________
 class TextShape(Shape):
-    def __init__(self, canvas: Canvas, text: str, font_family: str = "Arial", font_size: int = 12,
+    __slots__ = ("text", "font_family", "font_size", "font_style", "initial_x", "initial_y")
+    style_options: Tuple[str, ...] = ("fill",)
+
+    def __init__(self, document: Document, text: str, font_family: str = "Arial", font_size: int = 12,
                  font_style: str = "normal", color: str = "black") -> None:
         """
                Initialize a TextShape object.
 
                Args:
-                   canvas (Canvas): The tkinter canvas on which the text will be drawn.
+                   document (Document): The document of the text, drawn on its canvas.
                    text (str): The text content.
                    font_family (str): The font family.
                    font_size (int): The font size.
@@ -882,7 +2572,7 @@ class TextShape(Shape):
                Returns:
                    None
                """
-        super().__init__(canvas, color)
+        super().__init__(document, color)
         self.text: str = text
         self.font_family: str = font_family
         self.font_size: int = font_size
@@ -890,6 +2580,8 @@ class TextShape(Shape):
         self.shape = None
         self.initial_x = 0
         self.initial_y = 0
+        self.x = 30
+        self.y = 30
 
     def on_drag_start(self, event):
         self.initial_x = event.x
@@ -902,9 +2594,71 @@ class TextShape(Shape):
                 Returns:
                     None
                 """
-        self.shape = self.canvas.create_text(30, 30, text=self.text, fill=self.color,
+        self.shape = self.canvas.create_text(self.x, self.y, text=self.text, fill=self.color,
                                              font=(self.font_family, self.font_size, self.font_style),
-                                             tags=("clickable" + str(Shape.counter)))
+                                             tags=SHAPE_TAG)
+        self.update_index()
+
+    def realize(self) -> None:
+        """
+                Create the text's canvas item.
+
+                Returns:
+                    None
+                """
+        self.add_text()
+
+    def restyle(self) -> None:
+        """
+                Set the font of the text's canvas item again, after the canvas zoom changed.
+
+                Returns:
+                    None
+                """
+        self.canvas.itemconfig(self.shape, font=(self.font_family, self.font_size, self.font_style))
+
+    def get_bounds(self) -> Optional[Bounds]:
+        """
+                Get the bounding box of the text.
+
+                The canvas measures the text while it has an item, otherwise the last measured box is used, or an
+                estimate from the font size for a text that was never shown.
+
+                Returns:
+                    Optional[Bounds]: The box (x1, y1, x2, y2).
+                """
+        if self.shape is not None:
+            return self.canvas.bbox(self.shape)
+        bounds = self.document.index.bounds(self)
+        if bounds is not None:
+            return bounds
+        lines = self.text.split("\n")
+        half_w = max(len(line) for line in lines) * self.font_size * 0.4 + 1
+        half_h = len(lines) * self.font_size * 0.9
+        return self.x - half_w, self.y - half_h, self.x + half_w, self.y + half_h
+
+    def transform_model(self, matrix: Matrix, combined: Optional[Matrix] = None) -> None:
+        """
+                Move the text where the transform takes its position, its font keeps its size and orientation.
+
+                Args:
+                    matrix (Matrix): The transform.
+                    combined (Optional[Matrix]): Ignored, the matrix of a text is only ever a translation.
+
+                Returns:
+                    None
+                """
+        x, y = transform_point(matrix, self.x, self.y)
+        super().transform_model(translation(x - self.x, y - self.y))
+
+    def update_item(self) -> None:
+        """
+                Move the text's canvas item to its position.
+
+                Returns:
+                    None
+                """
+        self.canvas.coords(self.shape, self.x, self.y)
 
     def set_outline(self, outline_color: str, outline_width: int) -> None:
         """
@@ -917,7 +2671,7 @@ class TextShape(Shape):
                 Returns:
                     None
                 """
-        print("set_outline_color")
+        logger.debug("set_outline_color")
 
     def set_outline_color(self, shape: Any, color: str) -> None:
         """
@@ -930,11 +2684,41 @@ class TextShape(Shape):
                 Returns:
                     None
                 """
-        print("set_outline_color")
+        logger.debug("set_outline_color")
 
-    def __str__(self) -> str:
-        return super().__str__() + ', "text": "' + self.text + '" , "font_family": "' + self.font_family + '" , "font_size": ' + str(
-            self.font_size) + ', "font_style": "' + self.font_style + '"}'
+    def to_dict(self) -> dict:
+        """
+        Return the attributes of the text as a dictionary.
+
+        Returns:
+            dict: The attributes of the text.
+        """
+        data = super().to_dict()
+        data["text"] = self.text
+        data["font_family"] = self.font_family
+        data["font_size"] = self.font_size
+        data["font_style"] = self.font_style
+        return data
+
+    @classmethod
+    def from_dict(cls, document: Document, data: dict) -> 'TextShape':
+        """
+        Create a text from the dictionary returned by to_dict.
+
+        Args:
+            document (Document): The document to add the text to.
+            data (dict): The saved attributes of the text.
+
+        Returns:
+            TextShape: The new text.
+        """
+        text_shape = cls(document, data["text"], data["font_family"], data["font_size"], data["font_style"],
+                         data["color"])
+        text_shape.outline_color = data["outline_color"]
+        text_shape.outline_width = data["outline_width"]
+        text_shape.set_position(data["x"], data["y"])
+        text_shape.create_item()
+        return text_shape
 
     def set_position(self, x: int, y: int) -> None:
         """
@@ -947,7 +2731,14 @@ class TextShape(Shape):
         Returns:
             None
         """
-        self.canvas.coords(self.shape, x, y)
+        dx, dy = x - self.x, y - self.y
+        self.x = x
+        self.y = y
+        if self.shape is not None:
+            self.canvas.coords(self.shape, x, y)
+            self.update_index()
+        else:
+            self.document.index.move(self, dx, dy)
 
     def set_color(self, color: str) -> None:
         """
@@ -960,4 +2751,5 @@ class TextShape(Shape):
             None
         """
         self.color = color
-        self.canvas.itemconfig(self.shape, fill=self.color)
\ No newline at end of file
+        if self.shape is not None:
+            self.canvas.itemconfig(self.shape, fill=self.color)
\ No newline at end of file
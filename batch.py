@@ -0,0 +1,271 @@
+"""
+Headless batch conversion of saved drawings to PNG renders and thumbnails.
+
+Run through "python main.py batch"; no Tk window is created. Every drawing is converted in its own worker process
+into <name>.png, rendered at the requested scale, and <name>.thumb.png, fitted into a square of the thumbnail size.
+A drawing whose outputs are both newer than it is skipped unless --force is given. Drawings that would write the
+same outputs, like a.json and a.pbin, fail except for the first one listed.
+"""
+import glob
+import logging
+import os
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+from typing import Dict, List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+from PIL import Image
+
+from render import DEFAULT_SUPERSAMPLE, render_document
+from tiles import iter_drawing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMBNAIL_SIZE: int = 256
+RENDER_SUFFIX: str = ".png"
+THUMBNAIL_SUFFIX: str = ".thumb.png"
+
+
+class BatchOptions(NamedTuple):
+    """
+        The settings shared by every conversion of a batch.
+
+        Attributes:
+            output_dir (Optional[str]): The directory of the outputs, None writes them next to each drawing.
+            scale (float): The number of pixels per canvas pixel of the full render.
+            thumbnail_size (int): The largest side of a thumbnail in pixels.
+            supersample (int): The supersampling factor, 1 disables anti-aliasing.
+            force (bool): Whether to convert drawings whose outputs are up to date.
+    """
+    output_dir: Optional[str] = None
+    scale: float = 1.0
+    thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE
+    supersample: int = DEFAULT_SUPERSAMPLE
+    force: bool = False
+
+
+class BatchResult(NamedTuple):
+    """
+        The outcome of converting one drawing.
+
+        Attributes:
+            source (str): The drawing.
+            status (str): "rendered", "skipped" or "failed".
+            seconds (float): The time spent on the drawing.
+            shapes (int): The number of shapes rendered.
+            error (Optional[str]): The error message of a failed conversion.
+    """
+    source: str
+    status: str
+    seconds: float
+    shapes: int = 0
+    error: Optional[str] = None
+
+
+def expand_patterns(patterns: Sequence[str]) -> List[str]:
+    """
+        Expand glob patterns into a sorted list of files, each listed once.
+
+        Args:
+            patterns (Sequence[str]): The patterns, "**" matches any number of directories.
+
+        Returns:
+            List[str]: The matching files.
+    """
+    found = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches:
+            logger.warning("No drawing matches %s", pattern)
+        found.update(path for path in matches if os.path.isfile(path))
+    return sorted(found)
+
+
+def output_paths(source: str, output_dir: Optional[str]) -> Tuple[str, str]:
+    """
+        Get the paths of the outputs of a drawing.
+
+        Args:
+            source (str): The drawing.
+            output_dir (Optional[str]): The directory of the outputs, None writes them next to the drawing.
+
+        Returns:
+            Tuple[str, str]: The paths of the full render and of the thumbnail.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    directory = output_dir if output_dir is not None else os.path.dirname(source)
+    return os.path.join(directory, stem + RENDER_SUFFIX), os.path.join(directory, stem + THUMBNAIL_SUFFIX)
+
+
+def find_collisions(sources: Sequence[str], output_dir: Optional[str]) -> Dict[str, str]:
+    """
+        Find the drawings whose outputs would overwrite those of an earlier drawing.
+
+        Outputs are named after the drawing without its extension, so a.json and a.pbin, or two a.json in different
+        directories converted into one output directory, would write the same files.
+
+        Args:
+            sources (Sequence[str]): The drawings, in the order they are listed.
+            output_dir (Optional[str]): The directory of the outputs, None writes them next to each drawing.
+
+        Returns:
+            Dict[str, str]: Every colliding drawing mapped to the earlier drawing it collides with.
+    """
+    owners: Dict[str, str] = {}
+    collisions: Dict[str, str] = {}
+    for source in sources:
+        key = os.path.normcase(os.path.abspath(output_paths(source, output_dir)[0]))
+        if key in owners:
+            collisions[source] = owners[key]
+        else:
+            owners[key] = source
+    return collisions
+
+
+def is_up_to_date(source: str, outputs: Sequence[str]) -> bool:
+    """
+        Check whether every output of a drawing is newer than the drawing.
+
+        Args:
+            source (str): The drawing.
+            outputs (Sequence[str]): The output files.
+
+        Returns:
+            bool: True if no output needs to be rebuilt.
+    """
+    source_time = os.path.getmtime(source)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= source_time for path in outputs)
+
+
+def convert_drawing(source: str, options: BatchOptions) -> BatchResult:
+    """
+        Render one drawing and its thumbnail.
+
+        Errors are reported in the result instead of raised, so that one broken file does not stop a batch.
+
+        Args:
+            source (str): The drawing, JSON or binary.
+            options (BatchOptions): The settings of the batch.
+
+        Returns:
+            BatchResult: The outcome.
+    """
+    start = time.perf_counter()
+    render_path, thumbnail_path = output_paths(source, options.output_dir)
+    try:
+        if not options.force and is_up_to_date(source, (render_path, thumbnail_path)):
+            return BatchResult(source, "skipped", time.perf_counter() - start)
+        items = list(iter_drawing(source))
+        image = render_document(items, scale=options.scale, supersample=options.supersample)
+        image.save(render_path)
+        image.thumbnail((options.thumbnail_size, options.thumbnail_size), Image.BOX)
+        image.save(thumbnail_path)
+    except Exception as error:
+        # One broken drawing must not stop the batch, whatever it raises
+        return BatchResult(source, "failed", time.perf_counter() - start,
+                           error="%s: %s" % (type(error).__name__, error))
+    return BatchResult(source, "rendered", time.perf_counter() - start, len(items))
+
+
+def _convert_job(job: Tuple[str, BatchOptions]) -> BatchResult:
+    """
+        Unpack the arguments of convert_drawing, for Pool.imap_unordered.
+
+        Args:
+            job (Tuple[str, BatchOptions]): The drawing and the settings of the batch.
+
+        Returns:
+            BatchResult: The outcome.
+    """
+    return convert_drawing(*job)
+
+
+def run_batch(patterns: Sequence[str], options: BatchOptions, workers: Optional[int] = None,
+              stream: TextIO = sys.stdout) -> List[BatchResult]:
+    """
+        Convert every drawing matching some patterns, in parallel.
+
+        A line with the timing of every drawing is written as it completes, followed by a summary.
+
+        Args:
+            patterns (Sequence[str]): Glob patterns of the drawings.
+            options (BatchOptions): The settings of the batch.
+            workers (Optional[int]): The number of processes, None uses every core and 1 runs in this process.
+            stream (TextIO): Where to write the report.
+
+        Returns:
+            List[BatchResult]: The outcomes in completion order.
+    """
+    start = time.perf_counter()
+    sources = expand_patterns(patterns)
+    if options.output_dir is not None:
+        os.makedirs(options.output_dir, exist_ok=True)
+    workers = min(workers or cpu_count(), max(len(sources), 1))
+    collisions = find_collisions(sources, options.output_dir)
+    results = [BatchResult(source, "failed", 0.0, error="its outputs would overwrite those of " + owner)
+               for source, owner in collisions.items()]
+    for result in results:
+        write_result(result, stream)
+    jobs = [(source, options) for source in sources if source not in collisions]
+    if workers <= 1:
+        completed = map(_convert_job, jobs)
+        pool = None
+    else:
+        pool = Pool(workers)
+        completed = pool.imap_unordered(_convert_job, jobs)
+    try:
+        for result in completed:
+            results.append(result)
+            write_result(result, stream)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    write_summary(results, time.perf_counter() - start, workers, stream)
+    return results
+
+
+def write_result(result: BatchResult, stream: TextIO) -> None:
+    """
+        Write the line of one drawing of a batch.
+
+        Args:
+            result (BatchResult): The outcome of the drawing.
+            stream (TextIO): Where to write the line.
+
+        Returns:
+            None
+    """
+    if result.status == "rendered":
+        detail = "%d shapes" % result.shapes
+    else:
+        detail = result.error or "up to date"
+    stream.write("%-8s %8.3f s  %s  (%s)\n" % (result.status, result.seconds, result.source, detail))
+    stream.flush()
+
+
+def write_summary(results: Sequence[BatchResult], seconds: float, workers: int, stream: TextIO) -> None:
+    """
+        Write the totals of a batch.
+
+        Args:
+            results (Sequence[BatchResult]): The outcomes of the batch.
+            seconds (float): The wall time of the batch.
+            workers (int): The number of processes used.
+            stream (TextIO): Where to write the summary.
+
+        Returns:
+            None
+    """
+    counts = {status: sum(1 for r in results if r.status == status) for status in ("rendered", "skipped", "failed")}
+    rendered = [r for r in results if r.status == "rendered"]
+    stream.write("%d drawings: %d rendered, %d skipped, %d failed in %.2f s with %d workers\n"
+                 % (len(results), counts["rendered"], counts["skipped"], counts["failed"], seconds, workers))
+    if rendered:
+        busy = sum(r.seconds for r in rendered)
+        slowest = max(rendered, key=lambda r: r.seconds)
+        stream.write("render time %.2f s, mean %.3f s per drawing, slowest %.3f s (%s)\n"
+                     % (busy, busy / len(rendered), slowest.seconds, slowest.source))
+    for result in results:
+        if result.status == "failed":
+            stream.write("failed: %s: %s\n" % (result.source, result.error))
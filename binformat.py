@@ -0,0 +1,473 @@
+"""
+Compact binary document format.
+
+A binary document holds the same shapes as a JSON document saved by Draw.save_work:
+
+    header       magic "PNTB", format version, shape count and the offset of the shape table
+    records      for every shape its attributes as compact JSON followed by its matrix, six little endian doubles,
+                 and its packed point array
+    shape table  one fixed size entry per shape locating its attributes and points
+
+The point arrays of strokes and polygons are the bulk of a drawing. Integer points are stored as the first
+point followed by the per-axis differences between consecutive points, packed into the smallest signed integer
+type that holds them, so a freehand stroke costs about two bytes per point. Points that are not all integers are
+stored as 64-bit floats. The file is read through mmap and a shape's points are only unpacked when they are used.
+The matrix is kept in binary so that it loads exactly without being parsed; version 1 files have no matrices.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from instrument import timed
+from storage import dump_items, iter_json_file
+
+MAGIC: bytes = b"PNTB"
+VERSION: int = 2
+SUPPORTED_VERSIONS: Tuple[int, ...] = (1, 2)
+BINARY_EXTENSION: str = ".pbin"
+
+HEADER = struct.Struct("<4sHHIQ")
+TABLE_ENTRY = struct.Struct("<BBHQIQII")
+FIRST_POINT = struct.Struct("<qq")
+MATRIX = struct.Struct("<6d")
+
+# Shape names stored as an index in the shape table, other names are kept with the shape's attributes
+TYPE_NAMES: Tuple[str, ...] = ("Rectangle", "Elips", "Triangle", "PolygonShape", "Lines", "Eraser", "TextShape")
+UNKNOWN_TYPE: int = 255
+# The attribute holding a shape's point array, index 0 means the shape has none
+POINT_KEYS: Tuple[Optional[str], ...] = (None, "lines", "points")
+# Set in the key byte of the shape table when the record holds a packed matrix
+MATRIX_FLAG: int = 0x80
+
+FLOAT_POINTS: int = 0
+INT_TYPECODES = {1: "b", 2: "h", 4: "i", 8: "q"}
+
+
+def _little_endian(values: array) -> array:
+    """
+        Convert an array to little endian byte order in place when the machine is big endian.
+
+        Args:
+            values (array): The array to convert.
+
+        Returns:
+            array: The same array.
+    """
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _is_point_list(value: Any) -> bool:
+    """
+        Check whether a value is a list of [x, y] number pairs that can be packed.
+
+        Args:
+            value (Any): The value to check.
+
+        Returns:
+            bool: True if the value can be stored as a point array.
+    """
+    if not isinstance(value, list):
+        return False
+    for point in value:
+        if not isinstance(point, (list, tuple)) or len(point) != 2:
+            return False
+        for c in point:
+            if isinstance(c, bool) or not isinstance(c, (int, float)):
+                return False
+    return True
+
+
+def _is_matrix(value: Any) -> bool:
+    """
+        Check whether a value is a matrix of six numbers that can be packed.
+
+        Args:
+            value (Any): The value to check.
+
+        Returns:
+            bool: True if the value can be stored as a packed matrix.
+    """
+    if not isinstance(value, (list, tuple)) or len(value) != 6:
+        return False
+    return all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in value)
+
+
+def pack_points(points: List[List[Any]]) -> Tuple[int, bytes]:
+    """
+        Pack a list of [x, y] points.
+
+        Args:
+            points (List[List[Any]]): The points.
+
+        Returns:
+            Tuple[int, bytes]: The encoding, FLOAT_POINTS or the byte size of the packed differences, and the bytes.
+    """
+    coords = [c for point in points for c in point]
+    if not all(type(c) is int for c in coords):
+        return FLOAT_POINTS, _little_endian(array("d", coords)).tobytes()
+    if not coords:
+        return 1, b""
+    deltas = [coords[i] - coords[i - 2] for i in range(2, len(coords))]
+    largest = max((abs(d) for d in deltas), default=0)
+    for size, typecode in INT_TYPECODES.items():
+        if largest < 1 << (8 * size - 1):
+            break
+    else:
+        return FLOAT_POINTS, _little_endian(array("d", coords)).tobytes()
+    return size, FIRST_POINT.pack(coords[0], coords[1]) + _little_endian(array(typecode, deltas)).tobytes()
+
+
+def unpack_points(encoding: int, data: bytes) -> List[List[Any]]:
+    """
+        Unpack the points packed by pack_points.
+
+        Args:
+            encoding (int): The encoding returned by pack_points.
+            data (bytes): The packed points.
+
+        Returns:
+            List[List[Any]]: The points.
+    """
+    if encoding == FLOAT_POINTS:
+        coords = _little_endian(array("d", data))
+        return [[coords[i], coords[i + 1]] for i in range(0, len(coords), 2)]
+    if not data:
+        return []
+    first_x, first_y = FIRST_POINT.unpack_from(data)
+    deltas = _little_endian(array(INT_TYPECODES[encoding], data[FIRST_POINT.size:]))
+    xs = accumulate(deltas[0::2], initial=first_x)
+    ys = accumulate(deltas[1::2], initial=first_y)
+    return [[x, y] for x, y in zip(xs, ys)]
+
+
+@timed("binformat.write_binary")
+def write_binary(items: Iterable[dict], file_path: str) -> int:
+    """
+        Write saved shapes to a binary document.
+
+        The records are written as they come and the shape table is appended at the end, so the shapes are never
+        all held in memory.
+
+        Args:
+            items (Iterable[dict]): The saved shapes, as returned by Shape.to_dict.
+            file_path (str): The file to write.
+
+        Returns:
+            int: The number of shapes written.
+    """
+    table = bytearray()
+    count = 0
+    with open(file_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        offset = HEADER.size
+        for item in items:
+            meta = dict(item)
+            name = meta.pop("name", None)
+            type_id = TYPE_NAMES.index(name) if name in TYPE_NAMES else UNKNOWN_TYPE
+            if type_id == UNKNOWN_TYPE:
+                meta["name"] = name
+            key_id = 0
+            encoding = 0
+            packed = b""
+            point_count = 0
+            for index, key in enumerate(POINT_KEYS):
+                if key is not None and _is_point_list(meta.get(key)):
+                    points = meta.pop(key)
+                    key_id = index
+                    point_count = len(points)
+                    encoding, packed = pack_points(points)
+                    break
+            matrix = b""
+            if _is_matrix(meta.get("matrix")):
+                matrix = MATRIX.pack(*meta.pop("matrix"))
+                key_id |= MATRIX_FLAG
+            meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+            file.write(meta_bytes)
+            file.write(matrix)
+            file.write(packed)
+            points_offset = offset + len(meta_bytes) + len(matrix)
+            table += TABLE_ENTRY.pack(type_id, key_id, encoding, offset, len(meta_bytes), points_offset,
+                                      len(packed), point_count)
+            offset = points_offset + len(packed)
+            count += 1
+        file.write(table)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, 0, count, offset))
+    return count
+
+
+class ShapeRecord:
+    """
+        One shape of a binary document.
+
+        The attributes and points stay in the memory-mapped file until they are asked for.
+
+        Attributes:
+            document (BinaryDocument): The document holding the shape.
+            type_id (int): The index of the shape's name in TYPE_NAMES.
+            point_key (Optional[str]): The attribute holding the shape's points, None if it has none.
+            has_matrix (bool): Whether the shape's matrix is packed after its attributes.
+            point_count (int): The number of points.
+    """
+
+    def __init__(self, document: 'BinaryDocument', entry: Tuple[int, ...]) -> None:
+        """
+            Initialize a ShapeRecord from its shape table entry.
+
+            Args:
+                document (BinaryDocument): The document holding the shape.
+                entry (Tuple[int, ...]): The unpacked shape table entry.
+
+            Returns:
+                None
+        """
+        self.document: BinaryDocument = document
+        (self.type_id, key_id, self.encoding, self.meta_offset, self.meta_length, self.points_offset,
+         self.points_length, self.point_count) = entry
+        self.point_key: Optional[str] = POINT_KEYS[key_id & ~MATRIX_FLAG]
+        self.has_matrix: bool = bool(key_id & MATRIX_FLAG)
+
+    @property
+    def name(self) -> str:
+        """
+            The name of the shape's class.
+
+            Returns:
+                str: The shape name.
+        """
+        if self.type_id == UNKNOWN_TYPE:
+            return self.meta()["name"]
+        return TYPE_NAMES[self.type_id]
+
+    def meta(self) -> dict:
+        """
+            Decode the shape's attributes, without its points.
+
+            Returns:
+                dict: The attributes.
+        """
+        start = self.meta_offset
+        return json.loads(self.document.data[start:start + self.meta_length])
+
+    def matrix(self) -> Optional[List[float]]:
+        """
+            Unpack the shape's matrix.
+
+            Returns:
+                Optional[List[float]]: The matrix (a, b, c, d, e, f), None if the record has none.
+        """
+        if not self.has_matrix:
+            return None
+        return list(MATRIX.unpack_from(self.document.data, self.meta_offset + self.meta_length))
+
+    def points(self) -> List[List[Any]]:
+        """
+            Unpack the shape's points.
+
+            Returns:
+                List[List[Any]]: The points, empty if the shape has none.
+        """
+        if self.point_key is None:
+            return []
+        start = self.points_offset
+        return unpack_points(self.encoding, self.document.data[start:start + self.points_length])
+
+    def to_dict(self) -> dict:
+        """
+            Decode the whole shape.
+
+            Returns:
+                dict: The shape as returned by Shape.to_dict.
+        """
+        data = {"name": self.name}
+        data.update(self.meta())
+        if self.has_matrix:
+            data["matrix"] = self.matrix()
+        if self.point_key is not None:
+            data[self.point_key] = self.points()
+        return data
+
+
+class BinaryDocument:
+    """
+        A binary document opened through mmap.
+
+        Attributes:
+            file_path (str): The path of the document.
+            data (mmap.mmap): The memory-mapped file.
+            count (int): The number of shapes.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        """
+            Open a binary document and read its header.
+
+            Args:
+                file_path (str): The path of the document.
+
+            Returns:
+                None
+
+            Raises:
+                ValueError: If the file is not a binary document of a supported version, or if it is truncated or
+                    corrupt.
+        """
+        self.file_path: str = file_path
+        with open(file_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise ValueError(file_path + " is not a binary drawing")
+            self.data: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.table_offset = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version not in SUPPORTED_VERSIONS:
+            self.data.close()
+            raise ValueError(file_path + " is not a binary drawing of a version up to " + str(VERSION))
+        table_end = self.table_offset + self.count * TABLE_ENTRY.size
+        if self.table_offset < HEADER.size or table_end > len(self.data) or not all(
+                map(self._is_valid_entry, TABLE_ENTRY.iter_unpack(self.data[self.table_offset:table_end]))):
+            self.data.close()
+            raise ValueError(file_path + " is a truncated or corrupt binary drawing")
+
+    def _is_valid_entry(self, entry: Tuple[int, ...]) -> bool:
+        """
+            Check that a shape table entry only points at the records before the table, with points of its length.
+
+            Args:
+                entry (Tuple[int, ...]): The unpacked shape table entry.
+
+            Returns:
+                bool: True if the entry can be decoded without reading outside of its record.
+        """
+        type_id, key_id, encoding, meta_offset, meta_length, points_offset, points_length, point_count = entry
+        if (type_id >= len(TYPE_NAMES) and type_id != UNKNOWN_TYPE) or key_id & ~MATRIX_FLAG >= len(POINT_KEYS):
+            return False
+        meta_end = meta_offset + meta_length + (MATRIX.size if key_id & MATRIX_FLAG else 0)
+        if meta_offset < HEADER.size or meta_end > points_offset or points_offset + points_length > self.table_offset:
+            return False
+        if encoding == FLOAT_POINTS:
+            return points_length == 2 * 8 * point_count
+        if encoding not in INT_TYPECODES:
+            return False
+        return points_length == (FIRST_POINT.size + 2 * encoding * (point_count - 1) if point_count else 0)
+
+    def __enter__(self) -> 'BinaryDocument':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+            Unmap the file.
+
+            Returns:
+                None
+        """
+        self.data.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, index: int) -> ShapeRecord:
+        """
+            Get one shape of the document.
+
+            Args:
+                index (int): The position of the shape in drawing order.
+
+            Returns:
+                ShapeRecord: The shape.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return ShapeRecord(self, TABLE_ENTRY.unpack_from(self.data, self.table_offset + index * TABLE_ENTRY.size))
+
+    def records(self) -> Iterator[ShapeRecord]:
+        """
+            Iterate over the shapes without decoding them.
+
+            Returns:
+                Iterator[ShapeRecord]: The shapes in drawing order.
+        """
+        for index in range(self.count):
+            yield self.record(index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for record in self.records():
+            yield record.to_dict()
+
+
+def is_binary_path(file_path: str) -> bool:
+    """
+        Check whether a path names a binary document.
+
+        Args:
+            file_path (str): The path.
+
+        Returns:
+            bool: True if the path has the binary document extension.
+    """
+    return file_path.lower().endswith(BINARY_EXTENSION)
+
+
+def iter_binary_file(file_path: str) -> Iterator[dict]:
+    """
+        Decode the shapes of a binary document one at a time, closing it when done.
+
+        Args:
+            file_path (str): The path of the document.
+
+        Returns:
+            Iterator[dict]: The shapes in drawing order.
+    """
+    with BinaryDocument(file_path) as document:
+        yield from document
+
+
+def json_to_binary(json_path: str, binary_path: str) -> int:
+    """
+        Convert a JSON document to a binary document.
+
+        Args:
+            json_path (str): The JSON document to read.
+            binary_path (str): The binary document to write.
+
+        Returns:
+            int: The number of shapes converted.
+    """
+    return write_binary(iter_json_file(json_path), binary_path)
+
+
+def binary_to_json(binary_path: str, json_path: str) -> int:
+    """
+        Convert a binary document to a JSON document.
+
+        Args:
+            binary_path (str): The binary document to read.
+            json_path (str): The JSON document to write.
+
+        Returns:
+            int: The number of shapes converted.
+    """
+    with open(json_path, "w") as file:
+        return dump_items(iter_binary_file(binary_path), file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a drawing between the JSON and the binary format. "
+                                                 "The direction follows the extension of the source file.")
+    parser.add_argument("source", help="The drawing to convert (.json or " + BINARY_EXTENSION + ").")
+    parser.add_argument("target", help="The file to write.")
+    args = parser.parse_args()
+    if is_binary_path(args.source):
+        converted = binary_to_json(args.source, args.target)
+    else:
+        converted = json_to_binary(args.source, args.target)
+    print("Converted %d shapes" % converted)
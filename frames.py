@@ -0,0 +1,137 @@
+"""
+Coalescing of mouse motion events to the display frame rate.
+
+Mice and tablets can report motion several hundred times a second, far more often than the screen is redrawn. A
+FrameScheduler keeps the latest event of every motion handler and calls each handler at most once per frame, from a
+Tk `after` timer, so the work done while dragging depends on the frame rate and not on the input rate. Handlers that
+follow the pointer, like dragging or scaling the selection, lose nothing: the latest event carries the final position.
+Handlers that need every point, like freehand strokes, keep the point when the event arrives and schedule only the
+canvas update.
+
+The first motion after a pause is handled as soon as Tk is idle, later ones wait for the next frame. A release flushes
+the pending events first, so a gesture always ends at the position of its last event.
+"""
+import math
+import time
+from typing import Any, Callable, Dict
+
+# The time between two frames, in milliseconds, about 60 frames per second
+FRAME_MS: float = 1000 / 60
+
+
+class FrameScheduler:
+    """
+        Calls motion handlers with their latest event at most once per display frame.
+
+        Attributes:
+            widget (Any): The widget whose `after` timers run the frames, None calls every handler at once, e.g. for
+                a headless document.
+            frame_ms (float): The time between two frames, in milliseconds.
+            pending (Dict[Callable, Any]): The latest event of every handler waiting for the next frame, in the order
+                the handlers were first scheduled.
+            timer (Any): The id of the `after` timer of the next frame, None when no frame is due.
+            last_frame (float): The time.monotonic() of the last frame, in seconds.
+            coalesced (int): The number of events replaced by a later one before their frame.
+    """
+
+    def __init__(self, widget: Any, frame_ms: float = FRAME_MS) -> None:
+        """
+            Initialize a FrameScheduler.
+
+            Args:
+                widget (Any): The widget whose `after` timers run the frames, None calls every handler at once.
+                frame_ms (float): The time between two frames, in milliseconds.
+
+            Returns:
+                None
+        """
+        self.widget: Any = widget
+        self.frame_ms: float = frame_ms
+        self.pending: Dict[Callable, Any] = {}
+        self.timer: Any = None
+        self.last_frame: float = 0.0
+        self.coalesced: int = 0
+
+    def schedule(self, handler: Callable[[Any], Any], event: Any) -> None:
+        """
+            Call a handler with an event at the next frame, replacing the event it was scheduled with before.
+
+            Args:
+                handler (Callable[[Any], Any]): The handler.
+                event (Any): The event.
+
+            Returns:
+                None
+        """
+        if self.widget is None:
+            handler(event)
+            return
+        if handler in self.pending:
+            self.coalesced += 1
+        self.pending[handler] = event
+        if self.timer is None:
+            wait = self.frame_ms - (time.monotonic() - self.last_frame) * 1000
+            if wait <= 0:
+                self.timer = self.widget.after_idle(self.on_frame)
+            else:
+                self.timer = self.widget.after(int(math.ceil(wait)), self.on_frame)
+
+    def coalesce(self, handler: Callable[[Any], Any]) -> Callable[[Any], None]:
+        """
+            Wrap a motion handler so that the events given to it are scheduled for the next frame.
+
+            Args:
+                handler (Callable[[Any], Any]): The handler.
+
+            Returns:
+                Callable[[Any], None]: The handler to bind to the motion event.
+        """
+
+        def scheduled(event: Any) -> None:
+            self.schedule(handler, event)
+
+        return scheduled
+
+    def flushed(self, handler: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """
+            Wrap a handler so that the pending events are handled before it, e.g. for a button release.
+
+            Args:
+                handler (Callable[[Any], Any]): The handler.
+
+            Returns:
+                Callable[[Any], Any]: The handler to bind to the event.
+        """
+
+        def flushing(event: Any) -> Any:
+            self.flush()
+            return handler(event)
+
+        return flushing
+
+    def flush(self) -> None:
+        """
+            Call every scheduled handler with its latest event now, and cancel the timer of the next frame.
+
+            Returns:
+                None
+        """
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+        if not self.pending:
+            return
+        self.last_frame = time.monotonic()
+        pending, self.pending = self.pending, {}
+        for handler, event in pending.items():
+            handler(event)
+
+    def on_frame(self) -> None:
+        """
+            Handle the events scheduled for a frame, as the `after` callback.
+
+            Returns:
+                None
+        """
+        self.timer = None
+        self.flush()
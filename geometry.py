@@ -0,0 +1,734 @@
+import argparse
+import math
+import random
+import tracemalloc
+from array import array
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+Point = TypeVar("Point", bound=Sequence[float])
+# An affine transform (a, b, c, d, e, f), mapping (x, y) to (a * x + c * y + e, b * x + d * y + f) like an SVG matrix
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY_MATRIX: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# Largest distance (in screen pixels) a level of detail may stray from the full shape, below what the eye can see
+DETAIL_TOLERANCE: float = 0.5
+# Shapes with fewer points are always drawn in full
+MIN_DETAIL_POINTS: int = 16
+MAX_DETAIL_LEVEL: int = 16
+# Decimals kept when points are saved, about the precision of a 32-bit float for drawing coordinates
+POINT_DIGITS: int = 4
+
+
+def point_segment_distance_sq(px: float, py: float, x1: float, y1: float, x2: float, y2: float) -> float:
+    """
+        Return the squared distance between a point and a line segment.
+
+        Args:
+            px (float): The x-coordinate of the point.
+            py (float): The y-coordinate of the point.
+            x1 (float): The x-coordinate of the segment start.
+            y1 (float): The y-coordinate of the segment start.
+            x2 (float): The x-coordinate of the segment end.
+            y2 (float): The y-coordinate of the segment end.
+
+        Returns:
+            float: The squared distance from (px, py) to the closest point of the segment.
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return (px - x1) ** 2 + (py - y1) ** 2
+    t = ((px - x1) * dx + (py - y1) * dy) / length_sq
+    if t < 0:
+        t = 0
+    elif t > 1:
+        t = 1
+    cx = x1 + t * dx
+    cy = y1 + t * dy
+    return (px - cx) ** 2 + (py - cy) ** 2
+
+
+def remove_duplicates(points: Sequence[Point]) -> List[Point]:
+    """
+        Remove consecutive duplicate points from a polyline.
+
+        Args:
+            points (Sequence): The points of the polyline.
+
+        Returns:
+            List: The points without consecutive repeats.
+    """
+    result: List[Point] = []
+    for point in points:
+        if not result or result[-1][0] != point[0] or result[-1][1] != point[1]:
+            result.append(point)
+    return result
+
+
+def simplify_points(points: Sequence[Point], tolerance: float) -> List[Point]:
+    """
+        Simplify a polyline with the Ramer-Douglas-Peucker algorithm.
+
+        Every point dropped by the simplification lies within `tolerance` of the simplified polyline.
+        The first and last points are always kept. The algorithm runs with an explicit stack so long strokes
+        cannot hit the recursion limit.
+
+        Args:
+            points (Sequence): The points of the polyline.
+            tolerance (float): The maximum allowed distance between the original and the simplified polyline.
+
+        Returns:
+            List: The kept points, in their original order.
+    """
+    points = remove_duplicates(points)
+    count = len(points)
+    if count < 3:
+        return points
+    tolerance_sq = tolerance * tolerance
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first][0], points[first][1]
+        x2, y2 = points[last][0], points[last][1]
+        max_distance = -1.0
+        index = first
+        for i in range(first + 1, last):
+            distance = point_segment_distance_sq(points[i][0], points[i][1], x1, y1, x2, y2)
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if max_distance > tolerance_sq:
+            keep[index] = True
+            if index - first > 1:
+                stack.append((first, index))
+            if last - index > 1:
+                stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def detail_level(zoom: float) -> int:
+    """
+        Get the coarsest level of detail that is visually lossless at a zoom.
+
+        Level k is simplified with a tolerance of DETAIL_TOLERANCE * 2 ** k document units, which is at most
+        DETAIL_TOLERANCE screen pixels when zoom <= 1 / 2 ** k. Level 0 is the full shape.
+
+        Args:
+            zoom (float): The number of screen pixels per document unit.
+
+        Returns:
+            int: The level, 0 from a zoom of 1/2 up.
+    """
+    if zoom >= 0.5:
+        return 0
+    return min(int(math.floor(math.log2(1 / zoom))), MAX_DETAIL_LEVEL)
+
+
+def multiply(first: Matrix, second: Matrix) -> Matrix:
+    """
+        Compose two transforms.
+
+        Args:
+            first (Matrix): The transform applied last.
+            second (Matrix): The transform applied first.
+
+        Returns:
+            Matrix: The transform applying `second` and then `first`.
+    """
+    a1, b1, c1, d1, e1, f1 = first
+    a2, b2, c2, d2, e2, f2 = second
+    return (a1 * a2 + c1 * b2, b1 * a2 + d1 * b2, a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+            a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1)
+
+
+def multiply_many(first: Matrix, matrices: np.ndarray) -> np.ndarray:
+    """
+        Compose one transform with many, as multiply(first, matrix) for every row.
+
+        Args:
+            first (Matrix): The transform applied last.
+            matrices (np.ndarray): The transforms applied first, one (a, b, c, d, e, f) row each.
+
+        Returns:
+            np.ndarray: The composed transforms, in the same layout.
+    """
+    a, b, c, d, e, f = first
+    a2, b2, c2, d2, e2, f2 = matrices.T
+    return np.column_stack((a * a2 + c * b2, b * a2 + d * b2, a * c2 + c * d2, b * c2 + d * d2,
+                            a * e2 + c * f2 + e, b * e2 + d * f2 + f))
+
+
+def translation(dx: float, dy: float) -> Matrix:
+    """
+        Get the transform moving every point by the same distance.
+
+        Args:
+            dx (float): The distance along the x-axis.
+            dy (float): The distance along the y-axis.
+
+        Returns:
+            Matrix: The transform.
+    """
+    return 1.0, 0.0, 0.0, 1.0, float(dx), float(dy)
+
+
+def scaling(scale_x: float, scale_y: float, origin_x: float = 0.0, origin_y: float = 0.0) -> Matrix:
+    """
+        Get the transform scaling around a point, a negative factor flips along its axis.
+
+        Args:
+            scale_x (float): The scale factor along the x-axis.
+            scale_y (float): The scale factor along the y-axis.
+            origin_x (float): The x-coordinate of the point that stays in place.
+            origin_y (float): The y-coordinate of the point that stays in place.
+
+        Returns:
+            Matrix: The transform.
+    """
+    return (float(scale_x), 0.0, 0.0, float(scale_y), origin_x * (1 - scale_x), origin_y * (1 - scale_y))
+
+
+def rotation(degrees: float, origin_x: float = 0.0, origin_y: float = 0.0) -> Matrix:
+    """
+        Get the transform rotating around a point.
+
+        The y-axis of the canvas points down, so a positive angle turns clockwise on the screen. Multiples of 90
+        degrees give exact matrices.
+
+        Args:
+            degrees (float): The angle.
+            origin_x (float): The x-coordinate of the point that stays in place.
+            origin_y (float): The y-coordinate of the point that stays in place.
+
+        Returns:
+            Matrix: The transform.
+    """
+    quarter, rest = divmod(degrees, 90)
+    if rest == 0:
+        cos, sin = ((1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, -1.0))[int(quarter) % 4]
+    else:
+        cos, sin = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+    return (cos, sin, -sin, cos, origin_x - cos * origin_x + sin * origin_y,
+            origin_y - sin * origin_x - cos * origin_y)
+
+
+def invert(matrix: Matrix) -> Matrix:
+    """
+        Get the transform undoing another one.
+
+        Args:
+            matrix (Matrix): The transform, which must not flatten the plane.
+
+        Returns:
+            Matrix: The inverse transform.
+    """
+    a, b, c, d, e, f = matrix
+    det = a * d - b * c
+    return (d / det, -b / det, -c / det, a / det, (c * f - d * e) / det, (b * e - a * f) / det)
+
+
+def is_translation(matrix: Matrix) -> bool:
+    """
+        Check whether a transform only moves points.
+
+        Args:
+            matrix (Matrix): The transform.
+
+        Returns:
+            bool: True if the transform neither scales, rotates nor flips.
+    """
+    return matrix[0] == 1 and matrix[1] == 0 and matrix[2] == 0 and matrix[3] == 1
+
+
+def matrix_scale(matrix: Matrix) -> float:
+    """
+        Get the factor by which a transform scales lengths on average.
+
+        Args:
+            matrix (Matrix): The transform.
+
+        Returns:
+            float: The square root of the factor it scales areas by.
+    """
+    return math.sqrt(abs(matrix[0] * matrix[3] - matrix[1] * matrix[2]))
+
+
+def transform_point(matrix: Matrix, x: float, y: float) -> Tuple[float, float]:
+    """
+        Apply a transform to a point.
+
+        Args:
+            matrix (Matrix): The transform.
+            x (float): The x-coordinate.
+            y (float): The y-coordinate.
+
+        Returns:
+            Tuple[float, float]: The transformed point.
+    """
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def transform_coords(matrix: Matrix, coords: Any) -> List[float]:
+    """
+        Apply a transform to flat coordinates, with NumPy.
+
+        Args:
+            matrix (Matrix): The transform.
+            coords (Any): The coordinates x0, y0, x1, y1, ..., any sequence or buffer of numbers.
+
+        Returns:
+            List[float]: The transformed coordinates, as the canvas takes them.
+    """
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    a, b, c, d, e, f = matrix
+    return (points @ np.array(((a, b), (c, d))) + (e, f)).ravel().tolist()
+
+
+def coords_bounds(coords: Sequence[float]) -> Optional[Tuple[float, float, float, float]]:
+    """
+        Get the bounding box of flat coordinates.
+
+        Args:
+            coords (Sequence[float]): The coordinates x0, y0, x1, y1, ...
+
+        Returns:
+            Optional[Tuple[float, float, float, float]]: The box (x1, y1, x2, y2), None without points.
+    """
+    if not coords:
+        return None
+    xs = coords[0::2]
+    ys = coords[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def saved_matrix(data: dict, size: Optional[Tuple[float, float]] = None) -> Matrix:
+    """
+        Get the transform of a saved shape.
+
+        Drawings saved before shapes had a matrix hold the position and, for shapes with a size, the size the shape
+        was scaled to instead, which give a matrix without rotation.
+
+        Args:
+            data (dict): The saved attributes of the shape.
+            size (Optional[Tuple[float, float]]): The size the shape was created with, for older drawings.
+
+        Returns:
+            Matrix: The transform of the shape.
+    """
+    matrix = data.get("matrix")
+    if matrix is not None:
+        return tuple(float(value) for value in matrix)
+    scale_x = scale_y = 1.0
+    if size is not None:
+        scale_x = data["current_width"] / size[0] if size[0] else 1.0
+        scale_y = data["current_height"] / size[1] if size[1] else 1.0
+    return float(scale_x), 0.0, 0.0, float(scale_y), float(data["x"]), float(data["y"])
+
+
+
+class PointArray:
+    """
+        The points of a polyline packed in one array of 32-bit floats, x and y interleaved.
+
+        A point costs 8 bytes instead of the two Python numbers and the list of a [x, y] point. Indexing and
+        iterating give (x, y) tuples, so the functions of this module accept a PointArray like any sequence of
+        points.
+
+        Attributes:
+            coords (array): The coordinates x0, y0, x1, y1, ...
+    """
+    __slots__ = ("coords",)
+
+    def __init__(self, points: Iterable[Sequence[float]] = ()) -> None:
+        """
+            Initialize a PointArray.
+
+            Args:
+                points (Iterable[Sequence[float]]): The (x, y) points.
+
+            Returns:
+                None
+        """
+        self.coords: array = array("f", chain.from_iterable(points))
+
+    @classmethod
+    def from_coords(cls, coords: Iterable[float]) -> 'PointArray':
+        """
+            Create a PointArray from flat coordinates.
+
+            Args:
+                coords (Iterable[float]): The coordinates x0, y0, x1, y1, ...
+
+            Returns:
+                PointArray: The points.
+        """
+        points = cls()
+        points.coords = array("f", coords)
+        return points
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def __getitem__(self, index: int) -> Tuple[float, float]:
+        if index < 0:
+            index += len(self)
+        return self.coords[2 * index], self.coords[2 * index + 1]
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        return zip(self.coords[0::2], self.coords[1::2])
+
+    def append(self, x: float, y: float) -> None:
+        """
+            Add a point at the end.
+
+            Args:
+                x (float): The x-coordinate.
+                y (float): The y-coordinate.
+
+            Returns:
+                None
+        """
+        self.coords.append(x)
+        self.coords.append(y)
+
+    def flat(self, dx: float = 0, dy: float = 0) -> List[float]:
+        """
+            Get the flat coordinates, as the canvas takes them.
+
+            Args:
+                dx (float): Offset added to the x-coordinates.
+                dy (float): Offset added to the y-coordinates.
+
+            Returns:
+                List[float]: The coordinates x0, y0, x1, y1, ...
+        """
+        if not dx and not dy:
+            return self.coords.tolist()
+        return [c for x, y in self for c in (x + dx, y + dy)]
+
+    def mapped(self, matrix: Matrix) -> List[float]:
+        """
+            Get the flat coordinates of the points after a transform, as the canvas takes them.
+
+            Args:
+                matrix (Matrix): The transform.
+
+            Returns:
+                List[float]: The coordinates x0, y0, x1, y1, ...
+        """
+        if matrix == IDENTITY_MATRIX or not self.coords:
+            return self.coords.tolist()
+        return transform_coords(matrix, np.frombuffer(self.coords, dtype=np.float32))
+
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+            Get the bounding box of the points.
+
+            Returns:
+                Optional[Tuple[float, float, float, float]]: The box (x1, y1, x2, y2), None without points.
+        """
+        if not self.coords:
+            return None
+        xs = self.coords[0::2]
+        ys = self.coords[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def copy(self) -> 'PointArray':
+        """
+            Copy the points, with one copy of the packed array.
+
+            Returns:
+                PointArray: The copy.
+        """
+        points = PointArray()
+        points.coords = self.coords[:]
+        return points
+
+    def tolist(self) -> List[List[float]]:
+        """
+            Get the points as [x, y] lists for saving.
+
+            Whole coordinates are given as ints, the others rounded to POINT_DIGITS decimals, so a saved drawing
+            does not carry the float32 rounding noise.
+
+            Returns:
+                List[List[float]]: The points.
+        """
+        coords = [int(c) if c.is_integer() else round(c, POINT_DIGITS) for c in self.coords.tolist()]
+        return [coords[i:i + 2] for i in range(0, len(coords), 2)]
+
+
+class DetailLevels:
+    """
+        Lazily computed simplified versions of a polyline, one per level of detail.
+
+        Each level is simplified from the full points the first time it is asked for, so the error of a level never
+        adds up with the error of another one. The owner must call clear() whenever the points change.
+
+        Attributes:
+            levels (Dict[int, PointArray]): The levels computed so far.
+    """
+    __slots__ = ("levels",)
+
+    def __init__(self) -> None:
+        """
+            Initialize an empty DetailLevels.
+
+            Returns:
+                None
+        """
+        self.levels: Dict[int, PointArray] = {}
+
+    def get(self, points: Sequence[Point], level: int) -> Sequence[Point]:
+        """
+            Get a level of detail of a polyline.
+
+            Args:
+                points (Sequence): The full points of the polyline.
+                level (int): The level, as returned by detail_level.
+
+            Returns:
+                Sequence: The points of the level, `points` itself for level 0 and for short polylines.
+        """
+        if level <= 0 or len(points) < MIN_DETAIL_POINTS:
+            return points
+        simplified = self.levels.get(level)
+        if simplified is None:
+            simplified = PointArray(simplify_points(points, DETAIL_TOLERANCE * 2 ** level))
+            self.levels[level] = simplified
+        return simplified
+
+    def clear(self) -> None:
+        """
+            Forget every computed level, after the points changed.
+
+            Returns:
+                None
+        """
+        self.levels.clear()
+
+
+class SegmentGrid:
+    """
+        A uniform grid over a set of line segments.
+
+        Each segment is registered in the cells it passes through and in their neighbours, so a point only has to
+        be tested against the segments stored in its own cell.
+
+        Attributes:
+            cell_size (float): The side length of a grid cell.
+            cells (dict): Maps a (column, row) cell key to the segments registered in that cell.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        """
+            Initialize an empty SegmentGrid.
+
+            Args:
+                cell_size (float): The side length of a grid cell, at least twice the largest query radius.
+
+            Returns:
+                None
+        """
+        self.cell_size: float = max(cell_size, 1.0)
+        self.cells: Dict[Tuple[int, int], List[Tuple[float, float, float, float]]] = {}
+
+    def add_polyline(self, points: Sequence[Sequence[float]], dx: float = 0, dy: float = 0) -> None:
+        """
+            Register every segment of a polyline, a single point is registered as a zero length segment.
+
+            Args:
+                points (Sequence): The points of the polyline.
+                dx (float): Offset added to the x-coordinates.
+                dy (float): Offset added to the y-coordinates.
+
+            Returns:
+                None
+        """
+        if len(points) == 1:
+            x, y = points[0][0] + dx, points[0][1] + dy
+            self.add_segment(x, y, x, y)
+        for i in range(len(points) - 1):
+            self.add_segment(points[i][0] + dx, points[i][1] + dy, points[i + 1][0] + dx, points[i + 1][1] + dy)
+
+    def add_segment(self, x1: float, y1: float, x2: float, y2: float) -> None:
+        """
+            Register a segment in the cells along its length.
+
+            Args:
+                x1 (float): The x-coordinate of the segment start.
+                y1 (float): The y-coordinate of the segment start.
+                x2 (float): The x-coordinate of the segment end.
+                y2 (float): The y-coordinate of the segment end.
+
+            Returns:
+                None
+        """
+        segment = (x1, y1, x2, y2)
+        steps = max(1, math.ceil(math.hypot(x2 - x1, y2 - y1) / (self.cell_size / 2)))
+        keys = set()
+        for k in range(steps + 1):
+            t = k / steps
+            column = math.floor((x1 + (x2 - x1) * t) / self.cell_size)
+            row = math.floor((y1 + (y2 - y1) * t) / self.cell_size)
+            for i in (-1, 0, 1):
+                for j in (-1, 0, 1):
+                    keys.add((column + i, row + j))
+        for key in keys:
+            self.cells.setdefault(key, []).append(segment)
+
+    def hits(self, x: float, y: float, radius: float) -> bool:
+        """
+            Check whether a point lies within a distance of any registered segment.
+
+            Args:
+                x (float): The x-coordinate of the point.
+                y (float): The y-coordinate of the point.
+                radius (float): The distance, at most half the cell size.
+
+            Returns:
+                bool: True if a segment is within `radius` of the point.
+        """
+        segments = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)))
+        if not segments:
+            return False
+        radius_sq = radius * radius
+        for x1, y1, x2, y2 in segments:
+            if point_segment_distance_sq(x, y, x1, y1, x2, y2) <= radius_sq:
+                return True
+        return False
+
+
+def erase_polyline(points: Sequence[Point], grid: SegmentGrid, radius: float, dx: float = 0,
+                   dy: float = 0) -> Optional[List[List[Any]]]:
+    """
+        Cut the parts of a polyline that lie within a distance of the segments of a grid.
+
+        Segments that come near the grid are sampled every `radius / 2` units and the polyline is split at the
+        first and last samples outside the erased area. Untouched vertices are kept as they are.
+
+        Args:
+            points (Sequence): The points of the polyline.
+            grid (SegmentGrid): The segments to erase with.
+            radius (float): The distance from the grid segments in which the polyline is erased.
+            dx (float): Offset from the polyline's coordinates to the grid's coordinates along the x-axis.
+            dy (float): Offset from the polyline's coordinates to the grid's coordinates along the y-axis.
+
+        Returns:
+            Optional[List]: The remaining pieces of the polyline, each with at least two points, or None if
+            nothing was erased.
+    """
+    if not points:
+        return None
+    step = max(radius / 2, 0.5)
+    runs: List[List[Any]] = []
+    current: List[Any] = []
+    erased = False
+    prev_in = grid.hits(points[0][0] + dx, points[0][1] + dy, radius)
+    if prev_in:
+        erased = True
+    else:
+        current.append(points[0])
+    for i in range(1, len(points)):
+        ax, ay = points[i - 1][0], points[i - 1][1]
+        bx, by = points[i][0], points[i][1]
+        steps = max(1, math.ceil(math.hypot(bx - ax, by - ay) / step))
+        px, py = ax, ay
+        for k in range(1, steps + 1):
+            if k == steps:
+                x, y = bx, by
+            else:
+                x = round(ax + (bx - ax) * k / steps, 2)
+                y = round(ay + (by - ay) * k / steps, 2)
+            now_in = grid.hits(x + dx, y + dy, radius)
+            if now_in and not prev_in:
+                erased = True
+                if current[-1][0] != px or current[-1][1] != py:
+                    current.append([px, py])
+                if len(current) >= 2:
+                    runs.append(current)
+                current = []
+            elif not now_in and prev_in:
+                current = [points[i] if k == steps else [x, y]]
+            elif not now_in and k == steps:
+                current.append(points[i])
+            prev_in = now_in
+            px, py = x, y
+    if not erased:
+        return None
+    if len(current) >= 2:
+        runs.append(current)
+    return runs
+
+
+def _measure(build: Any) -> Tuple[Any, int]:
+    """
+        Measure the memory allocated by a function.
+
+        Args:
+            build (Any): The function, called without arguments.
+
+        Returns:
+            Tuple[Any, int]: What the function returned and the bytes it allocated that are still alive.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, allocated
+
+
+def _benchmark(points: int, stroke_points: int, seed: int) -> None:
+    """
+        Compare the memory of the strokes of a synthetic drawing kept as [x, y] lists and as PointArrays.
+
+        The strokes are random walks with whole coordinates, like the points of the mouse.
+
+        Args:
+            points (int): The number of points of the drawing.
+            stroke_points (int): The average number of points of a stroke.
+            seed (int): The random seed.
+
+        Returns:
+            None
+    """
+    rng = random.Random(seed)
+    walks = []
+    remaining = points
+    while remaining > 0:
+        count = min(remaining, rng.randint(stroke_points // 2, stroke_points * 3 // 2))
+        x, y = rng.randint(0, 4000), rng.randint(0, 4000)
+        coords = array("i")
+        for _ in range(count):
+            x += rng.randint(-3, 3)
+            y += rng.randint(-3, 3)
+            coords.append(x)
+            coords.append(y)
+        walks.append(coords)
+        remaining -= count
+    lists, list_bytes = _measure(lambda: [[[walk[i], walk[i + 1]] for i in range(0, len(walk), 2)]
+                                          for walk in walks])
+    del lists
+    arrays, array_bytes = _measure(lambda: [PointArray.from_coords(walk) for walk in walks])
+    del arrays
+    print("%d strokes, %d points" % (len(walks), points))
+    print("%-12s %14s %14s" % ("storage", "MB", "bytes/point"))
+    print("%-12s %14.1f %14.1f" % ("[x, y] lists", list_bytes / 2 ** 20, list_bytes / points))
+    print("%-12s %14.1f %14.1f" % ("PointArray", array_bytes / 2 ** 20, array_bytes / points))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory of stroke points kept as lists and as arrays.")
+    parser.add_argument("--points", type=int, default=1_000_000, help="The number of points of the drawing.")
+    parser.add_argument("--stroke-points", type=int, default=200, help="The average number of points of a stroke.")
+    parser.add_argument("--seed", type=int, default=0, help="The random seed.")
+    args = parser.parse_args()
+    _benchmark(args.points, args.stroke_points, args.seed)
@@ -0,0 +1,730 @@
+"""
+Undo and redo of the changes made to a document.
+
+Every change is recorded as a command holding only what the change did: the distance of a move, the factors of a
+scale, the colors before and after a recolor, the shapes a delete removed. A change of the whole selection is one
+command over all its shapes. Undoing a command applies the inverse change to the shapes it references, so its cost
+depends on the change and not on the size of the document.
+
+The commands are kept until their estimated memory exceeds the history budget, then the oldest ones are dropped.
+"""
+import logging
+from collections import deque
+from typing import Any, Callable, Container, Deque, Iterable, List, Optional, Sequence, Tuple
+
+from geometry import Matrix, invert, scaling
+from viewport import ViewCanvas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_BYTES: int = 64 * 1024 * 1024
+# Rough memory estimates used against the budget, a command with its references, a shape with its attributes, a
+# stroke or polygon point in a PointArray and one more shape or value in the lists of a command
+COMMAND_BYTES: int = 200
+SHAPE_BYTES: int = 400
+POINT_BYTES: int = 8
+REFERENCE_BYTES: int = 8
+
+
+def shape_size(shape: Any) -> int:
+    """
+        Estimate the memory a shape keeps alive.
+
+        Args:
+            shape (Any): The shape.
+
+        Returns:
+            int: The estimate in bytes.
+    """
+    points = getattr(shape, "drawn_points", None)
+    if points is None:
+        points = getattr(shape, "points", None) or ()
+    return SHAPE_BYTES + POINT_BYTES * len(points)
+
+
+def restack(shapes: Iterable[Any]) -> None:
+    """
+        Move the canvas items of shapes that were put back into the document to their stacking position.
+
+        Args:
+            shapes (Iterable[Any]): The shapes.
+
+        Returns:
+            None
+    """
+    shapes = [shape for shape in shapes if shape.shape is not None]
+    if shapes and isinstance(shapes[0].canvas, ViewCanvas):
+        shapes[0].canvas.restack(shapes)
+
+
+class Command:
+    """
+        One undoable change of a document.
+
+        Attributes:
+            cost (int): The size estimate charged to the history budget when the command was recorded.
+    """
+    cost: int = 0
+
+    def undo(self) -> None:
+        """
+            Revert the change.
+
+            Returns:
+                None
+        """
+        raise NotImplementedError
+
+    def redo(self) -> None:
+        """
+            Apply the change again after it was undone.
+
+            Returns:
+                None
+        """
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """
+            Estimate the memory the command keeps alive.
+
+            Returns:
+                int: The estimate in bytes.
+        """
+        return COMMAND_BYTES
+
+    def affected(self) -> List[Any]:
+        """
+            Get the shapes the command changes, added or removes.
+
+            Returns:
+                List[Any]: The shapes.
+        """
+        return []
+
+    def merge(self, command: 'Command') -> bool:
+        """
+            Fold a command recorded right after this one into it, e.g. the steps of a slider drag.
+
+            Args:
+                command (Command): The newer command.
+
+            Returns:
+                bool: True if the newer command was merged and must not be recorded on its own.
+        """
+        return False
+
+    def remap_z(self, remap: Callable[[float], float]) -> None:
+        """
+            Renumber the stacking positions the command keeps, after the shapes of the document were spread.
+
+            Args:
+                remap (Callable[[float], float]): Maps a stacking position from before the spread to after it.
+
+            Returns:
+                None
+        """
+
+
+class CreateCommand(Command):
+    """
+        Shapes added to the document.
+
+        Attributes:
+            shapes (List[Any]): The new shapes.
+    """
+
+    def __init__(self, shapes: Sequence[Any]) -> None:
+        """
+            Initialize a CreateCommand.
+
+            Args:
+                shapes (Sequence[Any]): The new shapes, already in the document.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+
+    def undo(self) -> None:
+        for shape in self.shapes:
+            shape.delete()
+
+    def redo(self) -> None:
+        for shape in sorted(self.shapes, key=lambda s: s.z):
+            shape.insert()
+        restack(self.shapes)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + sum(shape_size(shape) for shape in self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+
+class DeleteCommand(CreateCommand):
+    """
+        Shapes removed from the document, by the delete button or by clearing the canvas.
+
+        Attributes:
+            shapes (List[Any]): The removed shapes, kept whole so that undo can put them back.
+    """
+
+    def undo(self) -> None:
+        super().redo()
+
+    def redo(self) -> None:
+        super().undo()
+
+
+class MoveCommand(Command):
+    """
+        Shapes dragged together by a distance.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            dx (float): The distance along the x-axis.
+            dy (float): The distance along the y-axis.
+    """
+
+    def __init__(self, shapes: Sequence[Any], dx: float, dy: float) -> None:
+        """
+            Initialize a MoveCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                dx (float): The distance along the x-axis.
+                dy (float): The distance along the y-axis.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.dx: float = dx
+        self.dy: float = dy
+
+    def undo(self) -> None:
+        for shape in self.shapes:
+            shape.move(-self.dx, -self.dy)
+
+    def redo(self) -> None:
+        for shape in self.shapes:
+            shape.move(self.dx, self.dy)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+
+class ScaleCommand(Command):
+    """
+        Shapes scaled together around a common origin.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            scale_x (float): The scale factor along the x-axis.
+            scale_y (float): The scale factor along the y-axis.
+            origin_x (float): The x-coordinate of the point that stays in place.
+            origin_y (float): The y-coordinate of the point that stays in place.
+    """
+
+    def __init__(self, shapes: Sequence[Any], scale_x: float, scale_y: float, origin_x: float,
+                 origin_y: float) -> None:
+        """
+            Initialize a ScaleCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                scale_x (float): The scale factor along the x-axis, not 0.
+                scale_y (float): The scale factor along the y-axis, not 0.
+                origin_x (float): The x-coordinate of the point that stays in place.
+                origin_y (float): The y-coordinate of the point that stays in place.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.scale_x: float = scale_x
+        self.scale_y: float = scale_y
+        self.origin_x: float = origin_x
+        self.origin_y: float = origin_y
+
+    def apply(self, scale_x: float, scale_y: float) -> None:
+        """
+            Scale the shapes around the origin.
+
+            Args:
+                scale_x (float): The scale factor along the x-axis.
+                scale_y (float): The scale factor along the y-axis.
+
+            Returns:
+                None
+        """
+        matrix = scaling(scale_x, scale_y, self.origin_x, self.origin_y)
+        for shape in self.shapes:
+            shape.transform(matrix)
+
+    def undo(self) -> None:
+        self.apply(1 / self.scale_x, 1 / self.scale_y)
+
+    def redo(self) -> None:
+        self.apply(self.scale_x, self.scale_y)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+
+class TransformCommand(Command):
+    """
+        Shapes rotated or flipped together, or transformed by any other matrix.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            matrix (Matrix): The transform, composed with the matrix of every shape.
+    """
+
+    def __init__(self, shapes: Sequence[Any], matrix: Matrix) -> None:
+        """
+            Initialize a TransformCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                matrix (Matrix): The transform, which must not flatten the plane.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.matrix: Matrix = matrix
+
+    def undo(self) -> None:
+        inverse = invert(self.matrix)
+        for shape in self.shapes:
+            shape.transform(inverse)
+
+    def redo(self) -> None:
+        for shape in self.shapes:
+            shape.transform(self.matrix)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+
+class ColorCommand(Command):
+    """
+        The fill color of shapes changed to the same color.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            before (List[str]): The color of every shape before the change.
+            after (str): The color after the change.
+    """
+
+    def __init__(self, shapes: Sequence[Any], before: Sequence[str], after: str) -> None:
+        """
+            Initialize a ColorCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                before (Sequence[str]): The color of every shape before the change.
+                after (str): The color after the change.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.before: List[str] = list(before)
+        self.after: str = after
+
+    def undo(self) -> None:
+        for shape, color in zip(self.shapes, self.before):
+            shape.set_color(color)
+
+    def redo(self) -> None:
+        for shape in self.shapes:
+            shape.set_color(self.after)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + 2 * REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+
+class OutlineCommand(Command):
+    """
+        The outline color or width of shapes changed.
+
+        The steps of one drag of the size slider on the same shapes are merged into one command.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            before (List[Tuple[str, int]]): The outline color and width of every shape before the change.
+            after (List[Tuple[str, int]]): The outline color and width of every shape after the change.
+            gesture (Optional[int]): The drag of the size slider that changed the width, None for any other change.
+    """
+
+    def __init__(self, shapes: Sequence[Any], before: Sequence[Tuple[str, int]],
+                 after: Sequence[Tuple[str, int]], gesture: Optional[int] = None) -> None:
+        """
+            Initialize an OutlineCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                before (Sequence[Tuple[str, int]]): The outline color and width of every shape before the change.
+                after (Sequence[Tuple[str, int]]): The outline color and width of every shape after the change.
+                gesture (Optional[int]): The drag of the size slider that changed the width, None for any other
+                    change.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.before: List[Tuple[str, int]] = list(before)
+        self.after: List[Tuple[str, int]] = list(after)
+        self.gesture: Optional[int] = gesture
+
+    def undo(self) -> None:
+        for shape, outline in zip(self.shapes, self.before):
+            shape.set_outline(*outline)
+
+    def redo(self) -> None:
+        for shape, outline in zip(self.shapes, self.after):
+            shape.set_outline(*outline)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + 3 * REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+    def merge(self, command: Command) -> bool:
+        if not isinstance(command, OutlineCommand) or self.gesture is None or command.gesture != self.gesture:
+            return False
+        if len(command.shapes) != len(self.shapes) or any(
+                mine is not theirs for mine, theirs in zip(self.shapes, command.shapes)):
+            return False
+        # Only the width may change along a drag, the colors stay those before the drag
+        if any(before[0] != after[0] for before, after in zip(command.before, command.after)):
+            return False
+        self.after = command.after
+        return True
+
+
+class ZOrderCommand(Command):
+    """
+        Shapes moved in the stacking order, by bringing them to the front.
+
+        Attributes:
+            shapes (List[Any]): The shapes.
+            before (List[float]): The stacking position of every shape before the change.
+            after (List[float]): The stacking position of every shape after the change.
+    """
+
+    def __init__(self, shapes: Sequence[Any], before: Sequence[float], after: Sequence[float]) -> None:
+        """
+            Initialize a ZOrderCommand.
+
+            Args:
+                shapes (Sequence[Any]): The shapes.
+                before (Sequence[float]): The stacking position of every shape before the change.
+                after (Sequence[float]): The stacking position of every shape after the change.
+
+            Returns:
+                None
+        """
+        self.shapes: List[Any] = list(shapes)
+        self.before: List[float] = list(before)
+        self.after: List[float] = list(after)
+
+    def undo(self) -> None:
+        for shape, z in zip(self.shapes, self.before):
+            shape.set_z(z)
+        restack(self.shapes)
+
+    def redo(self) -> None:
+        for shape, z in zip(self.shapes, self.after):
+            shape.set_z(z)
+        restack(self.shapes)
+
+    def size(self) -> int:
+        return COMMAND_BYTES + 3 * REFERENCE_BYTES * len(self.shapes)
+
+    def affected(self) -> List[Any]:
+        return self.shapes
+
+    def remap_z(self, remap: Callable[[float], float]) -> None:
+        self.before = [remap(z) for z in self.before]
+        self.after = [remap(z) for z in self.after]
+
+
+class EraseCommand(Command):
+    """
+        Strokes cut by the eraser.
+
+        Attributes:
+            changes (List[Tuple[Any, list, Optional[list], List[Any]]]): For every stroke the eraser touched, the
+                stroke, its points before and after the cut (None when it was erased entirely) and the strokes
+                split off it.
+    """
+
+    def __init__(self) -> None:
+        """
+            Initialize an EraseCommand without changes.
+
+            Returns:
+                None
+        """
+        self.changes: List[Tuple[Any, list, Optional[list], List[Any]]] = []
+
+    def add(self, stroke: Any, before: list, after: Optional[list], pieces: Sequence[Any]) -> None:
+        """
+            Record the cut of one stroke.
+
+            Args:
+                stroke (Any): The stroke.
+                before (list): Its points before the cut.
+                after (Optional[list]): Its points after the cut, None if it was deleted.
+                pieces (Sequence[Any]): The strokes split off it.
+
+            Returns:
+                None
+        """
+        self.changes.append((stroke, before, after, list(pieces)))
+
+    def undo(self) -> None:
+        restored = []
+        for stroke, before, after, pieces in reversed(self.changes):
+            for piece in pieces:
+                piece.delete()
+            stroke.set_points(before)
+            if after is None:
+                stroke.insert()
+            restored.append(stroke)
+        restack(restored)
+
+    def redo(self) -> None:
+        restored = []
+        for stroke, before, after, pieces in self.changes:
+            if after is None:
+                stroke.delete()
+            else:
+                stroke.set_points(after)
+            for piece in pieces:
+                piece.insert()
+            restored.extend(pieces)
+        restack(restored)
+
+    def affected(self) -> List[Any]:
+        shapes = []
+        for stroke, before, after, pieces in self.changes:
+            shapes.append(stroke)
+            shapes.extend(pieces)
+        return shapes
+
+    def size(self) -> int:
+        points = 0
+        for stroke, before, after, pieces in self.changes:
+            points += len(before) + len(after or ()) + sum(len(piece.drawn_points) for piece in pieces)
+        return COMMAND_BYTES + POINT_BYTES * points + SHAPE_BYTES * len(self.changes)
+
+
+class SimplifyCommand(Command):
+    """
+        Strokes whose points were replaced by fewer points, e.g. by re-simplifying the document.
+
+        Attributes:
+            changes (List[Tuple[Any, list, list]]): For every simplified stroke, the stroke and its points before
+                and after.
+    """
+
+    def __init__(self) -> None:
+        """
+            Initialize a SimplifyCommand without changes.
+
+            Returns:
+                None
+        """
+        self.changes: List[Tuple[Any, list, list]] = []
+
+    def add(self, stroke: Any, before: list, after: list) -> None:
+        """
+            Record the simplification of one stroke.
+
+            Args:
+                stroke (Any): The stroke.
+                before (list): Its points before.
+                after (list): Its points after.
+
+            Returns:
+                None
+        """
+        self.changes.append((stroke, before, after))
+
+    def undo(self) -> None:
+        for stroke, before, after in self.changes:
+            stroke.set_points(before)
+
+    def redo(self) -> None:
+        for stroke, before, after in self.changes:
+            stroke.set_points(after)
+
+    def affected(self) -> List[Any]:
+        return [stroke for stroke, before, after in self.changes]
+
+    def size(self) -> int:
+        points = sum(len(before) + len(after) for stroke, before, after in self.changes)
+        return COMMAND_BYTES + POINT_BYTES * points + REFERENCE_BYTES * len(self.changes)
+
+
+class History:
+    """
+        The undo and redo stacks of a document, within a memory budget.
+
+        Attributes:
+            max_bytes (int): The budget of the estimated memory of all the commands.
+            undo_stack (Deque[Command]): The commands that can be undone, the newest last.
+            redo_stack (List[Command]): The commands that can be redone, the next one last.
+            size (int): The estimated memory of the commands of both stacks.
+            listeners (List[Callable[[Command], None]]): Called with every command after it was done, undone or
+                redone, e.g. to write the changes to a journal.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_HISTORY_BYTES) -> None:
+        """
+            Initialize an empty History.
+
+            Args:
+                max_bytes (int): The memory budget in bytes.
+
+            Returns:
+                None
+        """
+        self.max_bytes: int = max_bytes
+        self.undo_stack: Deque[Command] = deque()
+        self.redo_stack: List[Command] = []
+        self.size: int = 0
+        self.listeners: List[Callable[[Command], None]] = []
+
+    def __len__(self) -> int:
+        return len(self.undo_stack)
+
+    def record(self, command: Command) -> None:
+        """
+            Add a change that was just made, which makes the undone commands impossible to redo.
+
+            Args:
+                command (Command): The change.
+
+            Returns:
+                None
+        """
+        for undone in self.redo_stack:
+            self.size -= undone.cost
+        self.redo_stack.clear()
+        self.notify(command)
+        if self.undo_stack and self.undo_stack[-1].merge(command):
+            return
+        command.cost = command.size()
+        self.undo_stack.append(command)
+        self.size += command.cost
+        self.evict()
+
+    def notify(self, command: Command) -> None:
+        """
+            Tell the listeners about a command that was done, undone or redone.
+
+            Args:
+                command (Command): The command.
+
+            Returns:
+                None
+        """
+        for listener in self.listeners:
+            listener(command)
+
+    def evict(self) -> None:
+        """
+            Drop the oldest commands until the history fits in its budget.
+
+            The newest command is always kept, so even a change larger than the budget can be undone.
+
+            Returns:
+                None
+        """
+        while self.size > self.max_bytes and len(self.undo_stack) > 1:
+            self.size -= self.undo_stack.popleft().cost
+            logger.debug("Dropped the oldest undo step, %d left", len(self.undo_stack))
+
+    def undo(self) -> Optional[Command]:
+        """
+            Undo the newest command.
+
+            Returns:
+                Optional[Command]: The undone command, None if there was nothing to undo.
+        """
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.undo()
+        self.redo_stack.append(command)
+        self.notify(command)
+        logger.debug("Undo %s", type(command).__name__)
+        return command
+
+    def redo(self) -> Optional[Command]:
+        """
+            Redo the last undone command.
+
+            Returns:
+                Optional[Command]: The redone command, None if there was nothing to redo.
+        """
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.redo()
+        self.undo_stack.append(command)
+        self.notify(command)
+        logger.debug("Redo %s", type(command).__name__)
+        return command
+
+    def remap_z(self, remap: Callable[[float], float], registered: Container[Any]) -> None:
+        """
+            Renumber the stacking positions kept by the commands after the registered shapes were spread.
+
+            The shapes that are out of the document, e.g. deleted ones that undo would put back, get their z
+            remapped once each, so they return between the same shapes as before.
+
+            Args:
+                remap (Callable[[float], float]): Maps a stacking position from before the spread to after it.
+                registered (Container[Any]): The shapes of the document, which already have their new z.
+
+            Returns:
+                None
+        """
+        remapped = set()
+        for command in list(self.undo_stack) + self.redo_stack:
+            command.remap_z(remap)
+            for shape in command.affected():
+                if id(shape) not in remapped and shape not in registered:
+                    remapped.add(id(shape))
+                    shape.z = remap(shape.z)
+
+    def clear(self) -> None:
+        """
+            Forget every command.
+
+            Returns:
+                None
+        """
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
@@ -0,0 +1,276 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACE_EVENTS: int = 1_000_000
+
+
+def instrumented(function: Callable) -> Callable:
+    """
+        Mark a function as an instrumentation point.
+
+        The function is returned unchanged, so a marked handler costs nothing until install() wraps it.
+
+        Args:
+            function (Callable): The function to mark.
+
+        Returns:
+            Callable: The same function.
+    """
+    function.__instrumented__ = True
+    return function
+
+
+class Histogram:
+    """
+        A latency histogram with power of two microsecond buckets.
+
+        Attributes:
+            buckets (List[int]): buckets[i] counts the calls that took less than 2 ** i microseconds.
+            count (int): The number of recorded calls.
+            total (float): The sum of the recorded durations, in microseconds.
+            max (float): The longest recorded duration, in microseconds.
+    """
+
+    def __init__(self) -> None:
+        """
+            Initialize an empty Histogram.
+
+            Returns:
+                None
+        """
+        self.buckets: List[int] = [0] * 40
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration_us: float) -> None:
+        """
+            Record one call.
+
+            Args:
+                duration_us (float): The duration of the call, in microseconds.
+
+            Returns:
+                None
+        """
+        self.buckets[min(int(duration_us).bit_length(), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += duration_us
+        if duration_us > self.max:
+            self.max = duration_us
+
+    def percentile(self, fraction: float) -> float:
+        """
+            Estimate a percentile from the buckets.
+
+            Args:
+                fraction (float): The percentile, between 0 and 1.
+
+            Returns:
+                float: The upper bound of the bucket holding the percentile, in microseconds.
+        """
+        target = fraction * self.count
+        seen = 0
+        for i, bucket in enumerate(self.buckets):
+            seen += bucket
+            if bucket and seen >= target:
+                return min(float(2 ** i), self.max)
+        return self.max
+
+
+class Instrumentation:
+    """
+        The state of the instrumentation layer.
+
+        Attributes:
+            histograms (Dict[str, Histogram]): The latency histogram of every instrumented handler.
+            trace_events (List[dict]): The recorded Chrome trace events.
+            trace_path (Optional[str]): Where to write the Chrome trace on exit, None disables tracing.
+            record_histograms (bool): Whether latency histograms are recorded.
+            installed (bool): Whether the handlers have been wrapped.
+    """
+    histograms: Dict[str, Histogram] = {}
+    trace_events: List[dict] = []
+    trace_path: Optional[str] = None
+    record_histograms: bool = False
+    installed: bool = False
+
+
+def _record(name: str, histogram: Histogram, start: float) -> None:
+    """
+        Record a call that started at `start` and has just returned.
+
+        Args:
+            name (str): The name the call is recorded under.
+            histogram (Histogram): The latency histogram of the name.
+            start (float): The time.perf_counter() when the call started.
+
+        Returns:
+            None
+    """
+    end = time.perf_counter()
+    duration_us = (end - start) * 1e6
+    if Instrumentation.record_histograms:
+        histogram.add(duration_us)
+    if Instrumentation.trace_path is not None and len(Instrumentation.trace_events) < MAX_TRACE_EVENTS:
+        Instrumentation.trace_events.append({"name": name, "cat": "handler", "ph": "X", "ts": start * 1e6,
+                                             "dur": duration_us, "pid": os.getpid(), "tid": threading.get_ident()})
+
+
+def _wrap(name: str, function: Callable) -> Callable:
+    """
+        Wrap a handler so that each call is timed.
+
+        Args:
+            name (str): The name the calls are recorded under.
+            function (Callable): The handler.
+
+        Returns:
+            Callable: The timed handler.
+    """
+    histogram = Instrumentation.histograms.setdefault(name, Histogram())
+
+    @wraps(function)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _record(name, histogram, start)
+
+    return timed
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+        Time every call of a function once the instrumentation is installed.
+
+        For module functions and callbacks, which install() cannot reach through a class. Until then a call costs
+        one attribute check.
+
+        Args:
+            name (str): The name the calls are recorded under.
+
+        Returns:
+            Callable[[Callable], Callable]: The decorator.
+    """
+
+    def decorator(function: Callable) -> Callable:
+
+        @wraps(function)
+        def maybe_timed(*args: Any, **kwargs: Any) -> Any:
+            if not Instrumentation.installed:
+                return function(*args, **kwargs)
+            histogram = Instrumentation.histograms.setdefault(name, Histogram())
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(name, histogram, start)
+
+        return maybe_timed
+
+    return decorator
+
+
+def _subclasses(classes: Iterable[type]) -> List[type]:
+    """
+        Collect classes together with all their subclasses.
+
+        Args:
+            classes (Iterable[type]): The root classes.
+
+        Returns:
+            List[type]: The classes and their subclasses, each listed once.
+    """
+    found: List[type] = []
+    pending = list(classes)
+    while pending:
+        cls = pending.pop()
+        if cls not in found:
+            found.append(cls)
+            pending.extend(cls.__subclasses__())
+    return found
+
+
+def install(classes: Iterable[type], histograms: bool = True, trace_path: Optional[str] = None) -> None:
+    """
+        Wrap the instrumented handlers of some classes and start recording.
+
+        The summary and the trace are written when the process exits.
+
+        Args:
+            classes (Iterable[type]): The classes whose handlers, and whose subclasses' handlers, are timed.
+            histograms (bool): Whether to record latency histograms.
+            trace_path (Optional[str]): The file to write the Chrome trace-event JSON to, None disables tracing.
+
+        Returns:
+            None
+    """
+    Instrumentation.record_histograms = histograms
+    Instrumentation.trace_path = trace_path
+    if not Instrumentation.installed:
+        for cls in _subclasses(classes):
+            for attribute, value in list(vars(cls).items()):
+                if getattr(value, "__instrumented__", False):
+                    setattr(cls, attribute, _wrap(cls.__name__ + "." + attribute, value))
+        Instrumentation.installed = True
+        atexit.register(finish)
+    logger.info("Instrumentation installed (histograms=%s, trace=%s)", histograms, trace_path)
+
+
+def write_report(stream: TextIO = sys.stderr) -> None:
+    """
+        Write the latency histograms as a table.
+
+        Args:
+            stream (TextIO): The stream to write to.
+
+        Returns:
+            None
+    """
+    rows = [(name, h) for name, h in Instrumentation.histograms.items() if h.count]
+    if not rows:
+        return
+    rows.sort(key=lambda row: row[1].total, reverse=True)
+    stream.write("%-40s %9s %11s %11s %11s %11s\n" % ("handler", "calls", "mean(us)", "p50(us)", "p99(us)", "max(us)"))
+    for name, h in rows:
+        stream.write("%-40s %9d %11.1f %11.1f %11.1f %11.1f\n" % (name, h.count, h.total / h.count,
+                                                                  h.percentile(0.5), h.percentile(0.99), h.max))
+
+
+def write_trace(path: str) -> None:
+    """
+        Write the recorded events as a Chrome trace-event JSON file.
+
+        Args:
+            path (str): The file to write.
+
+        Returns:
+            None
+    """
+    with open(path, "w") as file:
+        json.dump({"traceEvents": Instrumentation.trace_events, "displayTimeUnit": "ms"}, file)
+
+
+def finish() -> None:
+    """
+        Write the report and the trace of the session.
+
+        Returns:
+            None
+    """
+    if Instrumentation.record_histograms:
+        write_report()
+    if Instrumentation.trace_path is not None:
+        write_trace(Instrumentation.trace_path)
+        logger.info("Trace written to %s", Instrumentation.trace_path)
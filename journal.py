@@ -0,0 +1,416 @@
+"""
+Append-only journal of the changes to a document, for autosave and crash recovery.
+
+The journal directory holds two files while the application runs:
+
+    snapshot.json   the whole document at the last compaction, a JSON array of {"id", "z", "shape"} entries
+    journal.jsonl   one JSON record per line for every change since that snapshot:
+                    {"op": "put", "id", "z", "shape"} adds or replaces a shape, {"op": "remove", "id"} removes one,
+                    {"op": "clear"} removes every shape and {"op": "spread", "ids", "z"} gives shapes new stacking
+                    positions after the document renumbered them
+
+The Tk thread only turns the shapes a change touched into dictionaries and queues them. A background thread encodes
+and appends the records, keeps its own copy of the document and, every COMPACT_RECORDS records or COMPACT_SECONDS
+seconds, writes it to a new snapshot and empties the journal. Replaying the journal over the snapshot gives the
+document at the last flushed record, even when the application died during a compaction.
+
+Both files are deleted when the application closes normally, so files left in the directory mean the last session
+did not finish. A running session holds an exclusive lock on journal.lock in the directory, so a second window
+neither mistakes the live files of the first for a crashed session nor writes over them. The operating system drops
+the lock when the process dies, which leaves the files of a crashed session free to restore.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, its files are locked with msvcrt
+    fcntl = None
+    import msvcrt
+
+from history import Command, DeleteCommand
+from Shape import Document, encode_record
+from storage import dump_items, iter_json_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR: str = os.path.join(os.path.expanduser("~"), ".painter", "journal")
+SNAPSHOT_FILE: str = "snapshot.json"
+JOURNAL_FILE: str = "journal.jsonl"
+LOCK_FILE: str = "journal.lock"
+COMPACT_RECORDS: int = 10000
+COMPACT_SECONDS: float = 60.0
+
+# The model of a document kept by the writer thread and rebuilt by replay: the z and saved shape of every shape id
+Model = Dict[int, Tuple[float, dict]]
+
+
+def lock_directory(directory: str) -> Optional[IO]:
+    """
+        Take the exclusive lock of a journal directory, without waiting.
+
+        Args:
+            directory (str): The journal directory, created if needed.
+
+        Returns:
+            Optional[IO]: The open lock file, which holds the lock until it is closed, None if another process holds
+                the lock.
+    """
+    os.makedirs(directory, exist_ok=True)
+    file = open(os.path.join(directory, LOCK_FILE), "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        file.close()
+        return None
+    file.seek(0)
+    file.truncate()
+    file.write("%d\n" % os.getpid())
+    file.flush()
+    return file
+
+
+def has_session(directory: str) -> bool:
+    """
+        Check whether a journal directory holds an unfinished session.
+
+        Args:
+            directory (str): The journal directory.
+
+        Returns:
+            bool: True if the last session left a shape in its snapshot or a record in its journal behind, an empty
+                drawing leaves nothing to restore.
+    """
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        try:
+            for _ in iter_json_file(snapshot_path):
+                return True
+        except ValueError:
+            logger.warning("The journal snapshot is damaged")
+    journal_path = os.path.join(directory, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        with open(journal_path) as file:
+            return any(line.strip() for line in file)
+    return False
+
+
+def apply_record(model: Model, record: dict) -> None:
+    """
+        Apply one journal record to a document model.
+
+        Args:
+            model (Model): The model, updated in place.
+            record (dict): The record.
+
+        Returns:
+            None
+    """
+    op = record.get("op")
+    if op == "put":
+        model[record["id"]] = (record["z"], record["shape"])
+    elif op == "remove":
+        model.pop(record["id"], None)
+    elif op == "clear":
+        model.clear()
+    elif op == "spread":
+        for shape_id, z in zip(record["ids"], record["z"]):
+            if shape_id in model:
+                model[shape_id] = (z, model[shape_id][1])
+    else:
+        logger.warning("Skipping unknown journal record %r", op)
+
+
+def read_session(directory: str) -> List[dict]:
+    """
+        Rebuild the document of an unfinished session from its snapshot and journal.
+
+        A last journal line cut short by a crash is skipped.
+
+        Args:
+            directory (str): The journal directory.
+
+        Returns:
+            List[dict]: The saved shapes in drawing order, as returned by Shape.to_dict.
+    """
+    model: Model = {}
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        try:
+            for entry in iter_json_file(snapshot_path):
+                model[entry["id"]] = (entry["z"], entry["shape"])
+        except (ValueError, KeyError) as error:
+            logger.error("Ignoring a damaged journal snapshot: %s", error)
+    journal_path = os.path.join(directory, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        with open(journal_path) as file:
+            for number, line in enumerate(file, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping unreadable journal line %d", number)
+                    continue
+                apply_record(model, record)
+    return [data for z, data in sorted(model.values(), key=lambda entry: entry[0])]
+
+
+def discard_session(directory: str) -> None:
+    """
+        Delete the files of a session.
+
+        Args:
+            directory (str): The journal directory.
+
+        Returns:
+            None
+    """
+    for name in (SNAPSHOT_FILE, JOURNAL_FILE, SNAPSHOT_FILE + ".tmp"):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def iter_snapshot(model: Model) -> Iterator[dict]:
+    """
+        Get the snapshot entries of a document model in drawing order.
+
+        Args:
+            model (Model): The model.
+
+        Returns:
+            Iterator[dict]: The {"id", "z", "shape"} entries.
+    """
+    for shape_id, (z, data) in sorted(model.items(), key=lambda item: item[1][0]):
+        yield {"id": shape_id, "z": z, "shape": data}
+
+
+class Journal:
+    """
+        Writes the changes of a document to the journal directory on a background thread.
+
+        Attributes:
+            document (Document): The document.
+            directory (str): The journal directory.
+            compact_records (int): The number of records after which the journal is compacted.
+            compact_seconds (float): The time after which a journal with records is compacted.
+            records (queue.Queue): The records waiting for the writer thread, None asks it to stop.
+            thread (Optional[threading.Thread]): The writer thread, None before start().
+            lock (Optional[IO]): The lock file of the directory while this journal holds it.
+            discard (bool): Whether the writer thread deletes the session files when it stops.
+    """
+
+    def __init__(self, document: Document, directory: str = DEFAULT_JOURNAL_DIR,
+                 compact_records: int = COMPACT_RECORDS, compact_seconds: float = COMPACT_SECONDS) -> None:
+        """
+            Initialize a Journal, nothing is written before start().
+
+            Args:
+                document (Document): The document to write, its history is not listened to before start().
+                directory (str): The journal directory, created if needed.
+                compact_records (int): The number of records after which the journal is compacted.
+                compact_seconds (float): The time after which a journal with records is compacted.
+
+            Returns:
+                None
+        """
+        self.document: Document = document
+        self.directory: str = directory
+        self.compact_records: int = compact_records
+        self.compact_seconds: float = compact_seconds
+        self.records: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.discard: bool = False
+        self.lock: Optional[IO] = None
+
+    def acquire(self) -> bool:
+        """
+            Lock the journal directory for this journal, before looking for an unfinished session in it.
+
+            Returns:
+                bool: True if the directory is now locked, False if another running window writes to it.
+        """
+        if self.lock is None:
+            self.lock = lock_directory(self.directory)
+        return self.lock is not None
+
+    def release(self) -> None:
+        """
+            Unlock the journal directory.
+
+            Returns:
+                None
+        """
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+
+    def start(self) -> None:
+        """
+            Start a new session from the current document, start the writer thread and listen to the history.
+
+            The files of an earlier session are replaced by a snapshot of the document, e.g. of the shapes restored
+            from the last session. The directory must have been locked with acquire() first.
+
+            Returns:
+                None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        model: Model = {shape.id: (shape.z, shape.to_record()) for shape in self.document.shapes}
+        self.thread = threading.Thread(target=self.run, args=(model,), name="journal", daemon=True)
+        self.thread.start()
+        self.document.history.listeners.append(self.on_command)
+        self.document.shapes.spread_listeners.append(self.on_spread)
+
+    def on_command(self, command: Command) -> None:
+        """
+            Queue the records of a change, as a History listener.
+
+            A shape still in the document is written whole, a shape no longer in it is removed. Clearing the canvas
+            is written as a single record. Only a record of each shape with a copy of its packed points is taken
+            here, the writer thread turns the points into lists so the Tk thread never does.
+
+            Args:
+                command (Command): The change that was done, undone or redone.
+
+            Returns:
+                None
+        """
+        if self.thread is None:
+            return
+        if isinstance(command, DeleteCommand) and not self.document.shapes:
+            self.records.put({"op": "clear"})
+            return
+        for shape in command.affected():
+            if shape in self.document.index:
+                self.records.put({"op": "put", "id": shape.id, "z": shape.z, "shape": shape.to_record()})
+            else:
+                self.records.put({"op": "remove", "id": shape.id})
+
+    def on_spread(self, shapes: List[Any], old: List[float]) -> None:
+        """
+            Queue the new stacking positions of the shapes, as a Registry spread listener.
+
+            Args:
+                shapes (List[Any]): The shapes of the document in stacking order, with their new z.
+                old (List[float]): Their z before the spread.
+
+            Returns:
+                None
+        """
+        if self.thread is None:
+            return
+        self.records.put({"op": "spread", "ids": [shape.id for shape in shapes], "z": [shape.z for shape in shapes]})
+
+    def close(self, discard: bool = True) -> None:
+        """
+            Stop listening to the history, write the queued records and stop the writer thread.
+
+            Args:
+                discard (bool): Delete the session files afterwards, for a normal exit.
+
+            Returns:
+                None
+        """
+        if self.thread is None:
+            return
+        self.document.history.listeners.remove(self.on_command)
+        self.document.shapes.spread_listeners.remove(self.on_spread)
+        self.discard = discard
+        self.records.put(None)
+        self.thread.join()
+        self.thread = None
+        self.release()
+
+    def run(self, model: Model) -> None:
+        """
+            Write queued records until close() is called, in the writer thread.
+
+            Every batch of records taken from the queue is written with one flush. The shapes of the model and
+            of the put records come as Shape.to_record records and are encoded here.
+
+            Args:
+                model (Model): The document when the session started.
+
+            Returns:
+                None
+        """
+        journal_path = os.path.join(self.directory, JOURNAL_FILE)
+        for shape_id, (z, data) in model.items():
+            model[shape_id] = (z, encode_record(data))
+        try:
+            self.compact(model)
+            file = open(journal_path, "w")
+        except OSError:
+            logger.exception("Cannot write the journal in %s, autosave is off", self.directory)
+            return
+        pending = 0
+        last_compaction = time.monotonic()
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    batch = [self.records.get(timeout=self.compact_seconds)]
+                except queue.Empty:
+                    batch = []
+                while True:
+                    try:
+                        batch.append(self.records.get_nowait())
+                    except queue.Empty:
+                        break
+                for record in batch:
+                    if record is None:
+                        stopping = True
+                        break
+                    if record.get("op") == "put":
+                        record["shape"] = encode_record(record["shape"])
+                    apply_record(model, record)
+                    file.write(json.dumps(record, separators=(",", ":")))
+                    file.write("\n")
+                    pending += 1
+                file.flush()
+                due = pending and time.monotonic() - last_compaction >= self.compact_seconds
+                if not stopping and (pending >= self.compact_records or due):
+                    file.close()
+                    self.compact(model)
+                    file = open(journal_path, "w")
+                    pending = 0
+                    last_compaction = time.monotonic()
+        except OSError:
+            logger.exception("Writing the journal failed, autosave is off")
+        finally:
+            file.close()
+        if self.discard:
+            discard_session(self.directory)
+
+    def compact(self, model: Model) -> None:
+        """
+            Write the document to a new snapshot and empty the journal, in the writer thread.
+
+            The snapshot replaces the old one atomically, so a crash leaves either snapshot with a journal that
+            replays to the same document.
+
+            Args:
+                model (Model): The current document.
+
+            Returns:
+                None
+        """
+        start = time.perf_counter()
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(snapshot_path + ".tmp", "w") as file:
+            dump_items(iter_snapshot(model), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+        open(os.path.join(self.directory, JOURNAL_FILE), "w").close()
+        logger.info("Compacted the journal into %d shapes in %.3f s", len(model), time.perf_counter() - start)
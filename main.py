@@ -1,14 +1,28 @@
 import argparse
+import logging
 import tkinter
 from tkinter import *
 import tkinter as tki
-from Shape import Rectangle, Elips, Shape, Triangle, Lines, Eraser, TextShape, PolygonShape
-from tkinter import colorchooser, filedialog, messagebox
-from PIL import (ImageGrab, ImageTk, Image)
-import json
+from Shape import (SELECTED_TAG, Document, Rectangle, Elips, Shape, Triangle, Lines, Eraser, TextShape, PolygonShape,
+                   Selection, SelectionOverlay, ShapeEvents)
+from tkinter import colorchooser, filedialog, messagebox, simpledialog
+from PIL import (ImageTk, Image)
 from typing import Any, Optional, Callable, List
+import instrument
+from instrument import instrumented
+from storage import dump_shapes, iter_json_file, load_shapes, load_shapes_incrementally
+from binformat import BINARY_EXTENSION, is_binary_path, iter_binary_file, write_binary
+from render import DEFAULT_SUPERSAMPLE, document_bounds, render_document, union_bounds
+from batch import DEFAULT_THUMBNAIL_SIZE, BatchOptions, run_batch
+from viewport import VIEW_CHANGED, ViewCanvas
+from history import (DEFAULT_HISTORY_BYTES, ColorCommand, CreateCommand, DeleteCommand, History, OutlineCommand,
+                     ZOrderCommand)
+from journal import DEFAULT_JOURNAL_DIR, Journal, discard_session, has_session, read_session
+
+logger = logging.getLogger(__name__)
 
 BUTTON_WIDTH: int = 30
+DRAWING_FILETYPES: List[Any] = [("JSON files", "*.json"), ("Binary drawings", "*" + BINARY_EXTENSION)]
 SHAPE_BUTTON_WIDTH: int = 10
 SHAPE_BUTTON_BG: str = "lavender"
 
@@ -20,11 +34,16 @@ class Draw:
     interact with the canvas, manage undo and redo actions, save and load work, and change the drawing tools.
         """
 
-    def __init__(self) -> None:
+    def __init__(self, journal_dir: Optional[str] = DEFAULT_JOURNAL_DIR,
+                 history_bytes: int = DEFAULT_HISTORY_BYTES) -> None:
         """
         Initialize the drawing application.
         This method initializes the drawing application by creating the main window, canvas, and various buttons
         for different functionalities.
+
+        Args:
+            journal_dir (Optional[str]): The directory of the autosave journal, None disables autosave.
+            history_bytes (int): The memory budget of the undo history.
                 """
 
         self.start_y: Optional[int] = None
@@ -38,14 +57,20 @@ class Draw:
         self.text_entry: Optional[Entry] = None
         self.text_alignment: str = ""
         self.eraser_size: Optional[int] = None
+        # The number of drags of the size slider so far, and the one in progress
+        self.size_drags: int = 0
+        self.size_gesture: Optional[int] = None
         self.__root: tkinter.Tk = tki.Tk()
         self.tool_mode: str = "paint"
 
         self.canvas_frame: Frame = tki.Frame(self.__root)
         self.canvas_frame.pack(side=tki.TOP, fill=tki.BOTH, expand=True)
 
-        self.__canvas: Canvas = Canvas(self.__root, bg='white', width=600, height=600)
+        self.document: Document = Document(history=History(history_bytes))
+        self.__canvas: ViewCanvas = ViewCanvas(self.__root, self.document.index, bg='white', width=600, height=600)
+        self.document.attach(self.__canvas)
         self.__canvas.pack(side=tki.BOTTOM, fill=tki.BOTH, expand=True)
+        self.__canvas.bind(VIEW_CHANGED, self.on_view_changed)
 
         self.bar_frame: Frame = tki.Frame(self.__root, bg="lavender")
         self.bar_frame.pack(side=tki.TOP, fill=tki.X)
@@ -53,16 +78,72 @@ class Draw:
         self.create_buttons()
         self.create_shapes()
         self.create_delete_buttons()
+        self.create_transform_buttons()
         self.create_save_buttons()
         self.bring_to_front = Button(self.bar_frame, text="front", width=10, bg="lavender", command=self.bring_to_front)
         self.bring_to_front.pack(side=tki.LEFT, padx=5)
+        self.simplify_button = Button(self.bar_frame, text="simplify", width=10, bg="lavender",
+                                      command=self.simplify_strokes)
+        self.simplify_button.pack(side=tki.LEFT, padx=5)
+        self.undo_button = Button(self.bar_frame, text="undo", width=10, bg="lavender", command=self.undo)
+        self.undo_button.pack(side=tki.LEFT, padx=5)
+        self.redo_button = Button(self.bar_frame, text="redo", width=10, bg="lavender", command=self.redo)
+        self.redo_button.pack(side=tki.LEFT, padx=5)
+        self.__root.bind("<Control-z>", self.undo)
+        self.__root.bind("<Control-y>", self.redo)
 
         self.prev_x: Optional[int] = None
         self.prev_y: Optional[int] = None
-        self.deleted_shapes: List[Optional[int]] = []
+
+        self.journal: Optional[Journal] = None
+        if journal_dir is not None:
+            self.start_journal(journal_dir)
+        self.__root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.__root.mainloop()
 
+    # ______________________________#Autosave#_________________________________________________________________________
+    def start_journal(self, journal_dir: str) -> None:
+        """
+            Offer to restore the drawing of a session that did not end normally, then start the autosave journal.
+
+            Autosave is turned off with a warning while another window writes to the same journal directory.
+
+            Args:
+                journal_dir (str): The directory of the journal.
+
+            Returns:
+                None
+            """
+        journal = Journal(self.document, journal_dir)
+        if not journal.acquire():
+            logger.warning("Another window autosaves to %s, autosave is off", journal_dir)
+            messagebox.showwarning("Autosave off", "Another window is autosaving to " + journal_dir + ".\n"
+                                                   "This drawing will not be autosaved.")
+            return
+        if has_session(journal_dir):
+            if messagebox.askyesno("Restore drawing", "The last session did not end normally.\n"
+                                                      "Restore its drawing?"):
+                count = load_shapes(self.document, read_session(journal_dir))
+                logger.info("Restored %d shapes from the journal", count)
+            else:
+                discard_session(journal_dir)
+        self.journal = journal
+        self.journal.start()
+
+    def on_close(self) -> None:
+        """
+            Finish the journal and close the window.
+
+            A normal exit deletes the journal, so the next start does not offer to restore it.
+
+            Returns:
+                None
+            """
+        if self.journal is not None:
+            self.journal.close(discard=True)
+        self.__root.destroy()
+
     # ______________________________#Using the brush and the eraser#___________________________________________________
 
     def set_button_image(self, image_location: str, image_size: int) -> ImageTk.PhotoImage:
@@ -104,46 +185,51 @@ class Draw:
     def change_to_eraser(self) -> None:
         """This method sets the cursor to 'X_cursor' to indicate that the eraser tool is active. It then creates
                 an instance of the Eraser class to handle erasing actions on the canvas."""
-        if Shape.last_selected is not None:
-            Shape.last_selected.on_unselect()
+        self.document.selection.clear()
         self.__canvas.config(cursor="X_cursor")
-        Eraser(self.__canvas)
+        Eraser(self.document)
 
     def change_to_pen(self) -> None:
         """Change the drawing tool to pen.
 
                 This method sets the cursor to 'arrow' to indicate that the pen tool is active. It then creates
                 an instance of the Lines class to handle drawing actions on the canvas."""
-        if Shape.last_selected is not None:
-            Shape.last_selected.on_unselect()
+        self.document.selection.clear()
         self.__canvas.config(cursor="arrow")
-        Lines(self.__canvas, Shape.current_color)
+        Lines(self.document, self.document.current_color)
 
     # _______________________________#Delete and clear functions#______________________________________________________
     def delete_it(self) -> None:
         """
-        Delete the selected shape.
+        Delete the selected shapes.
 
-       This method deletes the currently selected shape from the canvas.
+       This method deletes the currently selected shapes from the canvas, as one undo step.
 
        Returns:
        None
        """
-        if Shape.last_selected is not None:
-            Shape.last_selected.delete()
+        shapes = list(self.document.selection)
+        if shapes:
+            for shape in shapes:
+                shape.delete()
+            self.document.history.record(DeleteCommand(shapes))
 
+    @instrumented
     def clear_canvas(self) -> None:
         """
         Clear all shapes from the canvas.
 
-        This method removes all shapes drawn on the canvas.
+        This method removes all shapes drawn on the canvas. Undo brings them all back.
 
         Returns:s
         None
         """
-        for shape in Shape.shape_list[:]:
+        command = DeleteCommand(list(self.document.shapes))
+        for shape in command.shapes:
             shape.delete(is_to_remove_from_list=False)
-        Shape.shape_list.clear()
+        self.document.clear()
+        if command.shapes:
+            self.document.history.record(command)
 
     # ______________________________#Add shapes functions#______________________________________________________________
 
@@ -161,9 +247,7 @@ class Draw:
             """
         if self.current_polygon is not None:
             return
-        elips = Elips(self.__canvas, 50, 60, Shape.current_color)
-        elips.set_outline(Shape.current_outline_color, Shape.current_width)
-        elips.move(self.__canvas.winfo_width() / 2, self.__canvas.winfo_height() / 2)
+        self.place_shape(Elips(self.document, 50, 60, self.document.current_color, create=False))
 
     def add_circle(self) -> None:
         """
@@ -178,9 +262,7 @@ class Draw:
         """
         if self.current_polygon is not None:
             return
-        circle = Elips(self.__canvas, 60, 60, Shape.current_color)
-        circle.set_outline(Shape.current_outline_color, Shape.current_width)
-        circle.move(self.__canvas.winfo_width() / 2, self.__canvas.winfo_height() / 2)
+        self.place_shape(Elips(self.document, 60, 60, self.document.current_color, create=False))
 
     def add_rectangle(self) -> None:
         """
@@ -195,9 +277,7 @@ class Draw:
         """
         if self.current_polygon is not None:
             return
-        rect = Rectangle(self.__canvas, 100, 100, Shape.current_color)
-        rect.set_outline(Shape.current_outline_color, Shape.current_width)
-        rect.move(self.__canvas.winfo_width() / 2, self.__canvas.winfo_height() / 2)
+        self.place_shape(Rectangle(self.document, 100, 100, self.document.current_color, create=False))
 
     def add_triangle(self) -> None:
         """
@@ -212,9 +292,35 @@ class Draw:
         """
         if self.current_polygon is not None:
             return
-        triangle = Triangle(self.__canvas, 100, 150, Shape.current_color)
-        triangle.set_outline(Shape.current_outline_color, Shape.current_width)
-        triangle.move(self.__canvas.winfo_width() / 2, self.__canvas.winfo_height() / 2)
+        self.place_shape(Triangle(self.document, 100, 150, self.document.current_color, create=False))
+
+    def place_shape(self, shape: Shape) -> None:
+        """
+            Put a new shape at the center of the view, with the current outline, and draw it.
+
+            Args:
+                shape (Shape): The shape, created without its canvas item.
+
+            Returns:
+                None
+        """
+        shape.x, shape.y = self.__canvas.view_center()
+        shape.outline_color = self.document.current_outline_color
+        shape.outline_width = self.document.current_width
+        shape.create_item()
+        self.document.history.record(CreateCommand([shape]))
+
+    def on_view_changed(self, event: Any) -> None:
+        """
+            Move the selection overlay back around the selected shapes after the view was zoomed.
+
+            Args:
+                event (Any): The virtual event.
+
+            Returns:
+                None
+        """
+        self.document.selection.update_overlay()
 
     def start_polygon(self) -> None:
         """
@@ -230,7 +336,7 @@ class Draw:
             self.current_polygon = None
 
         if self.current_polygon is None:
-            self.current_polygon = PolygonShape(self.__canvas, Shape.current_color)
+            self.current_polygon = PolygonShape(self.document, self.document.current_color)
             self.current_polygon.start_draw()
             self.__canvas.bind("<Double-Button-1>", self.stop_polygon)
 
@@ -245,6 +351,8 @@ class Draw:
             """
         if self.current_polygon:
             self.current_polygon.stop_draw()
+            if self.current_polygon.points:
+                self.document.history.record(CreateCommand([self.current_polygon]))
             self.current_polygon = None
             self.__canvas.unbind("<Double-Button-1>")
 
@@ -262,9 +370,12 @@ class Draw:
         color: Any = colorchooser.askcolor()[1]
         if color:
             self.choose_color_button.config(bg=color, fg="white")
-            Shape.current_color = color
-            if Shape.last_selected is not None:
-                Shape.last_selected.set_color(color)
+            self.document.current_color = color
+            shapes = self.document.selection.styled("fill")
+            if shapes:
+                before = [shape.color for shape in shapes]
+                self.document.selection.restyle(fill=color)
+                self.document.history.record(ColorCommand(shapes, before, color))
 
     def set_outline_color(self) -> None:
         """
@@ -277,10 +388,12 @@ class Draw:
         color: Any = colorchooser.askcolor()[1]
         if color:
             self.choose_outline_color_button.config(bg=color, fg="white")
-            Shape.current_outline_color = color
-            if Shape.last_selected is not None:
-                Shape.last_selected.outline_color = color
-                Shape.last_selected.set_outline_color(Shape.last_selected, color)
+            self.document.current_outline_color = color
+            shapes = self.document.selection.styled("outline")
+            if shapes:
+                before = [(shape.outline_color, shape.outline_width) for shape in shapes]
+                self.document.selection.restyle(outline=color)
+                self.document.history.record(OutlineCommand(shapes, before, [(color, width) for _, width in before]))
 
     # ____________________________________#Changing sizes#__________________________________________________________
     def change_brush_size(self, size: str) -> None:
@@ -293,9 +406,38 @@ class Draw:
             Returns:
                 None
             """
-        Shape.current_width = size
-        if Shape.last_selected is not None:
-            Shape.last_selected.set_outline(Shape.last_selected.outline_color, size)
+        self.document.current_width = int(size)
+        shapes = self.document.selection.styled("width")
+        if shapes:
+            before = [(shape.outline_color, shape.outline_width) for shape in shapes]
+            self.document.selection.restyle(width=int(size))
+            self.document.history.record(OutlineCommand(shapes, before, [(color, int(size)) for color, _ in before],
+                                                        gesture=self.size_gesture))
+
+    def start_size_drag(self, event: Any) -> None:
+        """
+            Start a new drag of the size slider, whose width changes are undone together.
+
+            Args:
+                event (Any): The button press on the slider.
+
+            Returns:
+                None
+            """
+        self.size_drags += 1
+        self.size_gesture = self.size_drags
+
+    def stop_size_drag(self, event: Any) -> None:
+        """
+            End the drag of the size slider, so that the next width change is undone on its own.
+
+            Args:
+                event (Any): The button release on the slider.
+
+            Returns:
+                None
+            """
+        self.size_gesture = None
 
     def change_eraser_size(self, size: int) -> None:
         """
@@ -314,18 +456,89 @@ class Draw:
     # ______________________________________________________________________________________________________________
     def bring_to_front(self) -> None:
         """
-            Bring the selected shape to the front.
+            Bring the selected shapes to the front.
+
+            This method brings the selected shapes to the front of all other shapes on the canvas, keeping their
+            order among themselves.
+
+            Returns:
+                None
+            """
+        logger.debug("bring_to_front")
+        shapes = sorted(self.document.selection, key=lambda shape: shape.z)
+        if not shapes:
+            return
+        before = [shape.z for shape in shapes]
+        for shape in shapes:
+            shape.set_z(self.document.next_z())
+        self.__canvas.tag_raise(SELECTED_TAG)
+        self.document.history.record(ZOrderCommand(shapes, before, [shape.z for shape in shapes]))
+
+    @instrumented
+    def rotate_selection(self) -> None:
+        """
+            Rotate the selected shapes a quarter turn clockwise around the center of their box.
+
+            Returns:
+                None
+            """
+        self.document.selection.rotate(90)
+
+    @instrumented
+    def flip_selection(self) -> None:
+        """
+            Mirror the selected shapes left to right across the center of their box.
+
+            Returns:
+                None
+            """
+        self.document.selection.flip()
+
+    @instrumented
+    def simplify_strokes(self) -> None:
+        """
+            Simplify every brush and eraser stroke of the document.
+
+            This method re-runs the stroke simplification on all the strokes already on the canvas, which shrinks
+            both the canvas items and the saved file.
+
+            Returns:
+                None
+            """
+        Lines.simplify_document(self.document)
+
+    # ______________________________#Undo and redo#____________________________________________________________________
+    @instrumented
+    def undo(self, event: Any = None) -> None:
+        """
+            Undo the last change of the document.
 
-            This method brings the selected shape to the front of all other shapes on the canvas.
+            Args:
+                event (Any): The key event, None when the button is used.
 
             Returns:
                 None
             """
-        print("bring_to_front")
-        self.__canvas.tag_raise(Shape.last_selected.shape)
-        # Move the last selected shape to the end of the shape_list
-        Shape.shape_list.remove(Shape.last_selected)
-        Shape.shape_list.append(Shape.last_selected)
+        if self.current_polygon is not None:
+            return
+        self.document.selection.clear()
+        self.document.history.undo()
+
+    @instrumented
+    def redo(self, event: Any = None) -> None:
+        """
+            Redo the last undone change of the document.
+
+            Args:
+                event (Any): The key event, None when the button is used.
+
+            Returns:
+                None
+            """
+        if self.current_polygon is not None:
+            return
+        self.document.selection.clear()
+        self.document.history.redo()
 
     def add_text(self) -> None:
         """
@@ -376,105 +589,73 @@ class Draw:
             Returns:
                 None
             """
-        text = TextShape(self.__canvas, self.text_entry.get(), self.font_var.get(), int(self.font_size_var.get()),
+        text = TextShape(self.document, self.text_entry.get(), self.font_var.get(), int(self.font_size_var.get()),
                          "normal",
                          self.text_color_var.get())
-        text.add_text()
+        text.set_position(*self.__canvas.widget_to_world(30, 30))
+        text.create_item()
+        self.document.history.record(CreateCommand([text]))
 
     # _________________________________#Save and load functions#____________________________________________________
     def save_work(self) -> None:
         """
-            Save the current work to a JSON file.
+            Save the current work to a JSON or binary file.
 
-            This method saves the current work, including all shapes drawn on the canvas, to a JSON file.
+            This method saves the current work, including all shapes drawn on the canvas, to a JSON file, or to a
+            compact binary file when the chosen name ends with the binary extension.
             The user is prompted to select a location to save the file.
 
             Returns:
                 None
             """
-        global i
-        if len(Shape.shape_list) == 0:
+        if len(self.document.shapes) == 0:
             messagebox.showerror("Error", "You have not created any shapes")
             return
-        json_file = '['
-        if len(Shape.shape_list) == 1:
-            json_file += str(Shape.shape_list[0]) + ']'
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=DRAWING_FILETYPES)
+        if not file_path:
+            return
+        if is_binary_path(file_path):
+            count = write_binary((shape.to_dict() for shape in self.document.shapes), file_path)
         else:
-            for i in range(len(Shape.shape_list) - 1):
-                json_file += str(Shape.shape_list[i]) + ','
-            json_file += str(Shape.shape_list[i + 1])
-            json_file += ']'
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
-        if file_path:
             with open(file_path, "w") as file:
-                file.write(json_file)
+                count = dump_shapes(self.document.shapes, file)
+        logger.info("Saved %d shapes to %s", count, file_path)
 
     def load_work(self) -> None:
         """
-            Load previously saved work from a JSON file.
+            Load previously saved work from a JSON or binary file.
 
-            This method loads previously saved work from a JSON file.
-            The user is prompted to select the file to load.
+            This method loads previously saved work from a JSON file or a binary file.
+            The user is prompted to select the file to load. The file is parsed one shape at a time and the shapes
+            appear on the canvas while the rest of the file is still being read. Once the whole file is loaded, or
+            the load stopped on an error in the file, the loaded shapes can be removed again with undo.
 
             Returns:
                  None
             """
-        file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-        f = open(file_path)
-        data = json.load(f)
-        for item in data:
-            if item["name"] == "Triangle":
-                triangle = Triangle(self.__canvas, item["base"], item["height"], item["color"])
-                triangle.set_outline(item["outline_color"], item["outline_width"])
-                triangle.move(item["x"], item["y"])
-                self.__canvas.scale(triangle.shape, item["x"], item["y"], item["current_width"] / item["base"],
-                                    item["current_height"] / item["height"])
-
-            elif item["name"] == "Rectangle":
-                rect = Rectangle(self.__canvas, item["width"], item["height"], item["color"])
-                rect.set_outline(item["outline_color"], item["outline_width"])
-                rect.move(item["x"], item["y"])
-                self.__canvas.scale(rect.shape, item["x"], item["y"], item["current_width"] / item["width"],
-                                    item["current_height"] / item["height"])
-
-            elif item["name"] == "Elips":
-                elips = Elips(self.__canvas, item["radius_1"], item["radius_2"], item["color"])
-                elips.set_outline(item["outline_color"], item["outline_width"])
-                elips.move(item["x"], item["y"])
-                self.__canvas.scale(elips.shape, item["x"], item["y"], item["current_width"] / item["radius_1"],
-                                    item["current_height"] / item["radius_2"])
-            elif item["name"] == "PolygonShape":
-                polygon = PolygonShape(self.__canvas, item["color"])
-                polygon.points = item["points"]
-                polygon.set_outline(item["outline_color"], item["outline_width"])
-                polygon.update_polygon()
-                Shape.shape_list.append(polygon)
-            elif item["name"] == "Lines":
-                lines = Lines(self.__canvas, item["color"])
-                lines.drawn_points = item["lines"]
-                lines.width = item["width"]
-                lines.connect_points()
-            elif item["name"] == "Eraser":
-                lines = Eraser(self.__canvas)
-                lines.drawn_points = item["lines"]
-                lines.width = item["width"]
-                lines.connect_points()
-
-            elif item["name"] == "TextShape":
-                # Load TextShape
-                text_shape = TextShape(self.__canvas, item["text"], item["font_family"], item["font_size"],
-                                       item["font_style"])
-                text_shape.set_color(item["color"])
-                text_shape.set_outline(item["outline_color"], item["outline_width"])
-                text_shape.set_position(item["x"], item["y"])  # Set the position of the TextShape
-                text_shape.add_text()
+        file_path = filedialog.askopenfilename(filetypes=DRAWING_FILETYPES)
+        if not file_path:
+            return
+        items = iter_binary_file(file_path) if is_binary_path(file_path) else iter_json_file(file_path)
+        document = self.document
+
+        def on_done(loaded: List[Shape]) -> None:
+            if loaded:
+                document.history.record(CreateCommand(loaded))
+
+        def on_error(error: Exception) -> None:
+            messagebox.showerror("Error", f"Failed loading: {str(error)}")
 
+        load_shapes_incrementally(self.document, items, on_done=on_done, on_error=on_error)
+
+    @instrumented
     def save_image(self) -> None:
         """
-            Save a screenshot of the canvas as an image file.
+            Save the drawing as an image file.
 
-            This method captures a screenshot of the canvas and saves it as a PNG or JPEG image file.
-            The user is prompted to select the location and file format to save the screenshot.
+            This method renders the shapes straight into an image, at the scale chosen by the user, and saves it as
+            a PNG or JPEG image file. The exported area covers the canvas and every shape outside of it.
+            The user is prompted to select the location and file format to save the image.
 
             Returns:
                 None
@@ -483,12 +664,14 @@ class Draw:
             file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"),
                                                                                          ("JPEG files", "*.jpg")])
             if file_path:
-                x0 = self.__root.winfo_rootx() + self.__canvas.winfo_x()
-                y0 = self.__root.winfo_rooty() + self.__canvas.winfo_y()
-                x1 = x0 + self.__canvas.winfo_width()
-                y1 = y0 + self.__canvas.winfo_height()
-                ImageGrab.grab().crop((x0, y0, x1 + 600, y1 + 400)).save(file_path)
-                messagebox.showinfo("Success", "Screenshot saved successfully")
+                scale = simpledialog.askfloat("Export scale", "Pixels per canvas pixel:", initialvalue=1.0,
+                                              minvalue=0.01, parent=self.__root)
+                if scale is None:
+                    return
+                items = [shape.to_dict() for shape in self.document.shapes]
+                bounds = union_bounds(self.__canvas.view_bounds(), document_bounds(items))
+                render_document(items, bounds, scale).save(file_path)
+                messagebox.showinfo("Success", "Image saved successfully")
         except Exception as e:
             messagebox.showerror("Error", f"Failed saving: {str(e)}")
 
@@ -525,6 +708,8 @@ class Draw:
         self.brush_size_scale = tki.Scale(self.scale_frame, from_=1, to=10, orient=tki.HORIZONTAL,
                                           command=self.change_brush_size)
         self.brush_size_scale.pack(side=tki.TOP, pady=(0, 5))
+        self.brush_size_scale.bind("<ButtonPress-1>", self.start_size_drag, add="+")
+        self.brush_size_scale.bind("<ButtonRelease-1>", self.stop_size_drag, add="+")
 
         # choose color
         self.choose_color_button = Button(self.bar_frame, text="color", width=10, bg="lavender", command=self.color)
@@ -592,6 +777,25 @@ class Draw:
                             command=self.clear_canvas)
         self.clear.pack(side=tki.TOP, padx=5)
 
+    # ______________________________#Rotate and flip buttons#__________________________________________________
+    def create_transform_buttons(self) -> None:
+        """
+            Create buttons for rotating and flipping the selected shapes.
+
+            Returns:
+                None
+        """
+        self.transform_button_frame = tki.Frame(self.bar_frame, bg="lavender")
+        self.transform_button_frame.pack(side=tki.LEFT)
+
+        self.rotate_button = Button(self.transform_button_frame, text="rotate", width=10, bg="lavender",
+                                    command=self.rotate_selection)
+        self.rotate_button.pack(side=tki.TOP, padx=5)
+
+        self.flip_button = Button(self.transform_button_frame, text="flip", width=10, bg="lavender",
+                                  command=self.flip_selection)
+        self.flip_button.pack(side=tki.TOP, padx=5)
+
     # ______________________________#Save and load buttons#____________________________________________________
     def create_save_buttons(self) -> None:
         """
@@ -627,8 +831,44 @@ parser = argparse.ArgumentParser(description='Here are the instructions for usin
                                              'on the red bounding box at the bottom right corner of the shape. Dragging'
                                              'this circle allows you to enlarge or shrink the shape according to your '
                                              'desired size.')
-parser.add_argument('--masters', nargs='?', default=None, type=int, help='Enter one or more ids.')
+parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                    help='The level of the log messages written to stderr.')
+parser.add_argument('--profile', action='store_true',
+                    help='Record a latency histogram for every event handler and print it on exit.')
+parser.add_argument('--trace', metavar='FILE', default=None,
+                    help='Write a Chrome trace-event JSON file of the handler calls (save, load, drag...) on exit.')
+parser.add_argument('--journal', metavar='DIR', default=DEFAULT_JOURNAL_DIR,
+                    help='The directory of the autosave journal, which restores the drawing after a crash.')
+parser.add_argument('--no-journal', action='store_true', help='Turn autosave off.')
+parser.add_argument('--history-mb', type=float, default=DEFAULT_HISTORY_BYTES / 2 ** 20,
+                    help='The memory budget of the undo history in megabytes, the oldest steps are dropped past it.')
+subparsers = parser.add_subparsers(dest='command', title='commands',
+                                   description='Without a command the drawing window is opened.')
+batch_parser = subparsers.add_parser('batch', help='Render saved drawings to PNG files without opening a window.',
+                                     description='Render saved drawings to a full-size PNG (<name>.png) and a '
+                                                 'thumbnail (<name>.thumb.png), in parallel across cores.')
+batch_parser.add_argument('patterns', nargs='+', metavar='GLOB',
+                          help='Drawings to render, e.g. "drawings/**/*.json". Quote the pattern to let it match '
+                               'subdirectories.')
+batch_parser.add_argument('--out', metavar='DIR', default=None,
+                          help='The directory of the outputs, defaults to the directory of each drawing.')
+batch_parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to every core.')
+batch_parser.add_argument('--scale', type=float, default=1.0, help='Output pixels per canvas pixel of the full render.')
+batch_parser.add_argument('--thumbnail-size', type=int, default=DEFAULT_THUMBNAIL_SIZE,
+                          help='The largest side of a thumbnail in pixels.')
+batch_parser.add_argument('--supersample', type=int, default=DEFAULT_SUPERSAMPLE,
+                          help='The supersampling factor, 1 disables anti-aliasing.')
+batch_parser.add_argument('--force', action='store_true', help='Render drawings whose outputs are up to date too.')
 
 if __name__ == "__main__":
-    parser.parse_args()
-    draw = Draw()
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if args.command == 'batch':
+        results = run_batch(args.patterns, BatchOptions(args.out, args.scale, args.thumbnail_size, args.supersample,
+                                                        args.force), workers=args.workers)
+        raise SystemExit(1 if any(result.status == 'failed' for result in results) else 0)
+    if args.profile or args.trace:
+        instrument.install([Draw, Shape, Selection, SelectionOverlay, ShapeEvents, ViewCanvas], histograms=args.profile,
+                           trace_path=args.trace)
+    draw = Draw(journal_dir=None if args.no_journal else args.journal,
+                history_bytes=int(args.history_mb * 2 ** 20))
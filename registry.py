@@ -0,0 +1,554 @@
+"""
+The shapes of a document, looked up by id and by canvas item, and kept in stacking order.
+
+Registry maps shape ids and Tk item ids to shapes with dictionaries. ZOrder keeps the shapes sorted by their z
+value in a list of short sorted chunks, so adding, removing and moving a shape in the stacking order costs a binary
+search over the chunks and a small list insert, instead of a scan of the whole document. Moving a shape between two
+others gives it a z value halfway between theirs, and the keys are spread out again if two neighbours ever get too
+close for floats to tell apart. The z values kept outside the registry, e.g. by the undo history, are renumbered with
+remap_z() by the spread listeners.
+"""
+import argparse
+import random
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Key = Tuple[float, int]
+
+CHUNK_SIZE: int = 512
+
+
+class ZOrder:
+    """
+        Items sorted by a (z, id) key, stored in chunks of at most 2 * CHUNK_SIZE items.
+
+        Attributes:
+            keys (List[List[Key]]): The sorted keys of every chunk.
+            items (List[List[Any]]): The items of every chunk, in the order of their keys.
+            maxes (List[Key]): The largest key of every chunk.
+            size (int): The number of items.
+    """
+
+    def __init__(self) -> None:
+        """
+            Initialize an empty ZOrder.
+
+            Returns:
+                None
+        """
+        self.keys: List[List[Key]] = []
+        self.items: List[List[Any]] = []
+        self.maxes: List[Key] = []
+        self.size: int = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self.items:
+            yield from chunk
+
+    def __reversed__(self) -> Iterator[Any]:
+        for chunk in reversed(self.items):
+            yield from reversed(chunk)
+
+    def add(self, key: Key, item: Any) -> None:
+        """
+            Add an item.
+
+            Args:
+                key (Key): The key of the item, not already in the order.
+                item (Any): The item.
+
+            Returns:
+                None
+        """
+        self.size += 1
+        if not self.maxes:
+            self.keys.append([key])
+            self.items.append([item])
+            self.maxes.append(key)
+            return
+        i = min(bisect_left(self.maxes, key), len(self.maxes) - 1)
+        keys = self.keys[i]
+        j = bisect_left(keys, key)
+        keys.insert(j, key)
+        self.items[i].insert(j, item)
+        self.maxes[i] = keys[-1]
+        if len(keys) > 2 * CHUNK_SIZE:
+            self.keys.insert(i + 1, keys[CHUNK_SIZE:])
+            self.items.insert(i + 1, self.items[i][CHUNK_SIZE:])
+            del keys[CHUNK_SIZE:]
+            del self.items[i][CHUNK_SIZE:]
+            self.maxes.insert(i, keys[-1])
+
+    def locate(self, key: Key) -> Tuple[int, int]:
+        """
+            Find the position of a key.
+
+            Args:
+                key (Key): The key.
+
+            Returns:
+                Tuple[int, int]: The chunk and the position in the chunk.
+
+            Raises:
+                KeyError: If the key is not in the order.
+        """
+        i = bisect_left(self.maxes, key)
+        if i < len(self.maxes):
+            j = bisect_left(self.keys[i], key)
+            if j < len(self.keys[i]) and self.keys[i][j] == key:
+                return i, j
+        raise KeyError(key)
+
+    def remove(self, key: Key) -> Any:
+        """
+            Remove an item.
+
+            Args:
+                key (Key): The key of the item.
+
+            Returns:
+                Any: The removed item.
+
+            Raises:
+                KeyError: If the key is not in the order.
+        """
+        i, j = self.locate(key)
+        keys = self.keys[i]
+        del keys[j]
+        item = self.items[i].pop(j)
+        self.size -= 1
+        if keys:
+            self.maxes[i] = keys[-1]
+        else:
+            del self.keys[i]
+            del self.items[i]
+            del self.maxes[i]
+        return item
+
+    def after(self, key: Key) -> Optional[Tuple[Key, Any]]:
+        """
+            Get the first item whose key is larger than a key.
+
+            Args:
+                key (Key): The key, in the order or not.
+
+            Returns:
+                Optional[Tuple[Key, Any]]: The key and the item, None if no key is larger.
+        """
+        i = bisect_right(self.maxes, key)
+        if i == len(self.maxes):
+            return None
+        j = bisect_right(self.keys[i], key)
+        return self.keys[i][j], self.items[i][j]
+
+    def before(self, key: Key) -> Optional[Tuple[Key, Any]]:
+        """
+            Get the last item whose key is smaller than a key.
+
+            Args:
+                key (Key): The key, in the order or not.
+
+            Returns:
+                Optional[Tuple[Key, Any]]: The key and the item, None if no key is smaller.
+        """
+        i = bisect_left(self.maxes, key)
+        if i < len(self.maxes):
+            j = bisect_left(self.keys[i], key)
+            if j > 0:
+                return self.keys[i][j - 1], self.items[i][j - 1]
+        if i == 0:
+            return None
+        return self.keys[i - 1][-1], self.items[i - 1][-1]
+
+    def first(self) -> Optional[Tuple[Key, Any]]:
+        """
+            Get the item with the smallest key.
+
+            Returns:
+                Optional[Tuple[Key, Any]]: The key and the item, None when the order is empty.
+        """
+        return (self.keys[0][0], self.items[0][0]) if self.keys else None
+
+    def last(self) -> Optional[Tuple[Key, Any]]:
+        """
+            Get the item with the largest key.
+
+            Returns:
+                Optional[Tuple[Key, Any]]: The key and the item, None when the order is empty.
+        """
+        return (self.keys[-1][-1], self.items[-1][-1]) if self.keys else None
+
+    def clear(self) -> None:
+        """
+            Remove every item.
+
+            Returns:
+                None
+        """
+        self.keys.clear()
+        self.items.clear()
+        self.maxes.clear()
+        self.size = 0
+
+
+def remap_z(old: Sequence[float], new: Sequence[float], z: float) -> float:
+    """
+        Map a z value from before a spread to the matching value after it.
+
+        A value between two registered shapes stays between them, one below the bottom shape keeps its value and one
+        above the top shape keeps its distance to it, so a shape put back into the stack lands where it was.
+
+        Args:
+            old (Sequence[float]): The z values of the registered shapes before the spread, in stacking order.
+            new (Sequence[float]): Their z values after the spread.
+            z (float): The value to map.
+
+        Returns:
+            float: The mapped value.
+    """
+    if not old or z <= old[0]:
+        return z
+    if z >= old[-1]:
+        return z - old[-1] + new[-1]
+    upper = bisect_right(old, z)
+    lower = upper - 1
+    if old[upper] == old[lower]:
+        return new[lower]
+    return new[lower] + (z - old[lower]) * (new[upper] - new[lower]) / (old[upper] - old[lower])
+
+
+class Registry:
+    """
+        The shapes of a document by id, by Tk item and in stacking order.
+
+        A shape needs an id attribute that never changes and a z attribute giving its stacking position, which must
+        only be changed through set_z() while the shape is registered.
+
+        Attributes:
+            by_id (Dict[int, Any]): The shapes by id.
+            by_item (Dict[int, Any]): The shapes by the id of their Tk item, while they have one.
+            order (ZOrder): The shapes from the bottom to the top of the stack.
+            spread_listeners (List[Callable[[List[Any], List[float]], None]]): Called after spread() with the shapes
+                in stacking order and their z values before, e.g. to renumber the z values kept for undo.
+    """
+
+    def __init__(self) -> None:
+        """
+            Initialize an empty Registry.
+
+            Returns:
+                None
+        """
+        self.by_id: Dict[int, Any] = {}
+        self.by_item: Dict[int, Any] = {}
+        self.order: ZOrder = ZOrder()
+        self.spread_listeners: List[Callable[[List[Any], List[float]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.order)
+
+    def __reversed__(self) -> Iterator[Any]:
+        return reversed(self.order)
+
+    def __contains__(self, shape: Any) -> bool:
+        return self.by_id.get(shape.id) is shape
+
+    def add(self, shape: Any) -> None:
+        """
+            Register a shape at the stacking position given by its z.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        if shape in self:
+            return
+        self.by_id[shape.id] = shape
+        self.order.add((shape.z, shape.id), shape)
+
+    def remove(self, shape: Any) -> None:
+        """
+            Unregister a shape, if it is registered.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        if shape not in self:
+            return
+        del self.by_id[shape.id]
+        self.order.remove((shape.z, shape.id))
+
+    def get(self, shape_id: int) -> Optional[Any]:
+        """
+            Get a shape by id.
+
+            Args:
+                shape_id (int): The id.
+
+            Returns:
+                Optional[Any]: The shape, None if no registered shape has the id.
+        """
+        return self.by_id.get(shape_id)
+
+    def link_item(self, item: int, shape: Any) -> None:
+        """
+            Remember the shape a Tk item belongs to.
+
+            Args:
+                item (int): The Tk item id.
+                shape (Any): The shape.
+
+            Returns:
+                None
+        """
+        self.by_item[item] = shape
+
+    def unlink_item(self, item: int) -> None:
+        """
+            Forget a Tk item that was deleted.
+
+            Args:
+                item (int): The Tk item id.
+
+            Returns:
+                None
+        """
+        self.by_item.pop(item, None)
+
+    def from_item(self, item: int) -> Optional[Any]:
+        """
+            Get the shape a Tk item belongs to.
+
+            Args:
+                item (int): The Tk item id.
+
+            Returns:
+                Optional[Any]: The shape, None for items that belong to no shape.
+        """
+        return self.by_item.get(item)
+
+    def set_z(self, shape: Any, z: float) -> None:
+        """
+            Change the stacking position of a shape.
+
+            Args:
+                shape (Any): The shape, registered or not.
+                z (float): The new stacking position.
+
+            Returns:
+                None
+        """
+        if shape not in self:
+            shape.z = z
+            return
+        self.order.remove((shape.z, shape.id))
+        shape.z = z
+        self.order.add((z, shape.id), shape)
+
+    def above(self, shape: Any) -> Optional[Any]:
+        """
+            Get the shape right above another in the stack.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                Optional[Any]: The shape above, None for the top shape.
+        """
+        found = self.order.after((shape.z, shape.id))
+        return found[1] if found is not None else None
+
+    def below(self, shape: Any) -> Optional[Any]:
+        """
+            Get the shape right below another in the stack.
+
+            Args:
+                shape (Any): The shape.
+
+            Returns:
+                Optional[Any]: The shape below, None for the bottom shape.
+        """
+        found = self.order.before((shape.z, shape.id))
+        return found[1] if found is not None else None
+
+    def top(self) -> Optional[Any]:
+        """
+            Get the top shape of the stack.
+
+            Returns:
+                Optional[Any]: The shape, None when no shape is registered.
+        """
+        found = self.order.last()
+        return found[1] if found is not None else None
+
+    def bottom(self) -> Optional[Any]:
+        """
+            Get the bottom shape of the stack.
+
+            Returns:
+                Optional[Any]: The shape, None when no shape is registered.
+        """
+        found = self.order.first()
+        return found[1] if found is not None else None
+
+    def place_above(self, shape: Any, anchor: Any) -> None:
+        """
+            Move a shape right above another in the stack, with a z halfway to the next shape.
+
+            Args:
+                shape (Any): The shape to move.
+                anchor (Any): The shape it goes above.
+
+            Returns:
+                None
+        """
+        upper = self.above(anchor)
+        if upper is shape:
+            upper = self.above(shape)
+        if upper is None:
+            self.set_z(shape, anchor.z + 1)
+            return
+        z = (anchor.z + upper.z) / 2
+        if not anchor.z < z < upper.z:
+            self.spread()
+            z = (anchor.z + upper.z) / 2
+        self.set_z(shape, z)
+
+    def place_below(self, shape: Any, anchor: Any) -> None:
+        """
+            Move a shape right below another in the stack, with a z halfway to the previous shape.
+
+            Args:
+                shape (Any): The shape to move.
+                anchor (Any): The shape it goes below.
+
+            Returns:
+                None
+        """
+        lower = self.below(anchor)
+        if lower is shape:
+            lower = self.below(shape)
+        if lower is None:
+            self.set_z(shape, anchor.z - 1)
+            return
+        z = (lower.z + anchor.z) / 2
+        if not lower.z < z < anchor.z:
+            self.spread()
+            z = (lower.z + anchor.z) / 2
+        self.set_z(shape, z)
+
+    def spread(self) -> None:
+        """
+            Give the registered shapes evenly spaced z values between the lowest and the highest one.
+
+            The order does not change and neither does the bottom value. The top value only grows when the shapes
+            are packed too tightly to be spread below it. The listeners are told about the new values.
+
+            Returns:
+                None
+        """
+        shapes = list(self.order)
+        if len(shapes) < 2:
+            return
+        old = [shape.z for shape in shapes]
+        low, high = old[0], old[-1]
+        if high - low < len(shapes):
+            high = low + len(shapes)
+        step = (high - low) / (len(shapes) - 1)
+        self.order.clear()
+        for position, shape in enumerate(shapes):
+            shape.z = low + step * position
+            self.order.add((shape.z, shape.id), shape)
+        for listener in self.spread_listeners:
+            listener(shapes, old)
+
+    def clear(self) -> None:
+        """
+            Unregister every shape.
+
+            Returns:
+                None
+        """
+        self.by_id.clear()
+        self.by_item.clear()
+        self.order.clear()
+
+
+class _Entry:
+    def __init__(self, shape_id: int, z: float) -> None:
+        self.id = shape_id
+        self.z = z
+
+
+def _benchmark(counts: List[int], operations: int, seed: int) -> None:
+    """
+        Time delete, raise and reorder operations against the same operations on a plain sorted list.
+
+        Args:
+            counts (List[int]): The document sizes to measure.
+            operations (int): The number of operations of each kind per size.
+            seed (int): The random seed.
+
+        Returns:
+            None
+    """
+    rng = random.Random(seed)
+    print("%10s %14s %14s %14s %14s" % ("shapes", "remove us", "list remove us", "raise us", "list raise us"))
+    for count in counts:
+        entries = [_Entry(i, float(i)) for i in range(count)]
+        registry = Registry()
+        for entry in entries:
+            registry.add(entry)
+        plain = list(entries)
+        picks = rng.sample(entries, operations)
+        start = time.perf_counter()
+        for entry in picks:
+            registry.remove(entry)
+        remove_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for entry in picks:
+            plain.remove(entry)
+        list_remove_time = time.perf_counter() - start
+        for entry in picks:
+            registry.add(entry)
+            plain.append(entry)
+        top = float(count)
+        start = time.perf_counter()
+        for entry in picks:
+            top += 1
+            registry.set_z(entry, top)
+        raise_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for entry in picks:
+            plain.remove(entry)
+            plain.append(entry)
+        list_raise_time = time.perf_counter() - start
+        scale = 1e6 / operations
+        print("%10d %14.2f %14.2f %14.2f %14.2f" % (count, remove_time * scale, list_remove_time * scale,
+                                                    raise_time * scale, list_raise_time * scale))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the shape registry against a plain list.")
+    parser.add_argument("--max", type=int, default=1_000_000, help="The largest document size.")
+    parser.add_argument("--operations", type=int, default=1000, help="Operations of each kind per size.")
+    parser.add_argument("--seed", type=int, default=0, help="The random seed.")
+    args = parser.parse_args()
+    sizes = []
+    size = 1000
+    while size <= args.max:
+        sizes.append(size)
+        size *= 10
+    _benchmark(sizes, args.operations, args.seed)
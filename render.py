@@ -0,0 +1,328 @@
+import math
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from geometry import IDENTITY_MATRIX, Matrix, saved_matrix, transform_point
+
+Bounds = Tuple[float, float, float, float]
+
+# Tk font sizes are in points, the canvas draws them at 96 pixels per inch
+POINTS_TO_PIXELS: float = 96 / 72
+# Font files tried for each family offered by the text dialog, before falling back to Pillow's default font
+FONT_FILES = {
+    "Arial": ("arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"),
+    "Times New Roman": ("times.ttf", "Times New Roman.ttf", "LiberationSerif-Regular.ttf", "DejaVuSerif.ttf"),
+    "Verdana": ("verdana.ttf", "Verdana.ttf", "DejaVuSans.ttf"),
+}
+DEFAULT_SUPERSAMPLE: int = 2
+# The number of points a rotated ellipse is drawn with, as on the canvas
+ELLIPSE_POINTS: int = 64
+
+
+@lru_cache(maxsize=256)
+def resolve_color(color: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """
+        Convert a Tk color name to an RGB tuple.
+
+        Args:
+            color (Optional[str]): The color, a name or a #rrggbb string. Empty means transparent, like on the canvas.
+
+        Returns:
+            Optional[Tuple[int, int, int]]: The RGB color, None for transparent.
+    """
+    if not color:
+        return None
+    try:
+        return ImageColor.getrgb(color.replace(" ", ""))[:3]
+    except ValueError:
+        return 0, 0, 0
+
+
+@lru_cache(maxsize=64)
+def load_font(family: str, size: int) -> Any:
+    """
+        Load a font for drawing text.
+
+        Args:
+            family (str): The font family.
+            size (int): The font size in pixels.
+
+        Returns:
+            Any: The Pillow font.
+    """
+    for file_name in FONT_FILES.get(family, (family + ".ttf",)) + ("DejaVuSans.ttf",):
+        try:
+            return ImageFont.truetype(file_name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def _outline_width(item: dict) -> float:
+    """
+        Get the outline width of a saved shape.
+
+        Args:
+            item (dict): The saved shape.
+
+        Returns:
+            float: The outline width, 0 when it is missing.
+    """
+    try:
+        return float(item.get("outline_width", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _matrix(item: dict) -> Matrix:
+    """
+        Get the matrix of a saved shape.
+
+        Args:
+            item (dict): The saved shape.
+
+        Returns:
+            Matrix: The transform of the shape. Polygons saved before shapes had a matrix kept drawing coordinates,
+            the other shapes their position and the size they were scaled to.
+    """
+    if "matrix" in item:
+        return saved_matrix(item)
+    name = item.get("name")
+    if name == "PolygonShape":
+        return IDENTITY_MATRIX
+    if name in ("Lines", "Eraser"):
+        return 1.0, 0.0, 0.0, 1.0, item.get("x", 0), item.get("y", 0)
+    return saved_matrix(item, (1.0, 1.0))
+
+
+def _base_points(item: dict) -> List[Tuple[float, float]]:
+    """
+        Get the outline of a saved shape before its matrix.
+
+        The sizes of shapes saved without a matrix are the sizes they were scaled to, which _matrix pairs with a
+        matrix that only scales by the ratio to a unit size.
+
+        Args:
+            item (dict): The saved Lines, Eraser, PolygonShape, Triangle, Rectangle or Elips.
+
+        Returns:
+            List[Tuple[float, float]]: The points, the corners of rectangles and points on ellipses.
+    """
+    name = item.get("name")
+    if name in ("Lines", "Eraser"):
+        return [(x, y) for x, y in item.get("lines", ())]
+    if name == "PolygonShape":
+        return [(x, y) for x, y in item.get("points", ())]
+    legacy = "matrix" not in item
+    if name == "Triangle":
+        half_w, half_h = (1.0, 1.0) if legacy else (item["base"], item["height"])
+        half_w, half_h = half_w / 2, half_h / 2
+        return [(-half_w, half_h), (half_w, half_h), (0.0, -half_h)]
+    if name == "Rectangle":
+        half_w, half_h = (0.5, 0.5) if legacy else (item["width"] / 2, item["height"] / 2)
+        return [(-half_w, -half_h), (half_w, -half_h), (half_w, half_h), (-half_w, half_h)]
+    if name == "Elips":
+        half_w, half_h = (0.5, 0.5) if legacy else (item["radius_1"] / 2, item["radius_2"] / 2)
+        angles = [2 * math.pi * i / ELLIPSE_POINTS for i in range(ELLIPSE_POINTS)]
+        return [(math.cos(angle) * half_w, math.sin(angle) * half_h) for angle in angles]
+    return []
+
+
+def _shape_points(item: dict) -> List[Tuple[float, float]]:
+    """
+        Get the outline of a saved shape in drawing coordinates.
+
+        Args:
+            item (dict): The saved shape.
+
+        Returns:
+            List[Tuple[float, float]]: The points of _base_points with the shape's matrix applied.
+    """
+    matrix = _matrix(item)
+    return [transform_point(matrix, x, y) for x, y in _base_points(item)]
+
+
+def _is_axis_aligned(item: dict) -> bool:
+    """
+        Check whether a saved shape is neither rotated nor skewed, so that Pillow can draw it as a box.
+
+        Args:
+            item (dict): The saved shape.
+
+        Returns:
+            bool: True if the matrix maps the axes onto themselves.
+    """
+    matrix = _matrix(item)
+    return matrix[1] == 0 and matrix[2] == 0
+
+
+def shape_bounds(item: dict) -> Optional[Bounds]:
+    """
+        Compute the bounding box of a saved shape, including its outline or stroke width.
+
+        Args:
+            item (dict): The saved shape, as returned by Shape.to_dict.
+
+        Returns:
+            Optional[Bounds]: The box (x1, y1, x2, y2), None if the shape has no geometry.
+    """
+    name = item.get("name")
+    if name in ("Lines", "Eraser"):
+        points = _shape_points(item)
+        pad = float(item.get("width", 1) or 1) / 2
+    elif name in ("PolygonShape", "Triangle", "Rectangle", "Elips"):
+        points = _shape_points(item)
+        pad = _outline_width(item) / 2
+    elif name == "TextShape":
+        size = item.get("font_size", 12) * POINTS_TO_PIXELS
+        half_w = max(len(line) for line in str(item.get("text", "")).split("\n")) * size * 0.3 + size
+        half_h = (str(item.get("text", "")).count("\n") + 1) * size * 0.7
+        points = [(item["x"] - half_w, item["y"] - half_h), (item["x"] + half_w, item["y"] + half_h)]
+        pad = 0
+    elif "current_width" in item:
+        half_w = item["current_width"] / 2
+        half_h = item["current_height"] / 2
+        points = [(item["x"] - half_w, item["y"] - half_h), (item["x"] + half_w, item["y"] + half_h)]
+        pad = _outline_width(item) / 2
+    else:
+        return None
+    if not points:
+        return None
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+
+def document_bounds(items: Iterable[dict]) -> Optional[Bounds]:
+    """
+        Compute the bounding box of all the shapes of a document.
+
+        Args:
+            items (Iterable[dict]): The saved shapes.
+
+        Returns:
+            Optional[Bounds]: The box surrounding every shape, None for an empty document.
+    """
+    result: Optional[List[float]] = None
+    for item in items:
+        bounds = shape_bounds(item)
+        if bounds is None:
+            continue
+        if result is None:
+            result = list(bounds)
+        else:
+            result[0] = min(result[0], bounds[0])
+            result[1] = min(result[1], bounds[1])
+            result[2] = max(result[2], bounds[2])
+            result[3] = max(result[3], bounds[3])
+    return tuple(result) if result is not None else None
+
+
+def union_bounds(first: Optional[Bounds], second: Optional[Bounds]) -> Optional[Bounds]:
+    """
+        Compute the box surrounding two boxes.
+
+        Args:
+            first (Optional[Bounds]): A box, or None.
+            second (Optional[Bounds]): Another box, or None.
+
+        Returns:
+            Optional[Bounds]: The surrounding box, None when both are None.
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return min(first[0], second[0]), min(first[1], second[1]), max(first[2], second[2]), max(first[3], second[3])
+
+
+def draw_shape(draw: ImageDraw.ImageDraw, item: dict, origin_x: float, origin_y: float, scale: float) -> None:
+    """
+        Draw one saved shape.
+
+        Args:
+            draw (ImageDraw.ImageDraw): The drawing context of the target image.
+            item (dict): The saved shape.
+            origin_x (float): The document x-coordinate drawn at the left edge of the image.
+            origin_y (float): The document y-coordinate drawn at the top edge of the image.
+            scale (float): The number of pixels per document unit.
+
+        Returns:
+            None
+    """
+
+    # Pillow truncates coordinates towards zero, snapping to the nearest pixel here keeps shapes that cross the left or
+    # top edge aligned, so that tiles rendered separately match a single render
+    def to_pixels(points: Sequence[Tuple[float, float]]) -> List[Tuple[int, int]]:
+        return [(math.floor((x - origin_x) * scale + 0.5), math.floor((y - origin_y) * scale + 0.5)) for x, y in points]
+
+    name = item.get("name")
+    fill = resolve_color(item.get("color"))
+    outline = resolve_color(item.get("outline_color"))
+    outline_width = max(int(round(_outline_width(item) * scale)), 1 if _outline_width(item) > 0 else 0)
+    if outline_width == 0:
+        outline = None
+    if name in ("Lines", "Eraser"):
+        points = to_pixels(_shape_points(item))
+        if len(points) < 2:
+            return
+        width = max(int(round(float(item.get("width", 1) or 1) * scale)), 1)
+        draw.line(points, fill=(255, 255, 255) if name == "Eraser" else fill, width=width, joint="curve")
+    elif name in ("Rectangle", "Elips") and _is_axis_aligned(item):
+        points = to_pixels(_shape_points(item))
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        box = (min(xs), min(ys), max(xs), max(ys))
+        if name == "Rectangle":
+            draw.rectangle(box, fill=fill, outline=outline, width=outline_width)
+        else:
+            draw.ellipse(box, fill=fill, outline=outline, width=outline_width)
+    elif name in ("Rectangle", "Elips", "Triangle", "PolygonShape"):
+        points = to_pixels(_shape_points(item))
+        if len(points) >= 2:
+            draw.polygon(points, fill=fill, outline=outline, width=outline_width)
+    elif name == "TextShape":
+        (x, y), = to_pixels([(item["x"], item["y"])])
+        size = max(int(round(item.get("font_size", 12) * POINTS_TO_PIXELS * scale)), 1)
+        draw.multiline_text((x, y), str(item.get("text", "")), fill=fill,
+                            font=load_font(item.get("font_family", "Arial"), size), anchor="mm", align="center")
+
+
+def render_document(items: Iterable[dict], bounds: Optional[Bounds] = None, scale: float = 1.0,
+                    supersample: int = DEFAULT_SUPERSAMPLE, background: str = "white",
+                    size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """
+        Rasterize saved shapes into a Pillow image without a display.
+
+        The shapes are drawn at `supersample` times the requested resolution and the image is then reduced with a
+        box filter, which anti-aliases edges. The cost depends on the document and the output size only.
+
+        Args:
+            items (Iterable[dict]): The saved shapes in drawing order, as returned by Shape.to_dict.
+            bounds (Optional[Bounds]): The document area to export, defaults to the bounds of all the shapes.
+            scale (float): The number of output pixels per document unit.
+            supersample (int): The supersampling factor, 1 disables anti-aliasing.
+            background (str): The background color.
+            size (Optional[Tuple[int, int]]): The exact output size in pixels, defaults to the bounds times the scale.
+
+        Returns:
+            Image.Image: The rendered RGB image.
+    """
+    items = list(items)
+    if bounds is None:
+        bounds = document_bounds(items) or (0, 0, 1, 1)
+    supersample = max(int(supersample), 1)
+    if size is None:
+        width = max(int(math.ceil((bounds[2] - bounds[0]) * scale)), 1)
+        height = max(int(math.ceil((bounds[3] - bounds[1]) * scale)), 1)
+    else:
+        width, height = size
+    image = Image.new("RGB", (width * supersample, height * supersample), resolve_color(background))
+    draw = ImageDraw.Draw(image)
+    for item in items:
+        draw_shape(draw, item, bounds[0], bounds[1], scale * supersample)
+    if supersample > 1:
+        image = image.reduce(supersample)
+    return image
@@ -0,0 +1,396 @@
+"""
+Uniform grid index over the bounding boxes of shapes.
+
+Every entry is stored in the square cells its bounding box overlaps, so point, rectangle and nearest-shape queries
+only look at the entries near the query instead of every shape. With shapes of similar size the work per query
+stays the same however many shapes the document holds. Entries covering more than MAX_CELLS_PER_ENTRY cells are
+kept in a separate list that every query checks, so one huge shape cannot fill the grid.
+
+Run "python spatial.py" for a benchmark of the query times from 1k to 1M shapes.
+"""
+import argparse
+import math
+import random
+import time
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+Bounds = Tuple[float, float, float, float]
+Cell = Tuple[int, int]
+
+DEFAULT_CELL_SIZE: float = 64.0
+MAX_CELLS_PER_ENTRY: int = 64
+
+
+def distance_to_bounds(x: float, y: float, bounds: Bounds) -> float:
+    """
+        Compute the distance from a point to a bounding box.
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+            bounds (Bounds): The box (x1, y1, x2, y2).
+
+        Returns:
+            float: The distance, 0 when the point is inside the box.
+    """
+    dx = max(bounds[0] - x, 0.0, x - bounds[2])
+    dy = max(bounds[1] - y, 0.0, y - bounds[3])
+    return math.hypot(dx, dy)
+
+
+class SpatialIndex:
+    """
+        A uniform grid of the bounding boxes of shapes, for point, rectangle and nearest-shape queries.
+
+        Attributes:
+            cell_size (float): The side of a grid cell, about the size of a typical shape works best.
+            cells (Dict[Cell, Set[Hashable]]): The keys of the entries overlapping every non-empty cell.
+            entries (Dict[Hashable, Bounds]): The bounding box of every entry.
+            ranges (Dict[Hashable, Tuple[int, int, int, int]]): The cells every entry is stored in.
+            large (Set[Hashable]): The entries too large to store in the grid.
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        """
+            Initialize an empty SpatialIndex.
+
+            Args:
+                cell_size (float): The side of a grid cell.
+
+            Returns:
+                None
+        """
+        self.cell_size: float = float(cell_size)
+        self.cells: Dict[Cell, Set[Hashable]] = {}
+        self.entries: Dict[Hashable, Bounds] = {}
+        self.ranges: Dict[Hashable, Tuple[int, int, int, int]] = {}
+        self.large: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def cell_range(self, bounds: Bounds) -> Tuple[int, int, int, int]:
+        """
+            Get the cells a bounding box overlaps.
+
+            Args:
+                bounds (Bounds): The box (x1, y1, x2, y2).
+
+            Returns:
+                Tuple[int, int, int, int]: The first and last column and row.
+        """
+        size = self.cell_size
+        return (int(math.floor(bounds[0] / size)), int(math.floor(bounds[2] / size)),
+                int(math.floor(bounds[1] / size)), int(math.floor(bounds[3] / size)))
+
+    def insert(self, key: Hashable, bounds: Bounds) -> None:
+        """
+            Add an entry, or replace the bounding box of an existing one.
+
+            Args:
+                key (Hashable): The entry, usually a shape.
+                bounds (Bounds): Its bounding box (x1, y1, x2, y2).
+
+            Returns:
+                None
+        """
+        bounds = (min(bounds[0], bounds[2]), min(bounds[1], bounds[3]), max(bounds[0], bounds[2]),
+                  max(bounds[1], bounds[3]))
+        cell_range = self.cell_range(bounds)
+        old_range = self.ranges.get(key)
+        self.entries[key] = bounds
+        if old_range == cell_range:
+            return
+        if old_range is not None:
+            self._unlink(key, old_range)
+        self.ranges[key] = cell_range
+        first_column, last_column, first_row, last_row = cell_range
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > MAX_CELLS_PER_ENTRY:
+            self.large.add(key)
+            return
+        cells = self.cells
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = cells.get((column, row))
+                if cell is None:
+                    cells[(column, row)] = {key}
+                else:
+                    cell.add(key)
+
+    update = insert
+
+    def move(self, key: Hashable, dx: float, dy: float) -> None:
+        """
+            Translate the bounding box of an entry.
+
+            Args:
+                key (Hashable): The entry.
+                dx (float): The distance along the x-axis.
+                dy (float): The distance along the y-axis.
+
+            Returns:
+                None
+        """
+        bounds = self.entries.get(key)
+        if bounds is not None:
+            self.insert(key, (bounds[0] + dx, bounds[1] + dy, bounds[2] + dx, bounds[3] + dy))
+
+    def _unlink(self, key: Hashable, cell_range: Tuple[int, int, int, int]) -> None:
+        """
+            Remove an entry from the cells of a range.
+
+            Args:
+                key (Hashable): The entry.
+                cell_range (Tuple[int, int, int, int]): The range the entry was stored in.
+
+            Returns:
+                None
+        """
+        if key in self.large:
+            self.large.discard(key)
+            return
+        first_column, last_column, first_row, last_row = cell_range
+        cells = self.cells
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = cells.get((column, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del cells[(column, row)]
+
+    def remove(self, key: Hashable) -> None:
+        """
+            Remove an entry, if it is in the index.
+
+            Args:
+                key (Hashable): The entry.
+
+            Returns:
+                None
+        """
+        cell_range = self.ranges.pop(key, None)
+        if cell_range is None:
+            return
+        del self.entries[key]
+        self._unlink(key, cell_range)
+
+    def clear(self) -> None:
+        """
+            Remove every entry.
+
+            Returns:
+                None
+        """
+        self.cells.clear()
+        self.entries.clear()
+        self.ranges.clear()
+        self.large.clear()
+
+    def bounds(self, key: Hashable) -> Optional[Bounds]:
+        """
+            Get the bounding box of an entry.
+
+            Args:
+                key (Hashable): The entry.
+
+            Returns:
+                Optional[Bounds]: The box, None if the entry is not in the index.
+        """
+        return self.entries.get(key)
+
+    def query_point(self, x: float, y: float) -> List[Hashable]:
+        """
+            Find the entries whose bounding box contains a point.
+
+            Args:
+                x (float): The x-coordinate of the point.
+                y (float): The y-coordinate of the point.
+
+            Returns:
+                List[Hashable]: The entries, in no particular order.
+        """
+        entries = self.entries
+        size = self.cell_size
+        found = [key for key in self.cells.get((int(math.floor(x / size)), int(math.floor(y / size))), ())
+                 if entries[key][0] <= x <= entries[key][2] and entries[key][1] <= y <= entries[key][3]]
+        for key in self.large:
+            bounds = entries[key]
+            if bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]:
+                found.append(key)
+        return found
+
+    def query_rect(self, bounds: Bounds) -> List[Hashable]:
+        """
+            Find the entries whose bounding box overlaps a rectangle.
+
+            Args:
+                bounds (Bounds): The rectangle (x1, y1, x2, y2).
+
+            Returns:
+                List[Hashable]: The entries, each listed once, in no particular order.
+        """
+        x1, y1, x2, y2 = (min(bounds[0], bounds[2]), min(bounds[1], bounds[3]), max(bounds[0], bounds[2]),
+                          max(bounds[1], bounds[3]))
+        first_column, last_column, first_row, last_row = self.cell_range((x1, y1, x2, y2))
+        candidates: Set[Hashable] = set()
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > len(self.cells):
+            # The rectangle covers more cells than are in use, walking the used cells is cheaper
+            for (column, row), cell in self.cells.items():
+                if first_column <= column <= last_column and first_row <= row <= last_row:
+                    candidates.update(cell)
+        else:
+            cells = self.cells
+            for column in range(first_column, last_column + 1):
+                for row in range(first_row, last_row + 1):
+                    cell = cells.get((column, row))
+                    if cell:
+                        candidates.update(cell)
+        candidates.update(self.large)
+        entries = self.entries
+        return [key for key in candidates
+                if entries[key][0] <= x2 and entries[key][2] >= x1 and entries[key][1] <= y2 and entries[key][3] >= y1]
+
+    def query_enclosed(self, bounds: Bounds) -> List[Hashable]:
+        """
+            Find the entries whose bounding box lies inside a rectangle, e.g. the shapes a rubber band surrounds.
+
+            Args:
+                bounds (Bounds): The rectangle (x1, y1, x2, y2).
+
+            Returns:
+                List[Hashable]: The entries, each listed once, in no particular order.
+        """
+        x1, y1, x2, y2 = (min(bounds[0], bounds[2]), min(bounds[1], bounds[3]), max(bounds[0], bounds[2]),
+                          max(bounds[1], bounds[3]))
+        entries = self.entries
+        return [key for key in self.query_rect((x1, y1, x2, y2))
+                if entries[key][0] >= x1 and entries[key][1] >= y1 and entries[key][2] <= x2 and entries[key][3] <= y2]
+
+    def nearest(self, x: float, y: float, max_distance: Optional[float] = None) -> Optional[Hashable]:
+        """
+            Find the entry whose bounding box is closest to a point.
+
+            The cells are searched in growing rings around the point, until no unvisited cell can be closer than
+            the best entry found or every non-empty cell was visited. Once the rings would cover more cells than
+            are in use, the remaining non-empty cells are walked instead, so a point far from every shape costs no
+            more than the number of cells in use.
+
+            Args:
+                x (float): The x-coordinate of the point.
+                y (float): The y-coordinate of the point.
+                max_distance (Optional[float]): Ignore entries further than this, None searches everywhere.
+
+            Returns:
+                Optional[Hashable]: The closest entry, None if there is none within max_distance.
+        """
+        best: Optional[Hashable] = None
+        best_distance = math.inf if max_distance is None else max_distance
+        entries = self.entries
+        seen: Set[Hashable] = set()
+
+        def visit(keys: Iterable[Hashable]) -> None:
+            nonlocal best, best_distance
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = distance_to_bounds(x, y, entries[key])
+                if distance <= best_distance:
+                    best, best_distance = key, distance
+
+        visit(self.large)
+        cells = self.cells
+        size = self.cell_size
+        column, row = int(math.floor(x / size)), int(math.floor(y / size))
+        visited = 0
+        ring = 0
+        while visited < len(cells):
+            # Every cell of this ring is at least (ring - 1) cells away from the point
+            if (ring - 1) * size > best_distance:
+                break
+            if (2 * ring + 1) ** 2 > len(cells):
+                # The rings cover more cells than are in use, walking the used cells is cheaper
+                for (cell_column, cell_row), keys in cells.items():
+                    if max(abs(cell_column - column), abs(cell_row - row)) >= ring and distance_to_bounds(
+                            x, y, (cell_column * size, cell_row * size, (cell_column + 1) * size,
+                                   (cell_row + 1) * size)) <= best_distance:
+                        visit(keys)
+                break
+            for cell in self._ring(column, row, ring):
+                keys = cells.get(cell)
+                if keys:
+                    visited += 1
+                    visit(keys)
+            ring += 1
+        return best
+
+    @staticmethod
+    def _ring(column: int, row: int, ring: int) -> Iterable[Cell]:
+        """
+            List the cells at a given Chebyshev distance from a cell.
+
+            Args:
+                column (int): The column of the center cell.
+                row (int): The row of the center cell.
+                ring (int): The distance in cells.
+
+            Returns:
+                Iterable[Cell]: The cells of the ring.
+        """
+        if ring == 0:
+            return [(column, row)]
+        top = [(c, row - ring) for c in range(column - ring, column + ring + 1)]
+        bottom = [(c, row + ring) for c in range(column - ring, column + ring + 1)]
+        left = [(column - ring, r) for r in range(row - ring + 1, row + ring)]
+        right = [(column + ring, r) for r in range(row - ring + 1, row + ring)]
+        return top + bottom + left + right
+
+
+def _benchmark(sizes: Iterable[int], queries: int, seed: int) -> None:
+    """
+        Time the queries of indexes of growing size and print a table.
+
+        The shapes are spread over an area growing with their number, so the density, like in a real drawing,
+        stays the same.
+
+        Args:
+            sizes (Iterable[int]): The numbers of shapes to index.
+            queries (int): The number of queries of each kind.
+            seed (int): The random seed.
+
+        Returns:
+            None
+    """
+    print("%10s %12s %14s %14s %14s" % ("shapes", "build(s)", "point(us)", "rect(us)", "nearest(us)"))
+    for count in sizes:
+        generator = random.Random(seed)
+        side = math.sqrt(count) * DEFAULT_CELL_SIZE
+        index = SpatialIndex()
+        start = time.perf_counter()
+        for key in range(count):
+            x, y = generator.uniform(0, side), generator.uniform(0, side)
+            index.insert(key, (x, y, x + generator.uniform(5, 100), y + generator.uniform(5, 100)))
+        build = time.perf_counter() - start
+        points = [(generator.uniform(0, side), generator.uniform(0, side)) for _ in range(queries)]
+        timings = []
+        for query in (lambda p: index.query_point(*p),
+                      lambda p: index.query_rect((p[0], p[1], p[0] + 200, p[1] + 200)),
+                      lambda p: index.nearest(*p)):
+            start = time.perf_counter()
+            for point in points:
+                query(point)
+            timings.append((time.perf_counter() - start) / queries * 1e6)
+        print("%10d %12.2f %14.2f %14.2f %14.2f" % (count, build, *timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the spatial index from 1k to 1M shapes.")
+    parser.add_argument("--max", type=int, default=1_000_000, help="The largest number of shapes.")
+    parser.add_argument("--queries", type=int, default=10_000, help="The number of queries of each kind.")
+    parser.add_argument("--seed", type=int, default=0, help="The random seed.")
+    args = parser.parse_args()
+    _benchmark([n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= args.max], args.queries, args.seed)
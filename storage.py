@@ -0,0 +1,268 @@
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from instrument import timed
+from Shape import Document, Shape, Rectangle, Elips, Triangle, PolygonShape, Lines, Eraser, TextShape
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE: int = 1 << 16
+LOAD_SLICE_SECONDS: float = 0.02
+# A parse error this close to the end of what was read may be a token cut by the read, e.g. a \uXXXX escape pair
+CUT_TOKEN_CHARS: int = 12
+
+# Maps the "name" saved with every shape to the function that recreates it on a canvas
+SHAPE_DECODERS: Dict[str, Callable[[Document, dict], Shape]] = {
+    cls.__name__: cls.from_dict for cls in (Rectangle, Elips, Triangle, PolygonShape, Lines, Eraser, TextShape)
+}
+
+
+def dump_items(items: Iterable[dict], file: TextIO) -> int:
+    """
+        Write saved shapes to a file as a JSON array, one shape at a time.
+
+        Each shape is encoded with an incremental JSON encoder and written straight to the file, so the whole
+        document is never held in memory as a single string.
+
+        Args:
+            items (Iterable[dict]): The saved shapes, as returned by Shape.to_dict, in drawing order.
+            file (TextIO): The file to write to.
+
+        Returns:
+            int: The number of shapes written.
+    """
+    encoder = json.JSONEncoder()
+    count = 0
+    file.write("[")
+    for item in items:
+        if count:
+            file.write(",\n")
+        file.writelines(encoder.iterencode(item))
+        count += 1
+    file.write("]\n")
+    return count
+
+
+@timed("storage.dump_shapes")
+def dump_shapes(shapes: Iterable[Shape], file: TextIO) -> int:
+    """
+        Write shapes to a file as a JSON array, one shape at a time.
+
+        Args:
+            shapes (Iterable[Shape]): The shapes to save, in drawing order.
+            file (TextIO): The file to write to.
+
+        Returns:
+            int: The number of shapes written.
+    """
+    return dump_items((shape.to_dict() for shape in shapes), file)
+
+
+def iter_json_array(file: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+        Parse a JSON array from a file one element at a time.
+
+        The file is read in chunks and each element is yielded as soon as it is complete, so only the element being
+        parsed is held in memory, never the whole document. When an element does not fit in what has been read,
+        the next read is doubled so huge elements are not re-parsed over and over. An element that is invalid before
+        the end of what has been read raises at once, with its character offset in the file.
+
+        Args:
+            file (TextIO): The file holding the JSON array.
+            chunk_size (int): The number of characters read at a time.
+
+        Returns:
+            Iterator[Any]: The elements of the array, in order.
+
+        Raises:
+            ValueError: If the file does not hold a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    # The number of characters of the file before the buffer
+    consumed = 0
+    eof = False
+    expect_value = True
+    seen_value = False
+    started = False
+    read_size = chunk_size
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of file while reading a JSON array")
+            consumed += len(buffer)
+            buffer = file.read(read_size)
+            position = 0
+            eof = not buffer
+            continue
+        char = buffer[position]
+        if not started:
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+        elif char == "]":
+            if expect_value and seen_value:
+                raise ValueError("Trailing comma in JSON array")
+            return
+        elif char == "," and not expect_value:
+            expect_value = True
+            position += 1
+        elif not expect_value:
+            raise ValueError("Expected ',' or ']' at character %d" % (consumed + position))
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                cut = error.pos >= len(buffer) - CUT_TOKEN_CHARS or error.msg.startswith("Unterminated string")
+                if eof or not cut:
+                    raise ValueError("Invalid JSON array element at character %d: %s"
+                                     % (consumed + error.pos, error.msg)) from None
+                value, end = None, -1
+            if end == -1 or (end == len(buffer) and not eof):
+                more = file.read(read_size)
+                eof = not more
+                consumed += position
+                buffer = buffer[position:] + more
+                position = 0
+                read_size *= 2
+                continue
+            yield value
+            position = end
+            expect_value = False
+            seen_value = True
+            read_size = chunk_size
+            if position > len(buffer) // 2:
+                consumed += position
+                buffer = buffer[position:]
+                position = 0
+
+
+def iter_json_file(file_path: str) -> Iterator[Any]:
+    """
+        Parse the JSON array of a file one element at a time, closing the file when done.
+
+        Args:
+            file_path (str): The path of the JSON file.
+
+        Returns:
+            Iterator[Any]: The elements of the array, in order.
+    """
+    with open(file_path) as file:
+        yield from iter_json_array(file)
+
+
+def decode_shape(document: Document, item: dict) -> Optional[Shape]:
+    """
+        Recreate one saved shape in a document with its decoder from SHAPE_DECODERS.
+
+        Args:
+            document (Document): The document to add the shape to.
+            item (dict): The saved shape, as returned by Shape.to_dict.
+
+        Returns:
+            Optional[Shape]: The new shape, or None if its name is unknown.
+    """
+    decoder = SHAPE_DECODERS.get(item.get("name"))
+    if decoder is None:
+        logger.warning("Skipping unknown shape %r", item.get("name"))
+        return None
+    return decoder(document, item)
+
+
+def report_throughput(count: int, start: float) -> None:
+    """
+        Log how fast shapes were loaded.
+
+        Args:
+            count (int): The number of shapes loaded.
+            start (float): The time.perf_counter() value when loading started.
+
+        Returns:
+            None
+    """
+    elapsed = time.perf_counter() - start
+    logger.info("Loaded %d shapes in %.3f s (%.0f shapes/s)", count, elapsed, count / elapsed if elapsed else 0)
+
+
+def load_shapes(document: Document, items: Iterable[dict]) -> int:
+    """
+        Recreate saved shapes in a document.
+
+        Each item is dispatched to its decoder in SHAPE_DECODERS, which computes the final geometry and style of the
+        shape and creates its canvas item with a single call. Items with an unknown name are skipped. A headless
+        document is filled without a display.
+
+        Args:
+            document (Document): The document to add the shapes to.
+            items (Iterable[dict]): The saved shapes, as returned by Shape.to_dict.
+
+        Returns:
+            int: The number of shapes created.
+    """
+    start = time.perf_counter()
+    count = 0
+    for item in items:
+        if decode_shape(document, item) is not None:
+            count += 1
+    report_throughput(count, start)
+    return count
+
+
+def load_shapes_incrementally(document: Document, items: Iterator[dict],
+                              on_done: Optional[Callable[[List[Shape]], None]] = None,
+                              on_error: Optional[Callable[[Exception], None]] = None,
+                              slice_seconds: float = LOAD_SLICE_SECONDS) -> None:
+    """
+        Recreate saved shapes in a document in time slices scheduled on the Tk event loop of its canvas.
+
+        Every slice decodes shapes for at most `slice_seconds` and then yields to Tk, so the canvas shows the first
+        shapes and stays responsive while the rest of the file is still being parsed. A slice runs from a Tk timer,
+        where an exception would only reach Tk's error handler, so a file that fails to parse stops the load: the
+        items are closed, the shapes created so far are kept and passed to `on_done`, then the error to `on_error`.
+
+        Args:
+            document (Document): The document to add the shapes to, drawn on a canvas.
+            items (Iterator[dict]): The saved shapes, usually from iter_json_file.
+            on_done (Optional[Callable[[List[Shape]], None]]): Called with the shapes the load created, in order,
+                once all are loaded or once the load stopped on an error. Shapes drawn meanwhile are not among them.
+            on_error (Optional[Callable[[Exception], None]]): Called with the error that stopped the load.
+            slice_seconds (float): The longest time spent loading before returning to the event loop.
+
+        Returns:
+            None
+    """
+    start = time.perf_counter()
+    loaded: List[Shape] = []
+
+    @timed("storage.load_slice")
+    def load_slice() -> None:
+        deadline = time.perf_counter() + slice_seconds
+        try:
+            for item in items:
+                shape = decode_shape(document, item)
+                if shape is not None:
+                    loaded.append(shape)
+                if time.perf_counter() >= deadline:
+                    document.canvas.after(1, load_slice)
+                    return
+        except Exception as error:
+            logger.exception("Loading stopped after %d shapes", len(loaded))
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+            if on_done is not None:
+                on_done(loaded)
+            if on_error is not None:
+                on_error(error)
+            return
+        report_throughput(len(loaded), start)
+        if on_done is not None:
+            on_done(loaded)
+
+    load_slice()
@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from binformat import BinaryDocument, binary_to_json, iter_binary_file, json_to_binary, write_binary
+from storage import iter_json_array, iter_json_file
+
+SHAPES = [
+    {"name": "Lines", "color": "black", "width": 2, "matrix": [1.0, 0.0, 0.0, 1.0, 3.0, 4.0],
+     "lines": [[0, 0], [1, 2], [300, -5], [100000, 7]]},
+    {"name": "Lines", "color": "black", "width": 2, "lines": []},
+    {"name": "Eraser", "color": "white", "width": 8, "lines": [[5, 5]]},
+    {"name": "PolygonShape", "color": "red", "matrix": [2.0, 0.0, 0.0, 2.0, 0.0, 0.0],
+     "points": [[0.5, 1], [2, 3.25], [-1e9, 1e-9]]},
+    {"name": "Rectangle", "color": "blue", "width": 10, "height": 20, "x": 1.5, "y": -2},
+    {"name": "TextShape", "text": "héllo \U0001F600", "font_size": 12},
+    {"name": "CustomShape", "value": [1, 2]},
+]
+
+
+def write_json(path, items):
+    with open(path, "w") as file:
+        json.dump(items, file)
+
+
+def test_json_binary_round_trip(tmp_path):
+    write_json(tmp_path / "a.json", SHAPES)
+    assert json_to_binary(str(tmp_path / "a.json"), str(tmp_path / "a.pbin")) == len(SHAPES)
+    assert binary_to_json(str(tmp_path / "a.pbin"), str(tmp_path / "b.json")) == len(SHAPES)
+    assert list(iter_json_file(str(tmp_path / "b.json"))) == SHAPES
+    with BinaryDocument(str(tmp_path / "a.pbin")) as document:
+        assert len(document) == len(SHAPES)
+        assert document.record(3).name == "PolygonShape"
+        assert document.record(3).points() == SHAPES[3]["points"]
+
+
+def test_empty_drawing_round_trip(tmp_path):
+    assert write_binary([], str(tmp_path / "empty.pbin")) == 0
+    assert list(iter_binary_file(str(tmp_path / "empty.pbin"))) == []
+
+
+def test_truncated_binary_raises_value_error(tmp_path):
+    write_binary(SHAPES, str(tmp_path / "a.pbin"))
+    data = (tmp_path / "a.pbin").read_bytes()
+    for length in range(len(data)):
+        (tmp_path / "cut.pbin").write_bytes(data[:length])
+        with pytest.raises(ValueError):
+            list(iter_binary_file(str(tmp_path / "cut.pbin")))
+
+
+def test_json_array_in_small_chunks():
+    text = json.dumps(SHAPES)
+    for chunk_size in (1, 2, 7, 4096):
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) == SHAPES
+
+
+def test_truncated_json_raises_value_error():
+    text = json.dumps(SHAPES)
+    for length in range(len(text)):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO(text[:length]), 16))
+
+
+def test_invalid_json_element_fails_at_its_offset():
+    text = "[" + '{"a": 1},' * 1000 + '{"a": tru}' + ',{"b": 2}' * 100000 + "]"
+    file = io.StringIO(text)
+    with pytest.raises(ValueError, match="character %d" % text.index("tru")):
+        list(iter_json_array(file, 1024))
+    assert file.tell() < len(text) // 10
@@ -0,0 +1,100 @@
+from history import COMMAND_BYTES, Command, History, OutlineCommand
+
+
+class Step(Command):
+    def __init__(self, bytes_):
+        self.bytes = bytes_
+        self.undone = 0
+        self.redone = 0
+
+    def undo(self):
+        self.undone += 1
+
+    def redo(self):
+        self.redone += 1
+
+    def size(self):
+        return self.bytes
+
+
+def test_record_charges_every_command():
+    history = History(1000)
+    for bytes_ in (100, 200, 300):
+        history.record(Step(bytes_))
+    assert history.size == 600
+    assert len(history) == 3
+
+
+def test_eviction_drops_the_oldest_commands():
+    history = History(1000)
+    steps = [Step(300) for _ in range(5)]
+    for step in steps:
+        history.record(step)
+    assert list(history.undo_stack) == steps[2:]
+    assert history.size == 900
+
+
+def test_eviction_keeps_the_newest_command_over_budget():
+    history = History(1000)
+    history.record(Step(300))
+    huge = Step(5000)
+    history.record(huge)
+    assert list(history.undo_stack) == [huge]
+    assert history.size == 5000
+    assert history.undo() is huge
+    assert huge.undone == 1
+
+
+def test_undone_commands_stay_charged_until_dropped():
+    history = History(1000)
+    steps = [Step(100), Step(200), Step(300)]
+    for step in steps:
+        history.record(step)
+    history.undo()
+    history.undo()
+    assert history.redo_stack == [steps[2], steps[1]]
+    assert history.size == 600
+    assert history.redo() is steps[1]
+    assert history.size == 600
+    # A new change makes the remaining undone command impossible to redo, which frees it
+    history.record(Step(50))
+    assert history.redo_stack == []
+    assert history.size == 350
+    assert history.redo() is None
+
+
+def test_undone_commands_count_against_the_budget():
+    history = History(1000)
+    first, second = Step(400), Step(400)
+    history.record(first)
+    history.record(second)
+    history.undo()
+    # The undone command is freed by the new one, so nothing is left to evict
+    history.record(Step(400))
+    assert list(history.undo_stack)[0] is first
+    assert history.size == 800
+
+
+def test_merged_commands_are_not_charged_again():
+    history = History(10000)
+    shape = object()
+    history.record(OutlineCommand([shape], [("black", 1)], [("black", 2)], gesture=1))
+    size = history.size
+    history.record(OutlineCommand([shape], [("black", 2)], [("black", 3)], gesture=1))
+    assert len(history) == 1
+    assert history.size == size
+    assert history.undo_stack[0].after == [("black", 3)]
+    history.record(OutlineCommand([shape], [("black", 3)], [("black", 4)], gesture=2))
+    assert len(history) == 2
+    assert history.size == size * 2
+
+
+def test_clear_frees_everything():
+    history = History(1000)
+    history.record(Step(100))
+    history.record(Step(COMMAND_BYTES))
+    history.undo()
+    history.clear()
+    assert history.size == 0
+    assert len(history) == 0
+    assert history.redo_stack == []
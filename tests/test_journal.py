@@ -0,0 +1,109 @@
+import os
+
+from geometry import PointArray
+from history import CreateCommand, DeleteCommand, MoveCommand
+from journal import JOURNAL_FILE, SNAPSHOT_FILE, Journal, has_session, iter_snapshot, read_session
+from Shape import Document, Lines, Rectangle
+from storage import dump_items
+
+
+def add_rectangle(document, x):
+    rectangle = Rectangle(document, 10, 20, "red", create=False)
+    rectangle.x = x
+    rectangle.create_item()
+    document.history.record(CreateCommand([rectangle]))
+    return rectangle
+
+
+def add_stroke(document, points):
+    stroke = Lines(document, "black", drawing=False)
+    stroke.drawn_points = PointArray(points)
+    document.shapes.add(stroke)
+    stroke.create_item()
+    document.history.record(CreateCommand([stroke]))
+    return stroke
+
+
+def edit(document):
+    shapes = [add_rectangle(document, x) for x in range(5)]
+    shapes.append(add_stroke(document, [(0, 0), (1.5, 2), (30, -4)]))
+    shapes[1].delete()
+    document.history.record(DeleteCommand([shapes[1]]))
+    shapes[2].move(5, 5)
+    document.history.record(MoveCommand([shapes[2]], 5, 5))
+    document.history.undo()
+    document.history.undo()
+    return shapes
+
+
+def saved(document):
+    return [shape.to_dict() for shape in document.shapes]
+
+
+def run_session(directory, compact_records=10000):
+    document = Document()
+    journal = Journal(document, str(directory), compact_records=compact_records)
+    assert journal.acquire()
+    journal.start()
+    edit(document)
+    journal.close(discard=False)
+    return document
+
+
+def test_replay_restores_the_document(tmp_path):
+    document = run_session(tmp_path, compact_records=3)
+    assert has_session(str(tmp_path))
+    assert read_session(str(tmp_path)) == saved(document)
+
+
+def test_crash_while_writing_the_snapshot(tmp_path):
+    document = run_session(tmp_path)
+    # The new snapshot was cut short before it replaced the old one
+    with open(tmp_path / (SNAPSHOT_FILE + ".tmp"), "w") as file:
+        file.write('[{"id": 1, "z": 1, "sha')
+    assert read_session(str(tmp_path)) == saved(document)
+
+
+def test_crash_before_the_journal_was_emptied(tmp_path):
+    document = run_session(tmp_path)
+    assert os.path.getsize(tmp_path / JOURNAL_FILE) > 0
+    # The new snapshot replaced the old one, the journal it holds was not emptied yet
+    model = {shape.id: (shape.z, shape.to_dict()) for shape in document.shapes}
+    with open(tmp_path / SNAPSHOT_FILE, "w") as file:
+        dump_items(iter_snapshot(model), file)
+    assert read_session(str(tmp_path)) == saved(document)
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    document = run_session(tmp_path)
+    with open(tmp_path / JOURNAL_FILE, "a") as file:
+        file.write('{"op":"put","id":99,"z":')
+    assert read_session(str(tmp_path)) == saved(document)
+
+
+def test_empty_session_is_not_offered(tmp_path):
+    journal = Journal(Document(), str(tmp_path))
+    assert journal.acquire()
+    journal.start()
+    journal.close(discard=False)
+    assert not has_session(str(tmp_path))
+
+
+def test_normal_exit_discards_the_session(tmp_path):
+    document = Document()
+    journal = Journal(document, str(tmp_path))
+    assert journal.acquire()
+    journal.start()
+    edit(document)
+    journal.close(discard=True)
+    assert not has_session(str(tmp_path))
+
+
+def test_one_journal_per_directory(tmp_path):
+    first = Journal(Document(), str(tmp_path))
+    second = Journal(Document(), str(tmp_path))
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
@@ -0,0 +1,96 @@
+import random
+
+from history import DeleteCommand, ZOrderCommand
+from registry import Registry, remap_z
+from Shape import Document, Rectangle
+
+
+class Entry:
+    def __init__(self, shape_id, z):
+        self.id = shape_id
+        self.z = z
+
+
+def test_order_survives_random_placements():
+    generator = random.Random(1)
+    registry = Registry()
+    entries = [Entry(i, 1000.0 + i) for i in range(200)]
+    for entry in entries:
+        registry.add(entry)
+    spreads = []
+    registry.spread_listeners.append(lambda shapes, old: spreads.append(old))
+    expected = list(entries)
+    # Squeezing shapes into one gap forces spreads, the random moves then mix them with the rest
+    for i in range(200):
+        shape = entries[10 + i % 2]
+        expected.remove(shape)
+        expected.insert(expected.index(entries[0]) + 1, shape)
+        registry.place_above(shape, entries[0])
+    for _ in range(3000):
+        shape, anchor = generator.sample(expected, 2)
+        expected.remove(shape)
+        expected.insert(expected.index(anchor) + 1, shape)
+        registry.place_above(shape, anchor)
+    assert spreads
+    assert list(registry) == expected
+    assert [entry.z for entry in registry] == sorted(entry.z for entry in registry)
+
+
+def test_spread_keeps_order_and_ends():
+    registry = Registry()
+    entries = [Entry(i, z) for i, z in enumerate((1.0, 1.0 + 1e-12, 1.0 + 2e-12, 50.0))]
+    for entry in entries:
+        registry.add(entry)
+    calls = []
+    registry.spread_listeners.append(lambda shapes, old: calls.append((list(shapes), old)))
+    registry.spread()
+    assert list(registry) == entries
+    assert entries[0].z == 1.0 and entries[-1].z == 50.0
+    assert entries[0].z < entries[1].z < entries[2].z < entries[3].z
+    assert calls == [(entries, [1.0, 1.0 + 1e-12, 1.0 + 2e-12, 50.0])]
+
+
+def test_remap_z_is_monotonic():
+    old = [0.0, 1.0, 1.0 + 1e-12, 3.0]
+    new = [0.0, 1.0, 2.0, 3.0]
+    values = [-5.0, 0.0, 0.5, 1.0, 1.0 + 5e-13, 1.0 + 1e-12, 2.0, 3.0, 10.0]
+    mapped = [remap_z(old, new, z) for z in values]
+    assert mapped == sorted(mapped)
+    assert [remap_z(old, new, z) for z in old] == new
+    assert remap_z(old, new, -5.0) == -5.0
+    assert remap_z(old, new, 10.0) == 10.0
+
+
+def test_history_is_renumbered_by_spread():
+    document = Document()
+    shapes = []
+    for x in range(6):
+        shape = Rectangle(document, 10, 10, "red", create=False)
+        shape.x = x
+        shape.create_item()
+        shapes.append(shape)
+    bottom, low, deleted, middle, moved, top = shapes
+    before = [bottom.z]
+    document.shapes.set_z(bottom, document.next_z())
+    document.history.record(ZOrderCommand([bottom], before, [bottom.z]))
+    deleted.delete()
+    document.history.record(DeleteCommand([deleted]))
+    # Squeeze shapes above `low` until the registry runs out of room and spreads the z values
+    spreads = []
+    document.shapes.spread_listeners.append(lambda shapes, old: spreads.append(old))
+    placed = 0
+    while not spreads:
+        document.shapes.place_above((middle, moved)[placed % 2], low)
+        placed += 1
+    order = list(document.shapes)
+    document.history.undo()
+    assert order[0] is low and set(order[1:3]) == {middle, moved}
+    assert list(document.shapes) == order[:3] + [deleted] + order[3:]
+    document.history.undo()
+    assert list(document.shapes)[0] is bottom
+    document.history.redo()
+    document.history.redo()
+    assert list(document.shapes) == order
+    newest = Rectangle(document, 10, 10, "red", create=False)
+    newest.create_item()
+    assert document.shapes.top() is newest
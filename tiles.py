@@ -0,0 +1,554 @@
+"""
+Tiled rendering of saved drawings for exports too large to hold in memory.
+
+The output is cut into square tiles rendered by a pool of worker processes. Every worker loads the drawing once
+and buckets the shapes by the tiles their bounds overlap, so a tile only draws the shapes that can reach it.
+Tiles come back in row order and are either streamed into a single PNG one row of tiles at a time, or written as
+a tile pyramid:
+
+    <directory>/pyramid.json        the size of the image, the tile size and the number of levels
+    <directory>/<level>/<col>_<row>.png
+                                    level 0 is full resolution, every further level halves the previous one,
+                                    down to a single tile
+
+The same workers render level 0 and reduce every further level of a pyramid, so each loads the drawing only once.
+Neither mode needs Tk or a display.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from multiprocessing import Pool, cpu_count
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from binformat import is_binary_path, iter_binary_file
+from render import DEFAULT_SUPERSAMPLE, Bounds, document_bounds, render_document, shape_bounds
+from storage import iter_json_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_SIZE: int = 1024
+PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+# Compressed image data is written in IDAT chunks of about this many bytes
+IDAT_CHUNK_SIZE: int = 1 << 20
+PYRAMID_INDEX: str = "pyramid.json"
+
+Tile = Tuple[int, int]
+
+
+def iter_drawing(file_path: str) -> Iterator[dict]:
+    """
+        Read the shapes of a saved drawing, in either format.
+
+        Args:
+            file_path (str): A drawing saved by Draw.save_work.
+
+        Returns:
+            Iterator[dict]: The shapes in drawing order.
+    """
+    if is_binary_path(file_path):
+        return iter_binary_file(file_path)
+    return iter_json_file(file_path)
+
+
+class PngWriter:
+    """
+        Write an 8-bit RGB PNG one row of pixels at a time.
+
+        Only the compressor state and the pending compressed bytes are kept in memory.
+
+        Attributes:
+            width (int): The image width in pixels.
+            height (int): The image height in pixels.
+            rows_written (int): The number of pixel rows written so far.
+    """
+
+    def __init__(self, file_path: str, width: int, height: int, compress_level: int = 6) -> None:
+        """
+            Create the file and write the PNG header.
+
+            Args:
+                file_path (str): The file to write.
+                width (int): The image width in pixels.
+                height (int): The image height in pixels.
+                compress_level (int): The zlib compression level.
+
+            Returns:
+                None
+        """
+        self.width: int = width
+        self.height: int = height
+        self.rows_written: int = 0
+        self.file = open(file_path, "wb")
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = bytearray()
+        self.file.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def __enter__(self) -> 'PngWriter':
+        return self
+
+    def __exit__(self, exc_type: Optional[type], *exc_info: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def _write_chunk(self, kind: bytes, data: bytes) -> None:
+        """
+            Write one PNG chunk.
+
+            Args:
+                kind (bytes): The four-letter chunk type.
+                data (bytes): The chunk data.
+
+            Returns:
+                None
+        """
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def _flush_pending(self, force: bool = False) -> None:
+        """
+            Write the pending compressed bytes as IDAT chunks.
+
+            Args:
+                force (bool): Whether to write them even if they are less than a chunk.
+
+            Returns:
+                None
+        """
+        while len(self.pending) >= IDAT_CHUNK_SIZE or (force and self.pending):
+            self._write_chunk(b"IDAT", bytes(self.pending[:IDAT_CHUNK_SIZE]))
+            del self.pending[:IDAT_CHUNK_SIZE]
+
+    def write_rows(self, data: bytes, count: int) -> None:
+        """
+            Append pixel rows to the image.
+
+            Args:
+                data (bytes): The RGB bytes of the rows, top to bottom.
+                count (int): The number of rows in data.
+
+            Returns:
+                None
+        """
+        stride = self.width * 3
+        if len(data) != stride * count or self.rows_written + count > self.height:
+            raise ValueError("rows do not fit a %dx%d image" % (self.width, self.height))
+        for row in range(count):
+            self.pending += self.compressor.compress(b"\x00")
+            self.pending += self.compressor.compress(data[row * stride:(row + 1) * stride])
+        self.rows_written += count
+        self._flush_pending()
+
+    def close(self) -> None:
+        """
+            Finish the image and close the file.
+
+            Returns:
+                None
+
+            Raises:
+                ValueError: If fewer rows than the image height were written.
+        """
+        try:
+            if self.rows_written != self.height:
+                raise ValueError("%d of %d rows written" % (self.rows_written, self.height))
+            self.pending += self.compressor.flush()
+            self._flush_pending(force=True)
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self.file.close()
+
+
+class TileLayout:
+    """
+        The cut of an export into tiles.
+
+        Attributes:
+            bounds (Bounds): The document area exported.
+            scale (float): The number of output pixels per document unit.
+            width (int): The output width in pixels.
+            height (int): The output height in pixels.
+            tile_size (int): The side of a tile in pixels, tiles on the right and bottom edges may be smaller.
+            columns (int): The number of tile columns.
+            rows (int): The number of tile rows.
+    """
+
+    def __init__(self, bounds: Bounds, scale: float, tile_size: int = DEFAULT_TILE_SIZE) -> None:
+        """
+            Initialize a TileLayout.
+
+            Args:
+                bounds (Bounds): The document area to export.
+                scale (float): The number of output pixels per document unit.
+                tile_size (int): The side of a tile in pixels.
+
+            Returns:
+                None
+        """
+        self.bounds: Bounds = bounds
+        self.scale: float = scale
+        self.tile_size: int = max(int(tile_size), 1)
+        self.width: int = max(int(math.ceil((bounds[2] - bounds[0]) * scale)), 1)
+        self.height: int = max(int(math.ceil((bounds[3] - bounds[1]) * scale)), 1)
+        self.columns: int = -(-self.width // self.tile_size)
+        self.rows: int = -(-self.height // self.tile_size)
+
+    def tiles(self) -> List[Tile]:
+        """
+            List the tiles in row order.
+
+            Returns:
+                List[Tile]: The (column, row) of every tile.
+        """
+        return [(column, row) for row in range(self.rows) for column in range(self.columns)]
+
+    def pixel_box(self, tile: Tile) -> Tuple[int, int, int, int]:
+        """
+            Get the pixels covered by a tile.
+
+            Args:
+                tile (Tile): The (column, row) of the tile.
+
+            Returns:
+                Tuple[int, int, int, int]: The box (left, top, right, bottom) in output pixels.
+        """
+        left = tile[0] * self.tile_size
+        top = tile[1] * self.tile_size
+        return left, top, min(left + self.tile_size, self.width), min(top + self.tile_size, self.height)
+
+    def document_box(self, tile: Tile) -> Bounds:
+        """
+            Get the document area drawn by a tile.
+
+            Args:
+                tile (Tile): The (column, row) of the tile.
+
+            Returns:
+                Bounds: The box (x1, y1, x2, y2) in document units.
+        """
+        left, top, right, bottom = self.pixel_box(tile)
+        x0, y0 = self.bounds[0], self.bounds[1]
+        return x0 + left / self.scale, y0 + top / self.scale, x0 + right / self.scale, y0 + bottom / self.scale
+
+    def tile_range(self, bounds: Bounds) -> Tuple[int, int, int, int]:
+        """
+            Find the tiles a document box overlaps.
+
+            Args:
+                bounds (Bounds): The box in document units.
+
+            Returns:
+                Tuple[int, int, int, int]: The first and last column and row, the range is empty if the box is outside.
+        """
+        step = self.tile_size / self.scale
+        first_column = max(int(math.floor((bounds[0] - self.bounds[0]) / step)), 0)
+        last_column = min(int(math.floor((bounds[2] - self.bounds[0]) / step)), self.columns - 1)
+        first_row = max(int(math.floor((bounds[1] - self.bounds[1]) / step)), 0)
+        last_row = min(int(math.floor((bounds[3] - self.bounds[1]) / step)), self.rows - 1)
+        return first_column, last_column, first_row, last_row
+
+
+class TileWorker:
+    """
+        The state of a rendering process, loaded once by init_worker.
+
+        Attributes:
+            layout (Optional[TileLayout]): The cut of the export.
+            items (List[dict]): The shapes of the drawing in drawing order.
+            buckets (Dict[Tile, List[int]]): For every tile, the indexes of the shapes whose bounds overlap it.
+            supersample (int): The supersampling factor.
+            background (str): The background color.
+    """
+    layout: Optional[TileLayout] = None
+    items: List[dict] = []
+    buckets: Dict[Tile, List[int]] = {}
+    supersample: int = DEFAULT_SUPERSAMPLE
+    background: str = "white"
+
+
+def init_worker(file_path: str, bounds: Bounds, scale: float, tile_size: int, supersample: int,
+                background: str) -> None:
+    """
+        Load the drawing into a rendering process and bucket its shapes by tile.
+
+        Args:
+            file_path (str): The saved drawing.
+            bounds (Bounds): The document area exported.
+            scale (float): The number of output pixels per document unit.
+            tile_size (int): The side of a tile in pixels.
+            supersample (int): The supersampling factor.
+            background (str): The background color.
+
+        Returns:
+            None
+    """
+    layout = TileLayout(bounds, scale, tile_size)
+    items: List[dict] = []
+    buckets: Dict[Tile, List[int]] = {}
+    for item in iter_drawing(file_path):
+        box = shape_bounds(item)
+        if box is None:
+            continue
+        first_column, last_column, first_row, last_row = layout.tile_range(box)
+        if first_column > last_column or first_row > last_row:
+            continue
+        index = len(items)
+        items.append(item)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                buckets.setdefault((column, row), []).append(index)
+    TileWorker.layout = layout
+    TileWorker.items = items
+    TileWorker.buckets = buckets
+    TileWorker.supersample = supersample
+    TileWorker.background = background
+
+
+def render_tile(tile: Tile) -> Tuple[Tile, int, int, bytes]:
+    """
+        Render one tile in a process set up by init_worker.
+
+        Args:
+            tile (Tile): The (column, row) of the tile.
+
+        Returns:
+            Tuple[Tile, int, int, bytes]: The tile, its width and height in pixels and its RGB bytes.
+    """
+    image = _render_tile_image(tile)
+    return tile, image.width, image.height, image.tobytes()
+
+
+def _render_tile_image(tile: Tile) -> Image.Image:
+    """
+        Render one tile in a process set up by init_worker.
+
+        Args:
+            tile (Tile): The (column, row) of the tile.
+
+        Returns:
+            Image.Image: The tile.
+    """
+    layout = TileWorker.layout
+    left, top, right, bottom = layout.pixel_box(tile)
+    items = (TileWorker.items[index] for index in TileWorker.buckets.get(tile, ()))
+    return render_document(items, layout.document_box(tile), layout.scale, TileWorker.supersample,
+                           TileWorker.background, size=(right - left, bottom - top))
+
+
+def save_tile(tile: Tile, directory: str) -> Tile:
+    """
+        Render one tile in a process set up by init_worker and save it as level 0 of a pyramid.
+
+        Args:
+            tile (Tile): The (column, row) of the tile.
+            directory (str): The level directory.
+
+        Returns:
+            Tile: The tile.
+    """
+    _render_tile_image(tile).save(os.path.join(directory, "%d_%d.png" % tile))
+    return tile
+
+
+def _save_level_0_tile(args: Tuple[Tile, str]) -> Tile:
+    """
+        Unpack the arguments of save_tile, for Pool.imap.
+
+        Args:
+            args (Tuple[Tile, str]): The tile and the level directory.
+
+        Returns:
+            Tile: The tile.
+    """
+    return save_tile(*args)
+
+
+def reduce_tile(args: Tuple[Tile, str, str, int]) -> Tile:
+    """
+        Build a pyramid tile from the four tiles it covers on the level below.
+
+        Args:
+            args (Tuple[Tile, str, str, int]): The tile, the directory of the level below, the directory of the tile's
+                level and the tile size.
+
+        Returns:
+            Tile: The tile.
+    """
+    (column, row), source, target, tile_size = args
+    parts = []
+    for dy in (0, 1):
+        for dx in (0, 1):
+            path = os.path.join(source, "%d_%d.png" % (2 * column + dx, 2 * row + dy))
+            if os.path.exists(path):
+                parts.append((dx, dy, Image.open(path)))
+    width = sum(image.width for dx, dy, image in parts if dy == 0)
+    height = sum(image.height for dx, dy, image in parts if dx == 0)
+    combined = Image.new("RGB", (width, height))
+    for dx, dy, image in parts:
+        combined.paste(image, (dx * tile_size, dy * tile_size))
+    combined.resize((max(-(-width // 2), 1), max(-(-height // 2), 1)), Image.BOX).save(
+        os.path.join(target, "%d_%d.png" % (column, row)))
+    return column, row
+
+
+def _layout_for(file_path: str, scale: float, tile_size: int, bounds: Optional[Bounds]) -> TileLayout:
+    """
+        Cut the export of a drawing into tiles.
+
+        Args:
+            file_path (str): The saved drawing.
+            scale (float): The number of output pixels per document unit.
+            tile_size (int): The side of a tile in pixels.
+            bounds (Optional[Bounds]): The document area to export, defaults to the bounds of all the shapes.
+
+        Returns:
+            TileLayout: The layout.
+
+        Raises:
+            ValueError: If no area is given and the drawing is empty.
+    """
+    if bounds is None:
+        bounds = document_bounds(iter_drawing(file_path))
+        if bounds is None:
+            raise ValueError(file_path + " has no shapes to render")
+    return TileLayout(bounds, scale, tile_size)
+
+
+@contextmanager
+def _tile_mapper(workers: Optional[int], initargs: tuple) -> Iterator[Callable[[Callable, Iterable], Iterator]]:
+    """
+        Set up the processes that run tile functions, each loading the drawing once.
+
+        The mapper can be used for several passes, e.g. every level of a pyramid, without loading the drawing again.
+
+        Args:
+            workers (Optional[int]): The number of processes, None uses every core and 1 runs in this process.
+            initargs (tuple): The arguments of init_worker.
+
+        Returns:
+            Iterator[Callable[[Callable, Iterable], Iterator]]: A map function that runs a tile function over jobs
+                and returns the results in the order of the jobs.
+    """
+    workers = workers or cpu_count()
+    if workers <= 1:
+        init_worker(*initargs)
+        yield map
+        return
+    with Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        yield pool.imap
+
+
+def render_tiled(file_path: str, output_path: str, scale: float = 1.0, tile_size: int = DEFAULT_TILE_SIZE,
+                 workers: Optional[int] = None, supersample: int = DEFAULT_SUPERSAMPLE, background: str = "white",
+                 bounds: Optional[Bounds] = None) -> TileLayout:
+    """
+        Render a saved drawing into a PNG of any size.
+
+        Only one row of tiles is held in memory, the rows are compressed into the file as they complete.
+
+        Args:
+            file_path (str): The saved drawing, JSON or binary.
+            output_path (str): The PNG file to write.
+            scale (float): The number of output pixels per document unit.
+            tile_size (int): The side of a tile in pixels.
+            workers (Optional[int]): The number of rendering processes, None uses every core.
+            supersample (int): The supersampling factor, 1 disables anti-aliasing.
+            background (str): The background color.
+            bounds (Optional[Bounds]): The document area to export, defaults to the bounds of all the shapes.
+
+        Returns:
+            TileLayout: The layout of the written image.
+    """
+    start = time.perf_counter()
+    layout = _layout_for(file_path, scale, tile_size, bounds)
+    initargs = (file_path, layout.bounds, scale, layout.tile_size, supersample, background)
+    row_tiles: List[bytes] = []
+    with PngWriter(output_path, layout.width, layout.height) as writer, _tile_mapper(workers, initargs) as map_tiles:
+        for (column, row), width, height, data in map_tiles(render_tile, layout.tiles()):
+            row_tiles.append(data)
+            if column < layout.columns - 1:
+                continue
+            strides = [len(tile) // height for tile in row_tiles]
+            rows = b"".join(tile[y * stride:(y + 1) * stride]
+                            for y in range(height) for tile, stride in zip(row_tiles, strides))
+            writer.write_rows(rows, height)
+            row_tiles = []
+    logger.info("Rendered %dx%d pixels in %d tiles in %.2f s", layout.width, layout.height,
+                layout.columns * layout.rows, time.perf_counter() - start)
+    return layout
+
+
+def render_pyramid(file_path: str, directory: str, scale: float = 1.0, tile_size: int = DEFAULT_TILE_SIZE,
+                   workers: Optional[int] = None, supersample: int = DEFAULT_SUPERSAMPLE, background: str = "white",
+                   bounds: Optional[Bounds] = None) -> int:
+    """
+        Render a saved drawing into a tile pyramid for deep-zoom viewers.
+
+        Args:
+            file_path (str): The saved drawing, JSON or binary.
+            directory (str): The directory to write the pyramid to.
+            scale (float): The number of pixels per document unit at full resolution.
+            tile_size (int): The side of a tile in pixels.
+            workers (Optional[int]): The number of rendering processes, None uses every core.
+            supersample (int): The supersampling factor, 1 disables anti-aliasing.
+            background (str): The background color.
+            bounds (Optional[Bounds]): The document area to export, defaults to the bounds of all the shapes.
+
+        Returns:
+            int: The number of levels written.
+    """
+    start = time.perf_counter()
+    layout = _layout_for(file_path, scale, tile_size, bounds)
+    initargs = (file_path, layout.bounds, scale, layout.tile_size, supersample, background)
+    level_directory = os.path.join(directory, "0")
+    os.makedirs(level_directory, exist_ok=True)
+    levels = 1
+    with _tile_mapper(workers, initargs) as map_tiles:
+        for _ in map_tiles(_save_level_0_tile, ((tile, level_directory) for tile in layout.tiles())):
+            pass
+        columns, rows = layout.columns, layout.rows
+        while columns > 1 or rows > 1:
+            columns, rows = -(-columns // 2), -(-rows // 2)
+            source, level_directory = level_directory, os.path.join(directory, str(levels))
+            os.makedirs(level_directory, exist_ok=True)
+            jobs = [((column, row), source, level_directory, layout.tile_size)
+                    for row in range(rows) for column in range(columns)]
+            for _ in map_tiles(reduce_tile, jobs):
+                pass
+            levels += 1
+    with open(os.path.join(directory, PYRAMID_INDEX), "w") as file:
+        json.dump({"width": layout.width, "height": layout.height, "tile_size": layout.tile_size,
+                   "levels": levels, "bounds": list(layout.bounds), "scale": scale}, file)
+    logger.info("Rendered a %d level pyramid of %dx%d pixels in %.2f s", levels, layout.width, layout.height,
+                time.perf_counter() - start)
+    return levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a saved drawing in tiles, without a display.")
+    parser.add_argument("source", help="The drawing to render (.json or .pbin).")
+    parser.add_argument("target", help="The PNG file to write, or the directory of the pyramid with --pyramid.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Output pixels per canvas pixel.")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="The side of a tile in pixels.")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes, defaults to every core.")
+    parser.add_argument("--supersample", type=int, default=DEFAULT_SUPERSAMPLE,
+                        help="The supersampling factor, 1 disables anti-aliasing.")
+    parser.add_argument("--pyramid", action="store_true", help="Write a tile pyramid instead of a single PNG.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if args.pyramid:
+        render_pyramid(args.source, args.target, args.scale, args.tile_size, args.workers, args.supersample)
+    else:
+        render_tiled(args.source, args.target, args.scale, args.tile_size, args.workers, args.supersample)
@@ -0,0 +1,507 @@
+"""
+An infinite, zoomable canvas that only holds Tk items for the shapes in view.
+
+Shapes keep their geometry in document ("world") coordinates. ViewCanvas maps them to canvas coordinates with a
+zoom factor and an offset, canvas = world * zoom + offset, in every drawing call it receives, and maps the
+coordinates of the mouse events it delivers back to world coordinates, so shapes never see the zoom.
+
+Panning scrolls the canvas view with scan_mark/scan_dragto and leaves the items alone. Zooming scales every item
+around the mouse pointer with a single canvas call. After either, the shapes around the view are looked up in the
+spatial index: the ones that came into view are given Tk items, the ones that left it lose theirs. The area kept
+realized is the view plus a margin, so small pans do not create or delete anything.
+"""
+import logging
+from tkinter import Canvas, Event
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+from frames import FrameScheduler
+from instrument import instrumented
+from spatial import Bounds, SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+# Items with this tag, like the selection overlay, keep their line width and font size at every zoom
+SCREEN_TAG: str = "screen"
+# Generated after a zoom, when the canvas coordinates of every item changed
+VIEW_CHANGED: str = "<<ViewChanged>>"
+
+MIN_ZOOM: float = 0.01
+MAX_ZOOM: float = 64.0
+ZOOM_STEP: float = 1.25
+# The realized area extends this fraction of the view size beyond each side of the view
+VIEW_MARGIN: float = 0.5
+
+
+def _flatten(values: Iterable[Any]) -> List[float]:
+    """
+        Flatten nested coordinate lists and tuples into one list.
+
+        Args:
+            values (Iterable[Any]): The coordinates, as numbers or nested sequences of numbers.
+
+        Returns:
+            List[float]: The coordinates.
+    """
+    flat: List[float] = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            flat.extend(_flatten(value))
+        else:
+            flat.append(value)
+    return flat
+
+
+def _overlaps(first: Bounds, second: Bounds) -> bool:
+    """
+        Check whether two boxes overlap.
+
+        Args:
+            first (Bounds): A box (x1, y1, x2, y2).
+            second (Bounds): Another box.
+
+        Returns:
+            bool: True if the boxes share at least a point.
+    """
+    return first[0] <= second[2] and first[2] >= second[0] and first[1] <= second[3] and first[3] >= second[1]
+
+
+def _contains(outer: Bounds, inner: Bounds) -> bool:
+    """
+        Check whether a box lies inside another.
+
+        Args:
+            outer (Bounds): The surrounding box.
+            inner (Bounds): The box to test.
+
+        Returns:
+            bool: True if inner is inside outer.
+    """
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class ViewCanvas(Canvas):
+    """
+        A Canvas showing a window of an infinite document, with mouse-wheel zoom and drag-pan.
+
+        The shapes it realizes and unrealizes need a z attribute giving their stacking order, and realize(),
+        unrealize() and restyle() methods; their shape attribute holds their Tk item, None while unrealized.
+
+        Attributes:
+            index (SpatialIndex): The bounding boxes of the document's shapes, in world coordinates.
+            zoom (float): The number of canvas pixels per world unit.
+            offset_x (float): The canvas x-coordinate of the world origin.
+            offset_y (float): The canvas y-coordinate of the world origin.
+            visible (Set[Any]): The shapes of the realized area.
+            realized_area (Optional[Bounds]): The world area whose shapes have Tk items, None before the first refresh.
+            refresh_listeners (List[Callable[[], None]]): Called before a refresh looks up the shapes in the index,
+                e.g. to bring the index entries of a dragged selection up to date.
+            frames (FrameScheduler): Calls the motion handlers of the canvas at most once per display frame.
+    """
+
+    def __init__(self, master: Any, index: SpatialIndex, **options: Any) -> None:
+        """
+            Create the canvas and bind the zoom and pan gestures.
+
+            The wheel zooms around the pointer, dragging with the middle or right button pans, once per frame.
+
+            Args:
+                master (Any): The parent widget.
+                index (SpatialIndex): The spatial index of the document's shapes.
+                **options (Any): The Canvas options.
+
+            Returns:
+                None
+        """
+        super().__init__(master, confine=False, **options)
+        self.index: SpatialIndex = index
+        self.zoom: float = 1.0
+        self.offset_x: float = 0.0
+        self.offset_y: float = 0.0
+        self.visible: Set[Any] = set()
+        self.realized_area: Optional[Bounds] = None
+        self.refresh_pending: bool = False
+        self.refresh_listeners: List[Callable[[], None]] = []
+        self.frames: FrameScheduler = FrameScheduler(self)
+        for button in ("2", "3"):
+            Canvas.bind(self, "<ButtonPress-" + button + ">", self.frames.flushed(self.on_pan_start))
+            Canvas.bind(self, "<B" + button + "-Motion>", self.frames.coalesce(self.on_pan_drag))
+        Canvas.bind(self, "<MouseWheel>", self.on_wheel)
+        Canvas.bind(self, "<Button-4>", self.on_wheel)
+        Canvas.bind(self, "<Button-5>", self.on_wheel)
+        Canvas.bind(self, "<Configure>", lambda event: self.refresh())
+
+    # ______________________________#Coordinate mapping#______________________________________________________________
+
+    def to_canvas(self, x: float, y: float) -> Tuple[float, float]:
+        """
+            Convert world coordinates to canvas coordinates.
+
+            Args:
+                x (float): The world x-coordinate.
+                y (float): The world y-coordinate.
+
+            Returns:
+                Tuple[float, float]: The canvas coordinates.
+        """
+        return x * self.zoom + self.offset_x, y * self.zoom + self.offset_y
+
+    def to_world(self, x: float, y: float) -> Tuple[float, float]:
+        """
+            Convert canvas coordinates to world coordinates.
+
+            Whole numbers are returned as ints, so that at the default view drawings keep integer points.
+
+            Args:
+                x (float): The canvas x-coordinate.
+                y (float): The canvas y-coordinate.
+
+            Returns:
+                Tuple[float, float]: The world coordinates.
+        """
+        world_x = (x - self.offset_x) / self.zoom
+        world_y = (y - self.offset_y) / self.zoom
+        return (int(world_x) if world_x.is_integer() else world_x,
+                int(world_y) if world_y.is_integer() else world_y)
+
+    def widget_to_world(self, x: float, y: float) -> Tuple[float, float]:
+        """
+            Convert a position in the widget, like the one of a mouse event, to world coordinates.
+
+            Args:
+                x (float): The x-coordinate relative to the widget.
+                y (float): The y-coordinate relative to the widget.
+
+            Returns:
+                Tuple[float, float]: The world coordinates.
+        """
+        return self.to_world(self.canvasx(x), self.canvasy(y))
+
+    def _canvas_coords(self, values: Iterable[Any]) -> List[float]:
+        """
+            Convert a flat or nested list of world coordinates to canvas coordinates.
+
+            Args:
+                values (Iterable[Any]): The world coordinates x1, y1, x2, y2...
+
+            Returns:
+                List[float]: The canvas coordinates.
+        """
+        flat = _flatten(values)
+        zoom, offset_x, offset_y = self.zoom, self.offset_x, self.offset_y
+        return [c * zoom + (offset_x if i % 2 == 0 else offset_y) for i, c in enumerate(flat)]
+
+    def _canvas_options(self, options: dict) -> dict:
+        """
+            Scale the line width and font size of item options to the zoom.
+
+            Args:
+                options (dict): The item options.
+
+            Returns:
+                dict: The options to pass to Tk.
+        """
+        tags = options.get("tags", ())
+        if self.zoom == 1.0 or SCREEN_TAG in (tags if isinstance(tags, (list, tuple)) else (tags,)):
+            return options
+        options = dict(options)
+        if "width" in options:
+            options["width"] = float(options["width"]) * self.zoom
+        font = options.get("font")
+        if isinstance(font, (list, tuple)) and len(font) > 1:
+            options["font"] = (font[0], max(int(round(float(font[1]) * self.zoom)), 1)) + tuple(font[2:])
+        return options
+
+    def _world_handler(self, function: Callable) -> Callable:
+        """
+            Wrap an event handler so that it receives the event position in world coordinates.
+
+            Args:
+                function (Callable): The handler.
+
+            Returns:
+                Callable: The wrapped handler.
+        """
+
+        def handler(event: Event) -> Any:
+            if isinstance(event.x, int) and isinstance(event.y, int):
+                event.x, event.y = self.widget_to_world(event.x, event.y)
+            return function(event)
+
+        return handler
+
+    # ______________________________#Canvas calls in world coordinates#_______________________________________________
+
+    def bind(self, sequence: Any = None, func: Optional[Callable] = None, add: Any = None) -> Any:
+        if func is not None:
+            func = self._world_handler(func)
+        return super().bind(sequence, func, add)
+
+    def tag_bind(self, tag_or_id: Any, sequence: Any = None, func: Optional[Callable] = None, add: Any = None) -> Any:
+        if func is not None:
+            func = self._world_handler(func)
+        return super().tag_bind(tag_or_id, sequence, func, add)
+
+    def create_line(self, *args: Any, **kw: Any) -> int:
+        return super().create_line(self._canvas_coords(args), **self._canvas_options(kw))
+
+    def create_rectangle(self, *args: Any, **kw: Any) -> int:
+        return super().create_rectangle(self._canvas_coords(args), **self._canvas_options(kw))
+
+    def create_oval(self, *args: Any, **kw: Any) -> int:
+        return super().create_oval(self._canvas_coords(args), **self._canvas_options(kw))
+
+    def create_polygon(self, *args: Any, **kw: Any) -> int:
+        return super().create_polygon(self._canvas_coords(args), **self._canvas_options(kw))
+
+    def create_text(self, *args: Any, **kw: Any) -> int:
+        return super().create_text(self._canvas_coords(args), **self._canvas_options(kw))
+
+    def coords(self, tag_or_id: Any, *args: Any) -> Any:
+        if args:
+            return super().coords(tag_or_id, self._canvas_coords(args))
+        coords = super().coords(tag_or_id)
+        return [c for i in range(0, len(coords) - 1, 2) for c in self.to_world(coords[i], coords[i + 1])]
+
+    def insert(self, tag_or_id: Any, index: Any, string: Any) -> None:
+        if isinstance(string, (list, tuple)):
+            string = self._canvas_coords(string)
+        super().insert(tag_or_id, index, string)
+
+    def move(self, tag_or_id: Any, x_amount: float, y_amount: float) -> None:
+        super().move(tag_or_id, x_amount * self.zoom, y_amount * self.zoom)
+
+    def moveto(self, tag_or_id: Any, x: Any = "", y: Any = "") -> None:
+        canvas_x, canvas_y = self.to_canvas(x if x != "" else 0, y if y != "" else 0)
+        super().moveto(tag_or_id, canvas_x if x != "" else "", canvas_y if y != "" else "")
+
+    def scale(self, tag_or_id: Any, x_origin: float, y_origin: float, x_scale: float, y_scale: float) -> None:
+        canvas_x, canvas_y = self.to_canvas(x_origin, y_origin)
+        super().scale(tag_or_id, canvas_x, canvas_y, x_scale, y_scale)
+
+    def bbox(self, *args: Any) -> Optional[Tuple[float, float, float, float]]:
+        bbox = super().bbox(*args)
+        if bbox is None:
+            return None
+        return self.to_world(bbox[0], bbox[1]) + self.to_world(bbox[2], bbox[3])
+
+    def find_overlapping(self, x1: float, y1: float, x2: float, y2: float) -> Tuple[int, ...]:
+        return super().find_overlapping(*self._canvas_coords((x1, y1, x2, y2)))
+
+    def find_enclosed(self, x1: float, y1: float, x2: float, y2: float) -> Tuple[int, ...]:
+        return super().find_enclosed(*self._canvas_coords((x1, y1, x2, y2)))
+
+    def itemconfigure(self, tag_or_id: Any, cnf: Any = None, **kw: Any) -> Any:
+        return super().itemconfigure(tag_or_id, cnf, **self._canvas_options(kw))
+
+    itemconfig = itemconfigure
+
+    # ______________________________#The view#_________________________________________________________________________
+
+    def view_size(self) -> Tuple[int, int]:
+        """
+            Get the size of the widget, or its requested size before it is shown.
+
+            Returns:
+                Tuple[int, int]: The width and height in pixels.
+        """
+        width, height = self.winfo_width(), self.winfo_height()
+        if width <= 1 or height <= 1:
+            width, height = int(self.cget("width")), int(self.cget("height"))
+        return width, height
+
+    def view_bounds(self) -> Bounds:
+        """
+            Get the world area shown by the widget.
+
+            Returns:
+                Bounds: The box (x1, y1, x2, y2) in world coordinates.
+        """
+        width, height = self.view_size()
+        x1, y1 = self.widget_to_world(0, 0)
+        x2, y2 = self.widget_to_world(width, height)
+        return x1, y1, x2, y2
+
+    def view_center(self) -> Tuple[float, float]:
+        """
+            Get the world position at the center of the widget.
+
+            Returns:
+                Tuple[float, float]: The world coordinates.
+        """
+        width, height = self.view_size()
+        return self.widget_to_world(width / 2, height / 2)
+
+    def _padded_view(self) -> Bounds:
+        """
+            Get the view with the realization margin around it.
+
+            Returns:
+                Bounds: The box in world coordinates.
+        """
+        x1, y1, x2, y2 = self.view_bounds()
+        margin_x = (x2 - x1) * VIEW_MARGIN
+        margin_y = (y2 - y1) * VIEW_MARGIN
+        return x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y
+
+    def admit(self, shape: Any, bounds: Bounds) -> bool:
+        """
+            Decide whether a new shape needs a Tk item, and track it if it does.
+
+            Args:
+                shape (Any): The shape.
+                bounds (Bounds): Its bounding box in world coordinates.
+
+            Returns:
+                bool: True if the shape lies in the realized area and should be realized.
+        """
+        if self.realized_area is None:
+            self.realized_area = self._padded_view()
+        if not _overlaps(self.realized_area, bounds):
+            return False
+        self.visible.add(shape)
+        return True
+
+    def request_refresh(self) -> None:
+        """
+            Refresh the realized shapes once the pending events are handled.
+
+            Several requests before that are served by one refresh.
+
+            Returns:
+                None
+        """
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after_idle(self._pending_refresh)
+
+    def _pending_refresh(self) -> None:
+        self.refresh_pending = False
+        self.refresh(force=True)
+
+    @instrumented
+    def refresh(self, force: bool = False) -> None:
+        """
+            Give Tk items to the shapes around the view and take them from the shapes far from it.
+
+            Newly realized items are restacked under the nearest realized shape above them, so the canvas keeps
+            the document's stacking order.
+
+            Args:
+                force (bool): Refresh even if the view is still inside the realized area.
+
+            Returns:
+                None
+        """
+        if not force and self.realized_area is not None and _contains(self.realized_area, self.view_bounds()):
+            return
+        for listener in self.refresh_listeners:
+            listener()
+        area = self._padded_view()
+        in_area = self.index.query_rect(area)
+        in_area_set = set(in_area)
+        for shape in self.visible - in_area_set:
+            if shape.shape is not None and not getattr(shape, "is_drawing", False):
+                shape.unrealize()
+        new = [shape for shape in in_area if shape.shape is None]
+        new.sort(key=lambda shape: shape.z)
+        for shape in new:
+            shape.realize()
+        self.visible = in_area_set
+        self.realized_area = area
+        if new:
+            self.restack(new)
+        logger.debug("Refreshed view: %d shapes realized, %d new", len(in_area), len(new))
+
+    def restack(self, shapes: Iterable[Any]) -> None:
+        """
+            Move the items of some realized shapes to their place in the stacking order given by z.
+
+            Args:
+                shapes (Iterable[Any]): The shapes whose items are out of place.
+
+            Returns:
+                None
+        """
+        moved = set(shapes)
+        above = None
+        for shape in sorted(self.visible, key=lambda s: s.z, reverse=True):
+            if shape.shape is None:
+                continue
+            if shape in moved:
+                if above is None:
+                    super().tag_raise(shape.shape)
+                else:
+                    super().tag_lower(shape.shape, above.shape)
+            above = shape
+        super().tag_raise(SCREEN_TAG)
+
+    # ______________________________#Zoom and pan#_____________________________________________________________________
+
+    @instrumented
+    def zoom_at(self, x: float, y: float, factor: float) -> None:
+        """
+            Zoom around a point of the widget, which stays under the same document position.
+
+            Args:
+                x (float): The x-coordinate of the point relative to the widget.
+                y (float): The y-coordinate of the point relative to the widget.
+                factor (float): The zoom change, above 1 zooms in.
+
+            Returns:
+                None
+        """
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        factor = zoom / self.zoom
+        if factor == 1.0:
+            return
+        # The pending motion events were mapped to world coordinates with the current zoom
+        self.frames.flush()
+        canvas_x, canvas_y = self.canvasx(x), self.canvasy(y)
+        super().scale("all", canvas_x, canvas_y, factor, factor)
+        self.offset_x = self.offset_x * factor + canvas_x * (1 - factor)
+        self.offset_y = self.offset_y * factor + canvas_y * (1 - factor)
+        self.zoom = zoom
+        for shape in self.visible:
+            if shape.shape is not None:
+                shape.restyle()
+        self.refresh(force=True)
+        self.event_generate(VIEW_CHANGED)
+
+    def on_wheel(self, event: Event) -> None:
+        """
+            Zoom in or out one step with the mouse wheel.
+
+            Args:
+                event (Event): The wheel event, Button-4/5 on X11 and MouseWheel elsewhere.
+
+            Returns:
+                None
+        """
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.zoom_at(event.x, event.y, ZOOM_STEP if zoom_in else 1 / ZOOM_STEP)
+
+    def on_pan_start(self, event: Event) -> None:
+        """
+            Start panning.
+
+            Args:
+                event (Event): The button press event.
+
+            Returns:
+                None
+        """
+        self.scan_mark(event.x, event.y)
+
+    @instrumented
+    def on_pan_drag(self, event: Event) -> None:
+        """
+            Pan the view with the mouse.
+
+            Args:
+                event (Event): The motion event.
+
+            Returns:
+                None
+        """
+        self.scan_dragto(event.x, event.y, gain=1)
+        self.refresh()